@@ -0,0 +1,40 @@
+"""Add sensor_readings range indexes
+
+Revision ID: 4f1c2a9d7b3e
+Revises: 713ffc95ef3e
+Create Date: 2026-10-18 10:05:12.418305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4f1c2a9d7b3e'
+down_revision: Union[str, None] = '713ffc95ef3e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_sensor_readings_device_id_recorded_at',
+        'sensor_readings',
+        ['device_id', 'recorded_at'],
+        unique=False,
+        postgresql_include=['value_type', 'value', 'reading_id'],
+    )
+    op.create_index(
+        'ix_sensor_readings_recorded_at_brin',
+        'sensor_readings',
+        ['recorded_at'],
+        unique=False,
+        postgresql_using='brin',
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_sensor_readings_recorded_at_brin', table_name='sensor_readings')
+    op.drop_index('ix_sensor_readings_device_id_recorded_at', table_name='sensor_readings')
@@ -0,0 +1,32 @@
+"""Add band_metric to alerts
+
+Revision ID: a3d6f20b8c41
+Revises: f1c84d2e9a57
+Create Date: 2026-10-18 19:05:12.481330
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3d6f20b8c41'
+down_revision: Union[str, None] = 'f1c84d2e9a57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('alerts', sa.Column('band_metric', sa.String(), nullable=True))
+    # Open alerts raised by the rule engine before the column existed, recognised by their message
+    op.execute(
+        "UPDATE alerts SET band_metric = lower(substring(message from "
+        "'^(Temperature|Humidity) -?[0-9.]+\\S* is (above|below) the allowed range')) "
+        "WHERE NOT resolved"
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('alerts', 'band_metric')
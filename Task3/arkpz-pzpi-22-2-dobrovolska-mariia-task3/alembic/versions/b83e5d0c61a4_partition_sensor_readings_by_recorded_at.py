@@ -0,0 +1,118 @@
+"""Partition sensor_readings by recorded_at
+
+Revision ID: b83e5d0c61a4
+Revises: 4f1c2a9d7b3e
+Create Date: 2026-10-18 11:20:47.902114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b83e5d0c61a4'
+down_revision: Union[str, None] = '4f1c2a9d7b3e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _create_indexes() -> None:
+    op.create_index('ix_sensor_readings_reading_id', 'sensor_readings', ['reading_id'], unique=False)
+    op.create_index(
+        'ix_sensor_readings_device_id_recorded_at',
+        'sensor_readings',
+        ['device_id', 'recorded_at'],
+        unique=False,
+        postgresql_include=['value_type', 'value', 'reading_id'],
+    )
+    op.create_index(
+        'ix_sensor_readings_recorded_at_brin',
+        'sensor_readings',
+        ['recorded_at'],
+        unique=False,
+        postgresql_using='brin',
+    )
+
+
+def _drop_indexes(table_name: str) -> None:
+    op.drop_index('ix_sensor_readings_recorded_at_brin', table_name=table_name)
+    op.drop_index('ix_sensor_readings_device_id_recorded_at', table_name=table_name)
+    op.drop_index('ix_sensor_readings_reading_id', table_name=table_name)
+
+
+def upgrade() -> None:
+    op.execute("UPDATE sensor_readings SET recorded_at = now() WHERE recorded_at IS NULL")
+    _drop_indexes('sensor_readings')
+    op.rename_table('sensor_readings', 'sensor_readings_legacy')
+    op.execute("ALTER TABLE sensor_readings_legacy RENAME CONSTRAINT sensor_readings_pkey TO sensor_readings_legacy_pkey")
+
+    op.execute("""
+        CREATE TABLE sensor_readings (
+            reading_id INTEGER NOT NULL DEFAULT nextval('sensor_readings_reading_id_seq'),
+            device_id INTEGER NOT NULL REFERENCES devices (device_id),
+            value_type VARCHAR(11) NOT NULL,
+            value FLOAT NOT NULL,
+            recorded_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            CONSTRAINT sensor_readings_pkey PRIMARY KEY (reading_id, recorded_at)
+        ) PARTITION BY RANGE (recorded_at)
+    """)
+    op.execute("ALTER SEQUENCE sensor_readings_reading_id_seq OWNED BY sensor_readings.reading_id")
+
+    # Monthly partitions for the history before the current month, daily ones from there to next
+    # week; the application partition manager takes over from here. Monthly names carry no day
+    # (sensor_readings_p202601) and are dropped by retention once the whole month has expired.
+    op.execute("""
+        DO $$
+        DECLARE
+            oldest DATE := COALESCE((SELECT min(recorded_at)::date FROM sensor_readings_legacy), current_date);
+            month DATE := date_trunc('month', oldest)::date;
+            day DATE := GREATEST(oldest, date_trunc('month', current_date)::date);
+        BEGIN
+            WHILE month < date_trunc('month', current_date)::date LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF sensor_readings FOR VALUES FROM (%L) TO (%L)',
+                    'sensor_readings_p' || to_char(month, 'YYYYMM'), month, (month + interval '1 month')::date
+                );
+                month := (month + interval '1 month')::date;
+            END LOOP;
+            WHILE day <= current_date + 7 LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF sensor_readings FOR VALUES FROM (%L) TO (%L)',
+                    'sensor_readings_p' || to_char(day, 'YYYYMMDD'), day, day + 1
+                );
+                day := day + 1;
+            END LOOP;
+        END $$
+    """)
+    op.execute("CREATE TABLE sensor_readings_default PARTITION OF sensor_readings DEFAULT")
+
+    op.execute("""
+        INSERT INTO sensor_readings (reading_id, device_id, value_type, value, recorded_at)
+        SELECT reading_id, device_id, value_type, value, recorded_at FROM sensor_readings_legacy
+    """)
+    op.drop_table('sensor_readings_legacy')
+    _create_indexes()
+
+
+def downgrade() -> None:
+    _drop_indexes('sensor_readings')
+    op.rename_table('sensor_readings', 'sensor_readings_partitioned')
+    op.execute("ALTER TABLE sensor_readings_partitioned RENAME CONSTRAINT sensor_readings_pkey TO sensor_readings_partitioned_pkey")
+    op.create_table('sensor_readings',
+    sa.Column('reading_id', sa.Integer(), server_default=sa.text("nextval('sensor_readings_reading_id_seq')"), nullable=False),
+    sa.Column('device_id', sa.Integer(), nullable=False),
+    sa.Column('value_type', sa.String(length=11), nullable=False),
+    sa.Column('value', sa.Float(), nullable=False),
+    sa.Column('recorded_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['device_id'], ['devices.device_id'], ),
+    sa.PrimaryKeyConstraint('reading_id', name='sensor_readings_pkey')
+    )
+    op.execute("ALTER SEQUENCE sensor_readings_reading_id_seq OWNED BY sensor_readings.reading_id")
+    op.execute("""
+        INSERT INTO sensor_readings (reading_id, device_id, value_type, value, recorded_at)
+        SELECT reading_id, device_id, value_type, value, recorded_at FROM sensor_readings_partitioned
+    """)
+    op.drop_table('sensor_readings_partitioned')
+    _create_indexes()
@@ -0,0 +1,36 @@
+"""Add device_nonces table
+
+Revision ID: b9e2c7d41f6a
+Revises: a3d6f20b8c41
+Create Date: 2026-10-18 19:41:07.915264
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b9e2c7d41f6a'
+down_revision: Union[str, None] = 'a3d6f20b8c41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'device_nonces',
+        sa.Column('device_id', sa.Integer(), nullable=False),
+        sa.Column('nonce', sa.String(length=64), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['device_id'], ['devices.device_id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('device_id', 'nonce'),
+        prefixes=['UNLOGGED'],
+    )
+    op.create_index(op.f('ix_device_nonces_expires_at'), 'device_nonces', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_device_nonces_expires_at'), table_name='device_nonces')
+    op.drop_table('device_nonces')
@@ -0,0 +1,46 @@
+"""Allow one open alert per incubator band
+
+Revision ID: c4f8e2a19d73
+Revises: b9e2c7d41f6a
+Create Date: 2026-10-18 21:42:37.215904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4f8e2a19d73'
+down_revision: Union[str, None] = 'b9e2c7d41f6a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Workers used to open their own alert for the same excursion, only the newest one stays open
+    op.execute("""
+        WITH duplicates AS (
+            UPDATE alerts SET resolved = true
+            WHERE resolved IS NOT TRUE AND band_metric IS NOT NULL AND alert_id NOT IN (
+                SELECT max(alert_id) FROM alerts
+                WHERE resolved IS NOT TRUE AND band_metric IS NOT NULL
+                GROUP BY incubator_id, band_metric
+            )
+            RETURNING alert_id
+        )
+        INSERT INTO alert_history (alert_id, status, changed_at, created_by)
+        SELECT alert_id, 'resolved', now() AT TIME ZONE 'utc', 'system' FROM duplicates
+    """)
+    op.create_index(
+        'uq_alerts_open_band',
+        'alerts',
+        ['incubator_id', 'band_metric'],
+        unique=True,
+        postgresql_where=sa.text('resolved IS NOT TRUE AND band_metric IS NOT NULL'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('uq_alerts_open_band', table_name='alerts')
@@ -0,0 +1,48 @@
+"""Add sensor_reading_rollups
+
+Revision ID: c5e8a1f04d27
+Revises: b83e5d0c61a4
+Create Date: 2026-10-18 12:41:37.905216
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5e8a1f04d27'
+down_revision: Union[str, None] = 'b83e5d0c61a4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'sensor_reading_rollups',
+        sa.Column('resolution', sa.String(length=2), nullable=False),
+        sa.Column('device_id', sa.Integer(), nullable=False),
+        sa.Column('value_type', sa.Enum('temperature', 'humidity', name='valuetype', native_enum=False), nullable=False),
+        sa.Column('bucket_start', sa.DateTime(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.Column('value_sum', sa.Float(), nullable=False),
+        sa.Column('value_sum_sq', sa.Float(), nullable=False),
+        sa.Column('min_value', sa.Float(), nullable=False),
+        sa.Column('max_value', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['device_id'], ['devices.device_id'], ),
+        sa.PrimaryKeyConstraint('resolution', 'device_id', 'value_type', 'bucket_start'),
+    )
+    # Backfill from the readings already stored, later readings are rolled up on ingestion
+    for resolution, unit in (('1m', 'minute'), ('1h', 'hour'), ('1d', 'day')):
+        op.execute(
+            "INSERT INTO sensor_reading_rollups "
+            "(resolution, device_id, value_type, bucket_start, count, value_sum, value_sum_sq, min_value, max_value) "
+            f"SELECT '{resolution}', device_id, value_type, date_trunc('{unit}', recorded_at), count(*), "
+            "sum(value), sum(value * value), min(value), max(value) "
+            f"FROM sensor_readings GROUP BY device_id, value_type, date_trunc('{unit}', recorded_at)"
+        )
+
+
+def downgrade() -> None:
+    op.drop_table('sensor_reading_rollups')
@@ -0,0 +1,32 @@
+"""Add report_interval and offline_alert_id to devices
+
+Revision ID: d2b7f49a6c13
+Revises: c5e8a1f04d27
+Create Date: 2026-10-18 15:06:12.418530
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2b7f49a6c13'
+down_revision: Union[str, None] = 'c5e8a1f04d27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('devices', sa.Column('report_interval', sa.Integer(), nullable=True))
+    op.add_column('devices', sa.Column('offline_alert_id', sa.Integer(), nullable=True))
+    op.create_foreign_key(
+        'devices_offline_alert_id_fkey', 'devices', 'alerts', ['offline_alert_id'], ['alert_id'], ondelete='SET NULL'
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint('devices_offline_alert_id_fkey', 'devices', type_='foreignkey')
+    op.drop_column('devices', 'offline_alert_id')
+    op.drop_column('devices', 'report_interval')
@@ -0,0 +1,26 @@
+"""Add api_secret to devices
+
+Revision ID: f1c84d2e9a57
+Revises: e7a3c91f5b20
+Create Date: 2026-10-18 18:12:40.206113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1c84d2e9a57'
+down_revision: Union[str, None] = 'e7a3c91f5b20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('devices', sa.Column('api_secret', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('devices', 'api_secret')
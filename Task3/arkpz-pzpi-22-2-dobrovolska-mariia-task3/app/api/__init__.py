@@ -6,6 +6,8 @@ from app.api.device import router as device_router
 from app.api.sensor_reading import router as sensor_reading_router
 from app.api.alert import router as alert_router
 from app.api.alert_history import router as alert_history_router
+from app.api.stream import router as stream_router
+from app.api.system import router as system_router
 
 api_router = APIRouter()
 api_router.include_router(user_router, prefix="/users", tags=["Users"])
@@ -14,4 +16,6 @@ api_router.include_router(device_router, prefix="/devices", tags=["Devices"])
 api_router.include_router(sensor_reading_router, prefix="/sensor-readings", tags=["Sensor Readings"])
 api_router.include_router(alert_router, prefix="/alerts", tags=["Alerts"])
 api_router.include_router(alert_history_router, prefix="/alert-history", tags=["Alert History"])
+api_router.include_router(stream_router, prefix="/stream", tags=["Stream"])
+api_router.include_router(system_router, prefix="/system", tags=["System"])
 
@@ -1,5 +1,5 @@
 import logging
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
 from typing import List
@@ -7,6 +7,7 @@ from datetime import datetime
 from app.database import get_db
 from app.schemas.alert import AlertCreate, AlertUpdate, AlertInDB
 from app.models.alert import Alert
+from app.utils.pagination import PageParams, ndjson_response, set_next_cursor
 from typing import Optional
 
 def convert_to_naive(datetime_obj: Optional[datetime]) -> Optional[datetime]:
@@ -14,7 +15,6 @@ def convert_to_naive(datetime_obj: Optional[datetime]) -> Optional[datetime]:
         return datetime_obj.replace(tzinfo=None)
     return datetime_obj
 
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
@@ -51,15 +51,20 @@ async def update_alert(alert_id: int, alert_update: AlertUpdate, db: AsyncSessio
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 @router.get("/alerts/", response_model=List[AlertInDB])
-async def get_all_alerts(db: AsyncSession = Depends(get_db)):
+async def get_all_alerts(response: Response, page: PageParams = Depends(), db: AsyncSession = Depends(get_db)):
     try:
-        alerts = await Alert.get_all(db)
-        if not alerts:
+        if page.stream:
+            return ndjson_response(await Alert.stream_all(db), AlertInDB)
+        alerts, next_cursor = await Alert.get_page(db, page.after, page.limit)
+        if not alerts and page.after is None:
             raise HTTPException(status_code=404, detail="No alerts found")
         for alert in alerts:
             if alert.created_at:
                 alert.created_at = convert_to_naive(alert.created_at)
+        set_next_cursor(response, next_cursor)
         return alerts
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception(f"Error occurred while retrieving alerts: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
@@ -1,5 +1,5 @@
 #app/api/alert_history.py
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.alert_history import AlertHistory
 from app.schemas.alert_history import AlertHistoryCreate, AlertHistoryUpdate, AlertHistoryInDB
@@ -7,6 +7,7 @@ from typing import Optional, List
 from sqlalchemy import select
 from datetime import datetime
 from app.database import get_db
+from app.utils.pagination import PageParams, ndjson_response, set_next_cursor
 import logging
 
 def convert_to_naive(datetime_obj: Optional[datetime]) -> Optional[datetime]:
@@ -14,7 +15,6 @@ def convert_to_naive(datetime_obj: Optional[datetime]) -> Optional[datetime]:
         return datetime_obj.replace(tzinfo=None)
     return datetime_obj
 
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
@@ -72,17 +72,22 @@ async def update_alert_history(history_id: int, alert_history_update: AlertHisto
 
 
 @router.get("/alert_history/", response_model=List[AlertHistoryInDB])
-async def get_all_alert_history(db: AsyncSession = Depends(get_db)):
+async def get_all_alert_history(response: Response, page: PageParams = Depends(), db: AsyncSession = Depends(get_db)):
     try:
-        alert_history_records = await AlertHistory.get_all(db)
-        if not alert_history_records:
+        if page.stream:
+            return ndjson_response(await AlertHistory.stream_all(db), AlertHistoryInDB)
+        alert_history_records, next_cursor = await AlertHistory.get_page(db, page.after, page.limit)
+        if not alert_history_records and page.after is None:
             raise HTTPException(status_code=404, detail="No alert history records found")
 
         for record in alert_history_records:
             if record.changed_at:
                 record.changed_at = convert_to_naive(record.changed_at)
 
+        set_next_cursor(response, next_cursor)
         return alert_history_records
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception(f"Error occurred while retrieving alert history: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
@@ -1,5 +1,5 @@
 import logging
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
 from typing import List
@@ -9,13 +9,16 @@ from app.schemas.device import DeviceCreate, DeviceUpdate, DeviceInDB
 from app.models.device import Device
 from typing import Optional
 from sqlalchemy import select
+from app.utils import cluster
+from app.utils.device_auth import generate_api_secret
+from app.dependencies import is_admin
+from app.utils.pagination import PageParams, ndjson_response, set_next_cursor
 
 def convert_to_naive(datetime_obj: Optional[datetime]) -> Optional[datetime]:
     if datetime_obj:
         return datetime_obj.replace(tzinfo=None)
     return datetime_obj
 
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
@@ -27,6 +30,7 @@ async def create_device(device: DeviceCreate, db: AsyncSession = Depends(get_db)
             device.last_reported_at = convert_to_naive(device.last_reported_at)
 
         new_device = await Device.create(db, device.dict())
+        cluster.device_changed(new_device)
         logger.info(f"New device created with ID {new_device.device_id}")
         return new_device
     except Exception as e:
@@ -57,6 +61,7 @@ async def update_device(device_id: int, device_update: DeviceUpdate, db: AsyncSe
         if not updated_device:
             raise HTTPException(status_code=404, detail="Device not found")
 
+        cluster.device_changed(updated_device)
         logger.info(f"Device with ID {device_id} updated successfully.")
         return updated_device
     except Exception as e:
@@ -65,17 +70,22 @@ async def update_device(device_id: int, device_update: DeviceUpdate, db: AsyncSe
 
 
 @router.get("/devices/", response_model=List[DeviceInDB])
-async def get_all_devices(db: AsyncSession = Depends(get_db)):
+async def get_all_devices(response: Response, page: PageParams = Depends(), db: AsyncSession = Depends(get_db)):
     try:
-        devices = await Device.get_all(db)
-        if not devices:
+        if page.stream:
+            return ndjson_response(await Device.stream_all(db), DeviceInDB)
+        devices, next_cursor = await Device.get_page(db, page.after, page.limit)
+        if not devices and page.after is None:
             raise HTTPException(status_code=404, detail="No devices found")
 
         for device in devices:
             if device.last_reported_at:
                 device.last_reported_at = convert_to_naive(device.last_reported_at)
 
+        set_next_cursor(response, next_cursor)
         return devices
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception(f"Error occurred while retrieving devices: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
@@ -87,6 +97,7 @@ async def delete_device(device_id: int, db: AsyncSession = Depends(get_db)):
         deleted_device = await Device.delete_by_id(db, device_id)
         if not deleted_device:
             raise HTTPException(status_code=404, detail="Device not found")
+        cluster.device_deleted(device_id)
         return {"message": "Device deleted successfully", "device_id": device_id}
     except SQLAlchemyError as e:
         logger.exception(f"SQL error during deletion of device ID {device_id}: {str(e)}")
@@ -94,3 +105,37 @@ async def delete_device(device_id: int, db: AsyncSession = Depends(get_db)):
     except Exception as e:
         logger.exception(f"Error occurred while deleting device: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
+# The secret is returned only here, devices use it to sign ingestion requests (app/utils/device_auth.py)
+@router.post("/devices/{device_id}/api-key", response_model=dict, dependencies=[Depends(is_admin)])
+async def issue_device_api_key(device_id: int, db: AsyncSession = Depends(get_db)):
+    try:
+        api_secret = generate_api_secret()
+        device = await Device.set_api_secret(db, device_id, api_secret)
+        if not device:
+            raise HTTPException(status_code=404, detail="Device not found")
+        cluster.device_key_changed(device_id, api_secret)
+        logger.info(f"API key issued for device with ID {device_id}.")
+        return {"device_id": device_id, "api_secret": api_secret}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"Error occurred while issuing device API key: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
+@router.delete("/devices/{device_id}/api-key", response_model=dict, dependencies=[Depends(is_admin)])
+async def revoke_device_api_key(device_id: int, db: AsyncSession = Depends(get_db)):
+    try:
+        device = await Device.set_api_secret(db, device_id, None)
+        if not device:
+            raise HTTPException(status_code=404, detail="Device not found")
+        cluster.device_key_changed(device_id, None)
+        logger.info(f"API key revoked for device with ID {device_id}.")
+        return {"message": "Device API key revoked", "device_id": device_id}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"Error occurred while revoking device API key: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
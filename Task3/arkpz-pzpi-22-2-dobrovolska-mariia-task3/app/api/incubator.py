@@ -1,30 +1,61 @@
 #app/api/incubator.py
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 import logging
 from sqlalchemy import select
 from app.models import UserIncubator
 from app.models.incubator import Incubator
-from app.schemas.incubator import IncubatorCreate, IncubatorUpdate, IncubatorInDB
+from app.schemas.incubator import IncubatorCreate, IncubatorUpdate, IncubatorInDB, IncubatorCurrentState
 from app.database import get_db
+from app.utils import cluster
+from app.utils.latest_readings import latest_readings
+from app.utils.pagination import PageParams, ndjson_response, set_next_cursor
+from app.utils.query_audit import query_budget
 from typing import List
 
 router = APIRouter()
 
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+MAX_CURRENT_STATE_IDS = 500
+
 @router.get("/incubators/", response_model=List[IncubatorInDB])
-async def get_all_incubators(db: AsyncSession = Depends(get_db)):
+async def get_all_incubators(response: Response, page: PageParams = Depends(), db: AsyncSession = Depends(get_db)):
     try:
-        incubators = await Incubator.get_all(db)
-        if not incubators:
+        if page.stream:
+            return ndjson_response(await Incubator.stream_all(db), IncubatorInDB)
+        incubators, next_cursor = await Incubator.get_page(db, page.after, page.limit)
+        if not incubators and page.after is None:
             raise HTTPException(status_code=404, detail="No incubators found")
+        set_next_cursor(response, next_cursor)
         return incubators
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
 
+# Served from the in-memory latest reading cache, no database session is opened.
+# Declared before /incubators/{incubator_id} so "current" is not taken for an id.
+@router.get("/incubators/current", response_model=List[IncubatorCurrentState])
+async def get_incubators_current_state(ids: str = Query(..., description="Comma-separated incubator IDs")):
+    try:
+        incubator_ids = [int(incubator_id) for incubator_id in ids.split(",") if incubator_id.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be a comma-separated list of integers")
+    if len(incubator_ids) > MAX_CURRENT_STATE_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_CURRENT_STATE_IDS} ids can be requested at once")
+    return latest_readings.current_states(incubator_ids)
+
+
+@router.get("/incubators/{incubator_id}/current", response_model=IncubatorCurrentState)
+async def get_incubator_current_state(incubator_id: int):
+    state = latest_readings.current_state(incubator_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="No readings for incubator")
+    return state
+
+
 @router.get("/incubators/{incubator_id}", response_model=IncubatorInDB)
 async def get_incubator(incubator_id: int, db: AsyncSession = Depends(get_db)):
     stmt = select(Incubator).where(Incubator.incubator_id == incubator_id)
@@ -38,6 +69,7 @@ async def get_incubator(incubator_id: int, db: AsyncSession = Depends(get_db)):
 
 
 @router.delete("/incubators/{incubator_id}", response_model=dict)
+@query_budget(8)
 async def delete_incubator(incubator_id: int, db: AsyncSession = Depends(get_db)):
     try:
         deleted_incubator = await Incubator.delete_by_id(db, incubator_id)
@@ -45,6 +77,8 @@ async def delete_incubator(incubator_id: int, db: AsyncSession = Depends(get_db)
         if not deleted_incubator:
             raise HTTPException(status_code=404, detail="Incubator not found")
 
+        cluster.incubator_deleted(incubator_id)
+
         return {"message": "Incubator deleted successfully", "incubator_id": incubator_id}
 
     except HTTPException as e:
@@ -64,12 +98,14 @@ async def create_incubator_with_user(user_id: int, incubator: IncubatorCreate, d
         db.add(user_incubator)
         await db.commit()
         await db.refresh(new_incubator)
+        cluster.incubator_changed(new_incubator)
         return new_incubator
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
 
 
 @router.put("/incubators/{incubator_id}", response_model=IncubatorInDB)
+@query_budget(3)
 async def update_incubator(incubator_id: int, incubator_update: IncubatorUpdate, db: AsyncSession = Depends(get_db)):
     stmt = select(Incubator).where(Incubator.incubator_id == incubator_id)
     result = await db.execute(stmt)
@@ -88,6 +124,7 @@ async def update_incubator(incubator_id: int, incubator_update: IncubatorUpdate,
     try:
         await db.commit()
         await db.refresh(incubator_from_db)
+        cluster.incubator_changed(incubator_from_db)
         logger.info(f"Incubator with ID {incubator_id} updated successfully.")
     except Exception as e:
         logger.exception(f"Error occurred while updating incubator: {str(e)}")
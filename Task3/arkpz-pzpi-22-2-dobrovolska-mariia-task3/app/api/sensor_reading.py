@@ -1,14 +1,32 @@
 # app/api/sensor_reading.py
 import logging
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from datetime import datetime
 from sqlalchemy import select
+from pydantic import ValidationError
 from app.database import get_db
-from app.schemas.sensor_reading import SensorReadingCreate, SensorReadingUpdate, SensorReadingInDB
-from app.models.sensor_reading import SensorReading
-from app.utils.email import send_email_notification
+from app.dependencies import is_admin
+from app.schemas.sensor_reading import (
+    SensorReadingCreate, SensorReadingUpdate, SensorReadingInDB,
+    SensorReadingBulkError, SensorReadingBulkResult, SensorReadingSeries,
+    SensorReadingDiagnostics, SensorReadingDiagnosticsSeries,
+)
+from app.models.sensor_reading import SensorReading, ValueType
+from app.models.device import Device
+from app.models.sensor_reading_rollup import SensorReadingRollup
+from app.utils.rollups import (
+    RESOLUTIONS, DEFAULT_MAX_POINTS, bucket_start, choose_resolution, rollup_point, store_readings,
+)
+from app.utils.diagnostics import (
+    DEFAULT_WINDOW, MAX_WINDOW, MAX_DIAGNOSTIC_POINTS, fetch_windows, summarize, rolling,
+)
+from app.utils.pagination import PageParams, TimePageParams, ndjson_response, set_next_cursor
+from app.utils.ingestion import ingestion_buffer, IngestionQueueFull, process_ingested_readings
+from app.utils.device_auth import authenticate_ingestion
+from app.utils.query_audit import query_budget
+from app.utils.logging_setup import LogSampler
 
 
 def convert_to_naive(datetime_obj: Optional[datetime]) -> Optional[datetime]:
@@ -16,39 +34,39 @@ def convert_to_naive(datetime_obj: Optional[datetime]) -> Optional[datetime]:
         return datetime_obj.replace(tzinfo=None)
     return datetime_obj
 
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-TEMPERATURE_THRESHOLD = 53.4  
+MAX_BULK_READINGS = 5000
+MAX_RANGE_READINGS = 10000
+MAX_SERIES_POINTS = 10000
+# Single readings arrive far too often to log each one, past a short burst about one a second is logged
+READING_LOG_RATE = 1.0
+
+reading_log_sampler = LogSampler(READING_LOG_RATE)
 
 
 @router.post("/sensor_readings/", response_model=SensorReadingInDB, status_code=status.HTTP_201_CREATED)
-async def create_sensor_reading(sensor_reading: SensorReadingCreate, db: AsyncSession = Depends(get_db)):
+@query_budget(8)
+async def create_sensor_reading(
+    sensor_reading: SensorReadingCreate,
+    principal: dict = Depends(authenticate_ingestion),
+    db: AsyncSession = Depends(get_db),
+):
     try:
         if sensor_reading.recorded_at:
             sensor_reading.recorded_at = convert_to_naive(sensor_reading.recorded_at)
 
-        new_sensor_reading = await SensorReading.create(db, sensor_reading.dict())
-
-        if sensor_reading.value_type == "temperature" and sensor_reading.value > TEMPERATURE_THRESHOLD:
-            user_email = "_@gmail.com"  
-            subject = "Temperature Alert"
-            body = (
-                f"Dear User,\n\n"
-                f"The temperature value has exceeded the threshold.\n\n"
-                f"Details:\n"
-                f"Device ID: {sensor_reading.device_id}\n"
-                f"Temperature: {sensor_reading.value}°C\n"
-                f"Recorded At: {sensor_reading.recorded_at}\n\n"
-                f"Please take necessary actions.\n\n"
-                f"Best Regards,\n"
-                f"Your Monitoring System"
-            )
-            send_email_notification(user_email, subject, body)
+        new_sensor_reading, = await store_readings(db, [sensor_reading.dict()])
 
-        logger.info(f"New sensor reading created with ID {new_sensor_reading.reading_id}")
+        await process_ingested_readings(db, [new_sensor_reading])
+
+        if reading_log_sampler.allow():
+            logger.info(
+                f"New sensor reading created with ID {new_sensor_reading.reading_id}",
+                extra=reading_log_sampler.extra(),
+            )
         return new_sensor_reading
     except ValueError as e:
         logger.exception(f"ValueError occurred: {str(e)}")
@@ -58,55 +76,267 @@ async def create_sensor_reading(sensor_reading: SensorReadingCreate, db: AsyncSe
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 
+@router.post("/sensor_readings/bulk", response_model=SensorReadingBulkResult, status_code=status.HTTP_201_CREATED)
+# A full batch inserts readings 1000 rows and rollups 3000 rows per statement
+@query_budget(10)
+async def create_sensor_readings_bulk(
+    readings: List[Dict[str, Any]],
+    response: Response,
+    principal: dict = Depends(authenticate_ingestion),
+    db: AsyncSession = Depends(get_db),
+):
+    if len(readings) > MAX_BULK_READINGS:
+        raise HTTPException(status_code=413, detail=f"Batch size exceeds {MAX_BULK_READINGS} readings")
+
+    errors: List[SensorReadingBulkError] = []
+    valid_indexes: List[int] = []
+    valid_readings: List[SensorReadingCreate] = []
+    for index, raw_reading in enumerate(readings):
+        try:
+            sensor_reading = SensorReadingCreate.parse_obj(raw_reading)
+        except ValidationError as e:
+            errors.append(SensorReadingBulkError(index=index, detail=str(e)))
+            continue
+        if sensor_reading.recorded_at:
+            sensor_reading.recorded_at = convert_to_naive(sensor_reading.recorded_at)
+        valid_indexes.append(index)
+        valid_readings.append(sensor_reading)
+
+    try:
+        device_ids = {sensor_reading.device_id for sensor_reading in valid_readings}
+        known_device_ids = set()
+        if device_ids:
+            result = await db.execute(select(Device.device_id).where(Device.device_id.in_(device_ids)))
+            known_device_ids = set(result.scalars().all())
+
+        rows = []
+        for index, sensor_reading in zip(valid_indexes, valid_readings):
+            if sensor_reading.device_id not in known_device_ids:
+                errors.append(SensorReadingBulkError(index=index, detail=f"Device {sensor_reading.device_id} not found"))
+                continue
+            rows.append(sensor_reading.dict())
+
+        created = await store_readings(db, rows)
+    except Exception as e:
+        logger.exception(f"Error occurred during bulk sensor reading creation: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+    await process_ingested_readings(db, created)
+
+    if errors:
+        errors.sort(key=lambda error: error.index)
+        response.status_code = status.HTTP_207_MULTI_STATUS if created else status.HTTP_400_BAD_REQUEST
+
+    logger.info(f"Bulk ingestion: {len(created)} sensor readings created, {len(errors)} rejected")
+    return SensorReadingBulkResult(created=created, errors=errors)
+
+
+@router.post("/sensor_readings/buffered", response_model=dict, status_code=status.HTTP_202_ACCEPTED)
+async def create_sensor_reading_buffered(
+    sensor_reading: SensorReadingCreate,
+    principal: dict = Depends(authenticate_ingestion),
+    db: AsyncSession = Depends(get_db),
+):
+    # A device key proves its device exists, readings sent with a user token are checked here:
+    # the session only connects for them, signed requests stay free of database round trips
+    if "device_id" not in principal and await db.scalar(
+        select(Device.device_id).where(Device.device_id == sensor_reading.device_id)
+    ) is None:
+        raise HTTPException(status_code=404, detail=f"Device {sensor_reading.device_id} not found")
+    sensor_reading.recorded_at = convert_to_naive(sensor_reading.recorded_at) or datetime.utcnow()
+    try:
+        await ingestion_buffer.submit(sensor_reading.dict())
+    except IngestionQueueFull:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Ingestion queue is full, retry later",
+            headers={"Retry-After": "1"},
+        )
+    except RuntimeError as e:
+        logger.error(f"Buffered ingestion unavailable: {str(e)}")
+        raise HTTPException(status_code=503, detail="Ingestion buffer is not running")
+
+    return {"message": "Sensor reading accepted"}
+
+
+@router.get("/sensor_readings/buffer/metrics", response_model=dict, dependencies=[Depends(is_admin)])
+async def get_ingestion_buffer_metrics():
+    return ingestion_buffer.metrics()
+
+
 @router.get("/sensor_readings/", response_model=List[SensorReadingInDB])
-async def get_all_sensor_readings(db: AsyncSession = Depends(get_db)):
+async def get_all_sensor_readings(response: Response, page: PageParams = Depends(), db: AsyncSession = Depends(get_db)):
     try:
-        sensor_readings = await SensorReading.get_all(db)
-        if not sensor_readings:
+        if page.stream:
+            return ndjson_response(await SensorReading.stream_all(db), SensorReadingInDB)
+        sensor_readings, next_cursor = await SensorReading.get_page(db, page.after, page.limit)
+        if not sensor_readings and page.after is None:
             raise HTTPException(status_code=404, detail="No sensor readings found")
+        set_next_cursor(response, next_cursor)
         return sensor_readings
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception(f"Error occurred while retrieving sensor readings: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 
 @router.get("/sensor_readings/device/{device_id}", response_model=List[SensorReadingInDB])
-async def get_sensor_readings_by_device_id(device_id: int, db: AsyncSession = Depends(get_db)):
+async def get_sensor_readings_by_device_id(
+    device_id: int, response: Response, page: TimePageParams = Depends(), db: AsyncSession = Depends(get_db)
+):
     try:
-        sensor_readings = await SensorReading.get_by_device_id(db, device_id)
-        if not sensor_readings:
+        if page.stream:
+            return ndjson_response(await SensorReading.stream_by_device_id(db, device_id), SensorReadingInDB)
+        sensor_readings, next_cursor = await SensorReading.get_page_by_device_id(db, device_id, page.after, page.limit)
+        if not sensor_readings and page.after is None:
             raise HTTPException(status_code=404, detail="No sensor readings found for the given device ID")
+        set_next_cursor(response, next_cursor)
         return sensor_readings
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception(f"Error occurred while retrieving sensor readings by device ID {device_id}: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 
+@router.get("/sensor_readings/device/{device_id}/range", response_model=List[SensorReadingInDB])
+async def get_sensor_readings_range_by_device_id(
+    device_id: int,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    value_type: Optional[ValueType] = None,
+    limit: int = Query(1000, ge=1, le=MAX_RANGE_READINGS),
+    db: AsyncSession = Depends(get_db),
+):
+    try:
+        return await SensorReading.get_range_by_device_id(
+            db, device_id, convert_to_naive(start), convert_to_naive(end), value_type, limit
+        )
+    except Exception as e:
+        logger.exception(f"Error occurred while retrieving sensor readings range for device ID {device_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
+@router.get("/sensor_readings/incubator/{incubator_id}/range", response_model=List[SensorReadingInDB])
+async def get_sensor_readings_range_by_incubator_id(
+    incubator_id: int,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    value_type: Optional[ValueType] = None,
+    limit: int = Query(1000, ge=1, le=MAX_RANGE_READINGS),
+    db: AsyncSession = Depends(get_db),
+):
+    try:
+        return await SensorReading.get_range_by_incubator_id(
+            db, incubator_id, convert_to_naive(start), convert_to_naive(end), value_type, limit
+        )
+    except Exception as e:
+        logger.exception(f"Error occurred while retrieving sensor readings range for incubator ID {incubator_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
+@router.get("/sensor_readings/device/{device_id}/series", response_model=SensorReadingSeries)
+async def get_sensor_readings_series_by_device_id(
+    device_id: int,
+    start: datetime = Query(..., alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    value_type: Optional[ValueType] = None,
+    max_points: int = Query(DEFAULT_MAX_POINTS, ge=1, le=MAX_SERIES_POINTS),
+    resolution: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    start = convert_to_naive(start)
+    end = convert_to_naive(end) or datetime.utcnow()
+    if end <= start:
+        raise HTTPException(status_code=400, detail="'to' must be later than 'from'")
+    if resolution is not None and resolution not in RESOLUTIONS:
+        raise HTTPException(status_code=400, detail=f"resolution must be one of {', '.join(RESOLUTIONS)}")
+    try:
+        resolution = resolution or choose_resolution(start, end, max_points)
+        rollups = await SensorReadingRollup.get_series(
+            db, resolution, device_id, bucket_start(start, resolution), end, value_type
+        )
+        return {
+            "device_id": device_id,
+            "resolution": resolution,
+            "points": [rollup_point(rollup) for rollup in rollups],
+        }
+    except Exception as e:
+        logger.exception(f"Error occurred while retrieving sensor readings series for device ID {device_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
 @router.get("/sensor_reading/diagnostics/{device_id}", response_model=List[dict])
 async def get_sensor_reading_diagnostics(device_id: int, db: AsyncSession = Depends(get_db)):
     try:
-        sensor_readings = await SensorReading.get_last_four_by_device_id(db, device_id)
+        # Last four readings of each metric, so temperature and humidity are never averaged together
+        windows = await fetch_windows(db, DEFAULT_WINDOW, device_ids=[device_id])
+        series = [item for item in rolling(windows, DEFAULT_WINDOW) if len(item["points"]) == DEFAULT_WINDOW]
 
-        if len(sensor_readings) < 4:
+        if not series:
             raise HTTPException(status_code=404, detail="Не вистачає показників для розрахунку диагностики")
 
-        values = [reading.value for reading in sensor_readings]
-
-        mean_value = sum(values) / len(values)
-
         diagnostics = []
-        for reading in sensor_readings:
-            error = abs(reading.value - mean_value)
-            error_ratio = error / mean_value if mean_value != 0 else 0
-            diagnostics.append({
-                "reading_id": reading.reading_id,
-                "value": reading.value,
-                "error": error,
-                "error_ratio": error_ratio
-            })
+        for item in series:
+            mean_value = item["points"][-1]["mean"]
+            for point in reversed(item["points"]):
+                error = abs(point["value"] - mean_value)
+                diagnostics.append({
+                    "reading_id": point["reading_id"],
+                    "value_type": item["value_type"],
+                    "value": point["value"],
+                    "error": error,
+                    "error_ratio": error / mean_value if mean_value != 0 else 0
+                })
 
         return diagnostics
 
     except Exception as e:
         logger.exception(f"Помилка при розрахунку диагностики для device_id {device_id}: {str(e)}")
         raise HTTPException(status_code=500, detail="Внутрішня помилка сервера")
+
+
+@router.get("/sensor_readings/device/{device_id}/diagnostics", response_model=List[SensorReadingDiagnosticsSeries])
+async def get_device_diagnostics(
+    device_id: int,
+    window: int = Query(DEFAULT_WINDOW, ge=1, le=MAX_WINDOW),
+    points: int = Query(100, ge=1, le=MAX_DIAGNOSTIC_POINTS),
+    since: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    try:
+        windows = await fetch_windows(db, points, device_ids=[device_id], since=convert_to_naive(since))
+        return rolling(windows, window)
+    except Exception as e:
+        logger.exception(f"Error occurred while computing diagnostics for device ID {device_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
+@router.get("/sensor_readings/incubator/{incubator_id}/diagnostics", response_model=List[SensorReadingDiagnostics])
+async def get_incubator_diagnostics(
+    incubator_id: int,
+    window: int = Query(DEFAULT_WINDOW, ge=1, le=MAX_WINDOW),
+    since: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    try:
+        windows = await fetch_windows(db, window, incubator_id=incubator_id, since=convert_to_naive(since), full=False)
+        return summarize(windows)
+    except Exception as e:
+        logger.exception(f"Error occurred while computing diagnostics for incubator ID {incubator_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
+@router.get("/sensor_readings/diagnostics", response_model=List[SensorReadingDiagnostics])
+async def get_all_diagnostics(
+    window: int = Query(DEFAULT_WINDOW, ge=1, le=MAX_WINDOW),
+    since: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    try:
+        windows = await fetch_windows(db, window, since=convert_to_naive(since), full=False)
+        return summarize(windows)
+    except Exception as e:
+        logger.exception(f"Error occurred while computing diagnostics for all devices: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
@@ -0,0 +1,124 @@
+#app/api/stream.py
+import asyncio
+import json
+import logging
+from fastapi import APIRouter, HTTPException, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+from app.utils.broker import event_broker, SlowConsumer, Subscription
+
+router = APIRouter()
+
+logger = logging.getLogger(__name__)
+
+MAX_SUBSCRIPTION_IDS = 500
+SSE_KEEPALIVE_INTERVAL = 15
+SSE_RETRY_MS = 3000
+# "Try again later": the client fell behind and was dropped by the broker
+WS_SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+def parse_ids(ids) -> List[int]:
+    if ids is None:
+        return []
+    if isinstance(ids, str):
+        ids = [value for value in ids.split(",") if value.strip()]
+    parsed = [int(value) for value in ids]
+    if len(parsed) > MAX_SUBSCRIPTION_IDS:
+        raise ValueError(f"At most {MAX_SUBSCRIPTION_IDS} ids can be subscribed at once")
+    return parsed
+
+
+def parse_subscription(incubator_ids: Optional[str], device_ids: Optional[str]):
+    try:
+        incubators, devices = parse_ids(incubator_ids), parse_ids(device_ids)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="incubator_ids and device_ids must be comma-separated integers")
+    if not incubators and not devices:
+        raise HTTPException(status_code=400, detail="Subscribe to at least one incubator or device")
+    return incubators, devices
+
+
+@router.get("/stream/metrics", response_model=dict)
+async def get_stream_metrics():
+    return event_broker.metrics()
+
+
+async def _sse_events(request: Request, subscription: Subscription):
+    try:
+        yield f"retry: {SSE_RETRY_MS}\n\n"
+        while True:
+            try:
+                message = await asyncio.wait_for(subscription.get(), SSE_KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield ": keepalive\n\n"
+                continue
+            yield f"data: {message}\n\n"
+    except SlowConsumer:
+        yield "event: dropped\ndata: {}\n\n"
+    finally:
+        event_broker.unsubscribe(subscription)
+
+
+@router.get("/stream/sse")
+async def stream_events_sse(request: Request, incubator_ids: Optional[str] = None, device_ids: Optional[str] = None):
+    incubators, devices = parse_subscription(incubator_ids, device_ids)
+    subscription = event_broker.subscribe(incubators, devices)
+    return StreamingResponse(
+        _sse_events(request, subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _send_events(websocket: WebSocket, subscription: Subscription):
+    try:
+        while True:
+            await websocket.send_text(await subscription.get())
+    except SlowConsumer:
+        await websocket.close(code=WS_SLOW_CONSUMER_CLOSE_CODE)
+    except Exception as e:
+        logger.warning(f"Stopped sending events to WebSocket client: {str(e)}")
+
+
+# Clients can change what they follow without reconnecting:
+# {"action": "subscribe" | "unsubscribe", "incubator_ids": [...], "device_ids": [...]}
+@router.websocket("/stream/ws")
+async def stream_events_ws(websocket: WebSocket, incubator_ids: Optional[str] = None, device_ids: Optional[str] = None):
+    try:
+        incubators, devices = parse_ids(incubator_ids), parse_ids(device_ids)
+    except ValueError:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    subscription = event_broker.subscribe(incubators, devices)
+    sender = asyncio.create_task(_send_events(websocket, subscription))
+    try:
+        while True:
+            try:
+                command = json.loads(await websocket.receive_text())
+                action = command.get("action")
+                if action not in ("subscribe", "unsubscribe"):
+                    raise ValueError(f"Unknown action: {action}")
+                event_broker.update(
+                    subscription,
+                    parse_ids(command.get("incubator_ids")),
+                    parse_ids(command.get("device_ids")),
+                    remove=action == "unsubscribe",
+                )
+            except (AttributeError, TypeError, ValueError) as e:
+                await websocket.send_json({"type": "error", "detail": str(e)})
+                continue
+            await websocket.send_json({
+                "type": "subscription",
+                "incubator_ids": sorted(subscription.incubator_ids),
+                "device_ids": sorted(subscription.device_ids),
+            })
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        await asyncio.gather(sender, return_exceptions=True)
+        event_broker.unsubscribe(subscription)
@@ -0,0 +1,10 @@
+#app/api/system.py
+from fastapi import APIRouter
+from app.database import pool_metrics
+
+router = APIRouter()
+
+
+@router.get("/database/metrics", response_model=dict)
+async def get_database_metrics():
+    return pool_metrics()
@@ -1,24 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
-from starlette.responses import JSONResponse
 from app.models.user import User
 from app.schemas.user import UserCreate, UserUpdate, UserInDB, UserLogin
 from app.database import get_db
-from app.utils.verification import verify_password, hash_password
+from app.utils.verification import hash_password, verify_and_update_password, PasswordHasherBusy
 from typing import List
 import logging
 from sqlalchemy import select
 from app.dependencies import is_admin, is_user
-from app.utils.auth import create_access_token
+from app.utils.auth import create_access_token, utc_timestamp
+from app.utils import cluster
+from app.models.revoked_token import RevokedToken
 from app.dependencies import get_current_user
+from app.utils.pagination import PageParams, ndjson_response, set_next_cursor
 from datetime import datetime
 
 
 user_router = APIRouter()
 
 
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 @user_router.post("/users/", response_model=UserInDB, status_code=status.HTTP_201_CREATED)
@@ -28,14 +29,17 @@ async def register_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
         if existing_user:
             logger.error(f"User with email {user.email} already exists.")
             raise HTTPException(status_code=400, detail="User already exists")
+        await db.commit()
 
-        hashed_password = hash_password(user.password)
+        hashed_password = await hash_password(user.password)
         user_data = user.dict()
         user_data["password"] = hashed_password
 
         new_user = await User.create(db, user_data)
         logger.info(f"New user created with ID {new_user.user_id}")
         return new_user
+    except PasswordHasherBusy:
+        raise HTTPException(status_code=503, detail="Too many concurrent requests", headers={"Retry-After": "1"})
     except Exception as e:
         logger.exception(f"Error occurred: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
@@ -44,8 +48,21 @@ async def register_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
 @user_router.post("/users/login", response_model=str)
 async def login_user(user: UserLogin, db: AsyncSession = Depends(get_db)):
     user_from_db = await User.check_user_exists(db, user.email)
-    if not user_from_db or not verify_password(user.password, user_from_db.password):
+    if not user_from_db:
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    # Hand the connection back to the pool while bcrypt runs, a burst of logins must not starve other requests
+    await db.commit()
+    try:
+        verified, new_hash = await verify_and_update_password(user.password, user_from_db.password)
+    except PasswordHasherBusy:
+        raise HTTPException(status_code=503, detail="Too many concurrent requests", headers={"Retry-After": "1"})
+    if not verified:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+
+    if new_hash is not None:
+        # Stored with an outdated cost factor or scheme, upgraded now that the plain password is known
+        user_from_db.password = new_hash
+        await db.commit()
 
     if user_from_db.is_blocked:
         if user_from_db.blocked_until and user_from_db.blocked_until > datetime.utcnow():
@@ -59,6 +76,20 @@ async def login_user(user: UserLogin, db: AsyncSession = Depends(get_db)):
     return token
 
 
+@user_router.post("/users/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout_user(claims: dict = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    response = Response(status_code=status.HTTP_204_NO_CONTENT)
+    response.delete_cookie(key="access_token")
+    if not claims.get("jti") or not claims.get("exp"):
+        # Issued before tokens carried an id, it stays valid until it expires
+        return response
+    expires_at = datetime.utcfromtimestamp(claims["exp"])
+    await RevokedToken.revoke(db, claims["jti"], claims["sub"], expires_at)
+    cluster.token_revoked(claims["jti"], utc_timestamp(expires_at))
+    logger.info(f"Token of user {claims['sub']} revoked.")
+    return response
+
+
 @user_router.get("/users/{user_id}", response_model=UserInDB, dependencies=[Depends(get_current_user)])
 async def get_user(user_id: int, db: AsyncSession = Depends(get_db)):
     user = await User.get_by_id(db, user_id)
@@ -75,15 +106,21 @@ async def update_user(user_id: int, user_update: UserUpdate, db: AsyncSession =
 
     update_data = user_update.dict(exclude_unset=True)
     if "password" in update_data:
-        update_data["password"] = hash_password(update_data["password"])
+        try:
+            update_data["password"] = await hash_password(update_data["password"])
+        except PasswordHasherBusy:
+            raise HTTPException(status_code=503, detail="Too many concurrent requests", headers={"Retry-After": "1"})
 
     updated_user = await User.update(db, user_id, update_data)
     return updated_user
 
 
 @user_router.get("/users/", response_model=List[UserInDB], dependencies=[Depends(is_admin)])
-async def get_all_users(db: AsyncSession = Depends(get_db)):
-    users = await User.get_all_users(db)
+async def get_all_users(response: Response, page: PageParams = Depends(), db: AsyncSession = Depends(get_db)):
+    if page.stream:
+        return ndjson_response(await User.stream_all(db), UserInDB)
+    users, next_cursor = await User.get_page(db, page.after, page.limit)
+    set_next_cursor(response, next_cursor)
     return users
 
 
@@ -98,7 +135,7 @@ async def delete_user(user_id: int, db: AsyncSession = Depends(get_db)):
 @user_router.post("/users/{user_id}/block")
 async def block_user(user_id: int, block_minutes: int, db: AsyncSession = Depends(get_db)):
     try:
-        print(f"Blocking user with ID {user_id} for {block_minutes} minutes")
+        logger.info(f"Blocking user with ID {user_id} for {block_minutes} minutes")
 
         user = await User.block_user(db, user_id, block_minutes)
         if not user:
@@ -112,7 +149,7 @@ async def block_user(user_id: int, block_minutes: int, db: AsyncSession = Depend
 async def unblock_user(user_id: int, db: AsyncSession = Depends(get_db)):
     try:
 
-        print(f"Unblocking user with ID {user_id}")
+        logger.info(f"Unblocking user with ID {user_id}")
 
         user = await User.unblock_user(db, user_id)
         if not user:
@@ -120,15 +157,3 @@ async def unblock_user(user_id: int, db: AsyncSession = Depends(get_db)):
         return {"message": f"User {user.email} is unblocked"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
-
-
-@user_router.post("/users/logout", status_code=status.HTTP_200_OK)
-async def logout(response: JSONResponse):
-
-    try:
-        response.delete_cookie(key="access_token")
-
-        return {"message": "Successfully logged out"}
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error occurred while logging out: {str(e)}")
\ No newline at end of file
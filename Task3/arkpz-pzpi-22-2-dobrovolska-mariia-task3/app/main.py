@@ -1,16 +1,60 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.openapi.utils import get_openapi
 from starlette.responses import JSONResponse
-from app.database import init_db
+from app.database import init_db, AsyncSessionLocal
 from app.api import api_router
+from app.utils.ingestion import ingestion_buffer
+from app.utils.alert_rules import alert_rule_engine
+from app.utils.anomaly import anomaly_detector
+from app.utils.latest_readings import latest_readings
+from app.utils.liveness import device_liveness
+from app.utils.email import notification_dispatcher
+from app.utils.partitions import partition_manager
+from app.utils.pubsub import pubsub
+from app.utils.cluster import setup_cluster_sync
+from app.utils.verification import password_hasher
+from app.utils.auth import token_verifier
+from app.utils.device_auth import device_keys
+from app.utils.metrics import setup_metrics
+from app.utils.logging_setup import log_pipeline, setup_logging
 
 app = FastAPI()
 
 app.include_router(api_router)
 
+setup_cluster_sync()
+setup_metrics(app)
+setup_logging(app)
+
 @app.on_event("startup")
 async def startup():
     await init_db()
+    async with AsyncSessionLocal() as db:
+        await alert_rule_engine.load(db)
+        await latest_readings.load(db)
+        await device_liveness.load(db)
+        await token_verifier.load(db)
+        await device_keys.load(db)
+    await notification_dispatcher.start()
+    await alert_rule_engine.digest.start()
+    await partition_manager.start()
+    await pubsub.start()
+    await ingestion_buffer.start()
+    await device_liveness.start()
+    await anomaly_detector.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await ingestion_buffer.stop()
+    await device_liveness.stop()
+    await anomaly_detector.stop()
+    await pubsub.stop()
+    await alert_rule_engine.digest.stop()
+    await notification_dispatcher.stop()
+    await partition_manager.stop()
+    password_hasher.shutdown()
+    log_pipeline.stop()
 
 
 @app.exception_handler(HTTPException)
@@ -5,3 +5,6 @@ from .sensor_reading import SensorReading
 from .alert import Alert
 from .alert_history import AlertHistory
 from .user_incubator import UserIncubator
+from .sensor_reading_rollup import SensorReadingRollup
+from .revoked_token import RevokedToken
+from .device_nonce import DeviceNonce
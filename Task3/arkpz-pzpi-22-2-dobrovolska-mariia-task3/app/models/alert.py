@@ -1,19 +1,30 @@
 #app/models/alert.py
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Index, text
 from sqlalchemy.orm import relationship
 from app.database import Base
 from datetime import datetime
 from sqlalchemy.future import select
 from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from app.utils.pagination import DEFAULT_PAGE_SIZE, keyset_select, split_page, stream_select
 
 class Alert(Base):
     __tablename__ = 'alerts'
+    __table_args__ = (
+        # At most one open alert per incubator band, whichever worker opens it
+        Index(
+            'uq_alerts_open_band', 'incubator_id', 'band_metric', unique=True,
+            postgresql_where=text('resolved IS NOT TRUE AND band_metric IS NOT NULL'),
+        ),
+    )
 
     alert_id = Column(Integer, primary_key=True, index=True)
     incubator_id = Column(Integer, ForeignKey("incubators.incubator_id"), nullable=False)
     message = Column(String, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     resolved = Column(Boolean, default=False)
+    # Metric whose band was breached, for alerts raised by the rule engine; rebuilds its state after a restart
+    band_metric = Column(String)
 
     incubator = relationship("Incubator", back_populates="alerts")
     alert_history = relationship("AlertHistory", back_populates="alert")
@@ -36,9 +47,14 @@ class Alert(Base):
         return result.scalars().first()
 
     @classmethod
-    async def get_all(cls, session: AsyncSession):
-        result = await session.execute(select(cls))
-        return result.scalars().all()
+    async def get_page(cls, session: AsyncSession, after: Optional[int] = None, limit: int = DEFAULT_PAGE_SIZE):
+        stmt = keyset_select(select(cls), cls.alert_id, after, limit)
+        result = await session.execute(stmt)
+        return split_page(result.scalars().all(), "alert_id", limit)
+
+    @classmethod
+    async def stream_all(cls, session: AsyncSession):
+        return await session.stream_scalars(stream_select(select(cls), cls.alert_id))
 
     @classmethod
     async def update(cls, session: AsyncSession, alert_id: int, update_data: dict):
@@ -5,6 +5,8 @@ from app.database import Base
 from datetime import datetime
 from sqlalchemy.future import select
 from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from app.utils.pagination import DEFAULT_PAGE_SIZE, keyset_select, split_page, stream_select
 
 class AlertHistory(Base):
     __tablename__ = 'alert_history'
@@ -30,10 +32,14 @@ class AlertHistory(Base):
             raise e
 
     @classmethod
-    async def get_all(cls, db_session: AsyncSession):
-        stmt = select(cls)
+    async def get_page(cls, db_session: AsyncSession, after: Optional[int] = None, limit: int = DEFAULT_PAGE_SIZE):
+        stmt = keyset_select(select(cls), cls.history_id, after, limit)
         result = await db_session.execute(stmt)
-        return result.scalars().all()
+        return split_page(result.scalars().all(), "history_id", limit)
+
+    @classmethod
+    async def stream_all(cls, db_session: AsyncSession):
+        return await db_session.stream_scalars(stream_select(select(cls), cls.history_id))
 
     @classmethod
     async def get_by_id(cls, db_session: AsyncSession, history_id: int):
@@ -6,6 +6,8 @@ from sqlalchemy.future import select
 from app.database import Base
 from datetime import datetime
 from app.schemas.device import DeviceInDB
+from typing import List, Optional
+from app.utils.pagination import DEFAULT_PAGE_SIZE, keyset_select, split_page, stream_select
 
 class Device(Base):
     __tablename__ = 'devices'
@@ -14,6 +16,12 @@ class Device(Base):
     device_type = Column(String, nullable=False)
     incubator_id = Column(Integer, ForeignKey("incubators.incubator_id"), nullable=False)
     last_reported_at = Column(DateTime)
+    # Expected seconds between two reports, DEFAULT_REPORT_INTERVAL in app/utils/liveness.py when not set
+    report_interval = Column(Integer)
+    # Open "device offline" alert, set while the device is considered offline
+    offline_alert_id = Column(Integer, ForeignKey("alerts.alert_id", ondelete="SET NULL"))
+    # Shared secret the device signs its requests with, see app/utils/device_auth.py
+    api_secret = Column(String)
 
     incubator = relationship("Incubator", back_populates="devices")
     sensor_readings = relationship("SensorReading", back_populates="device")
@@ -41,10 +49,14 @@ class Device(Base):
         return None
 
     @classmethod
-    async def get_all(cls, db_session: AsyncSession):
-        stmt = select(cls)
+    async def get_page(cls, db_session: AsyncSession, after: Optional[int] = None, limit: int = DEFAULT_PAGE_SIZE):
+        stmt = keyset_select(select(cls), cls.device_id, after, limit)
         result = await db_session.execute(stmt)
-        return result.scalars().all()
+        return split_page(result.scalars().all(), "device_id", limit)
+
+    @classmethod
+    async def stream_all(cls, db_session: AsyncSession):
+        return await db_session.stream_scalars(stream_select(select(cls), cls.device_id))
 
     @classmethod
     async def update(cls, db_session: AsyncSession, device_id: int, update_data: dict):
@@ -65,6 +77,28 @@ class Device(Base):
         await db_session.refresh(device)
         return device
 
+    @classmethod
+    async def set_api_secret(cls, db_session: AsyncSession, device_id: int, api_secret: Optional[str]):
+        try:
+            result = await db_session.execute(select(cls).where(cls.device_id == device_id))
+            device = result.scalars().first()
+            if not device:
+                return None
+            device.api_secret = api_secret
+            await db_session.commit()
+            return device
+        except Exception as e:
+            await db_session.rollback()
+            raise e
+
+    @classmethod
+    async def get_api_secrets(cls, db_session: AsyncSession, device_ids: Optional[List[int]] = None):
+        stmt = select(cls.device_id, cls.api_secret).where(cls.api_secret.isnot(None))
+        if device_ids is not None:
+            stmt = stmt.where(cls.device_id.in_(device_ids))
+        result = await db_session.execute(stmt)
+        return result.all()
+
     @classmethod
     async def delete_by_id(cls, db_session: AsyncSession, device_id: int):
         try:
@@ -0,0 +1,44 @@
+#app/models/device_nonce.py
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, delete
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import Base
+from datetime import datetime
+
+# Nonces of signed device requests, shared by all workers so a captured request cannot be
+# replayed on another one. Rows are only needed for the signature window. Unlogged: losing
+# them in a crash only reopens that window, and writes skip the WAL.
+class DeviceNonce(Base):
+    __tablename__ = 'device_nonces'
+    __table_args__ = {'prefixes': ['UNLOGGED']}
+
+    device_id = Column(Integer, ForeignKey("devices.device_id", ondelete="CASCADE"), primary_key=True)
+    nonce = Column(String(64), primary_key=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+    @classmethod
+    async def claim(cls, db_session: AsyncSession, device_id: int, nonce: str, expires_at: datetime) -> bool:
+        # False when the nonce was already used, by this worker or any other
+        try:
+            result = await db_session.execute(
+                insert(cls)
+                .values(device_id=device_id, nonce=nonce, expires_at=expires_at)
+                .on_conflict_do_nothing(index_elements=[cls.device_id, cls.nonce])
+                .returning(cls.device_id)
+            )
+            claimed = result.first() is not None
+            await db_session.commit()
+            return claimed
+        except Exception as e:
+            await db_session.rollback()
+            raise e
+
+    @classmethod
+    async def delete_expired(cls, db_session: AsyncSession):
+        try:
+            result = await db_session.execute(delete(cls).where(cls.expires_at <= datetime.utcnow()))
+            await db_session.commit()
+            return result.rowcount
+        except Exception as e:
+            await db_session.rollback()
+            raise e
@@ -11,6 +11,8 @@ from app.models.device import Device
 from app.models.alert import Alert
 from sqlalchemy import update
 from sqlalchemy import delete
+from typing import Optional
+from app.utils.pagination import DEFAULT_PAGE_SIZE, keyset_select, split_page, stream_select
 
 class Incubator(Base):
     __tablename__ = 'incubators'
@@ -39,10 +41,14 @@ class Incubator(Base):
         return incubator
 
     @classmethod
-    async def get_all(cls, db_session):
-        result = await db_session.execute(cls.__table__.select())
-        incubators = result.fetchall()
-        return [IncubatorInDB.from_orm(incubator) for incubator in incubators]
+    async def get_page(cls, db_session, after: Optional[int] = None, limit: int = DEFAULT_PAGE_SIZE):
+        stmt = keyset_select(select(cls), cls.incubator_id, after, limit)
+        result = await db_session.execute(stmt)
+        return split_page(result.scalars().all(), "incubator_id", limit)
+
+    @classmethod
+    async def stream_all(cls, db_session):
+        return await db_session.stream_scalars(stream_select(select(cls), cls.incubator_id))
 
     @classmethod
     async def get_by_id(cls, db_session, incubator_id: int):
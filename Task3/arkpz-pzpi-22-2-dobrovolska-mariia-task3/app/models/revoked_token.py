@@ -0,0 +1,47 @@
+#app/models/revoked_token.py
+from sqlalchemy import Column, String, DateTime, delete
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.future import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import Base
+from datetime import datetime
+
+# Denylist of access tokens revoked before their expiry, by JWT id. Rows are only
+# needed until the token would have expired anyway.
+class RevokedToken(Base):
+    __tablename__ = 'revoked_tokens'
+
+    jti = Column(String, primary_key=True)
+    subject = Column(String, nullable=False, index=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    revoked_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    @classmethod
+    async def revoke(cls, db_session: AsyncSession, jti: str, subject: str, expires_at: datetime):
+        try:
+            await db_session.execute(
+                insert(cls)
+                .values(jti=jti, subject=subject, expires_at=expires_at, revoked_at=datetime.utcnow())
+                .on_conflict_do_nothing(index_elements=[cls.jti])
+            )
+            await db_session.commit()
+        except Exception as e:
+            await db_session.rollback()
+            raise e
+
+    @classmethod
+    async def get_active(cls, db_session: AsyncSession):
+        result = await db_session.execute(
+            select(cls.jti, cls.expires_at).where(cls.expires_at > datetime.utcnow())
+        )
+        return result.all()
+
+    @classmethod
+    async def delete_expired(cls, db_session: AsyncSession):
+        try:
+            result = await db_session.execute(delete(cls).where(cls.expires_at <= datetime.utcnow()))
+            await db_session.commit()
+            return result.rowcount
+        except Exception as e:
+            await db_session.rollback()
+            raise e
@@ -1,13 +1,18 @@
 # app/models/sensor_reading.py
-from sqlalchemy import Column, Integer, ForeignKey, Float, DateTime, Enum as SQLAlchemyEnum
+from sqlalchemy import Column, Integer, ForeignKey, Float, DateTime, Index, Enum as SQLAlchemyEnum
 from sqlalchemy.orm import relationship
 from sqlalchemy.future import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import Base
+from app.models.device import Device
 from app.schemas.sensor_reading import SensorReadingInDB
 from enum import Enum as Enum
-from sqlalchemy import desc
-from typing import List
+from sqlalchemy import insert
+from typing import List, Optional, Tuple
+from datetime import datetime
+from app.utils.pagination import (
+    DEFAULT_PAGE_SIZE, keyset_select, split_page, split_time_page, stream_select, time_keyset_select,
+)
 
 class ValueType(str, Enum):
     temperature = "temperature"
@@ -15,12 +20,23 @@ class ValueType(str, Enum):
 
 class SensorReading(Base):
     __tablename__ = 'sensor_readings'
+    __table_args__ = (
+        # Covers per-device time-range scans so they can be answered from the index alone
+        Index(
+            'ix_sensor_readings_device_id_recorded_at', 'device_id', 'recorded_at',
+            postgresql_include=['value_type', 'value', 'reading_id'],
+        ),
+        Index('ix_sensor_readings_recorded_at_brin', 'recorded_at', postgresql_using='brin'),
+        # Range partitions by recorded_at are created and dropped by app/utils/partitions.py
+        {'postgresql_partition_by': 'RANGE (recorded_at)'},
+    )
 
-    reading_id = Column(Integer, primary_key=True, index=True)
+    # The partition key has to be part of the primary key of a partitioned table
+    reading_id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     device_id = Column(Integer, ForeignKey("devices.device_id"), nullable=False)
     value_type = Column(SQLAlchemyEnum(ValueType, native_enum=False), nullable=False)
     value = Column(Float, nullable=False)
-    recorded_at = Column(DateTime)
+    recorded_at = Column(DateTime, primary_key=True, nullable=False, default=datetime.utcnow)
 
     device = relationship("Device", back_populates="sensor_readings")
 
@@ -29,6 +45,8 @@ class SensorReading(Base):
         try:
             if 'value_type' in sensor_readings_data and isinstance(sensor_readings_data['value_type'], str):
                 sensor_readings_data['value_type'] = ValueType(sensor_readings_data['value_type'])
+            if not sensor_readings_data.get('recorded_at'):
+                sensor_readings_data['recorded_at'] = datetime.utcnow()
 
             sensor_readings = cls(**sensor_readings_data)
             db_session.add(sensor_readings)
@@ -39,6 +57,29 @@ class SensorReading(Base):
             await db_session.rollback()
             raise e
 
+    @classmethod
+    async def bulk_create(cls, db_session: AsyncSession, sensor_readings_data: List[dict], commit: bool = True):
+        if not sensor_readings_data:
+            return []
+        try:
+            now = datetime.utcnow()
+            for data in sensor_readings_data:
+                if 'value_type' in data and isinstance(data['value_type'], str):
+                    data['value_type'] = ValueType(data['value_type'])
+                if not data.get('recorded_at'):
+                    data['recorded_at'] = now
+
+            # Single multi-row INSERT ... RETURNING for the whole batch, rows come back in input order
+            stmt = insert(cls).returning(cls, sort_by_parameter_order=True)
+            result = await db_session.scalars(stmt, sensor_readings_data)
+            sensor_readings = result.all()
+            if commit:
+                await db_session.commit()
+            return sensor_readings
+        except Exception as e:
+            await db_session.rollback()
+            raise e
+
     @classmethod
     async def get_by_id(cls, db_session: AsyncSession, reading_id: int):
         stmt = select(cls).where(cls.reading_id == reading_id)
@@ -47,18 +88,61 @@ class SensorReading(Base):
         return sensor_reading
 
     @classmethod
-    async def get_by_device_id(cls, db_session: AsyncSession, device_id: int) -> List[SensorReadingInDB]:
+    async def get_page_by_device_id(
+        cls, db_session: AsyncSession, device_id: int, after: Optional[Tuple[datetime, int]] = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+    ):
+        stmt = select(cls).where(cls.device_id == device_id)
+        stmt = time_keyset_select(stmt, cls.recorded_at, cls.reading_id, after, limit)
+        result = await db_session.execute(stmt)
+        return split_time_page(result.scalars().all(), "recorded_at", "reading_id", limit)
+
+    @classmethod
+    async def stream_by_device_id(cls, db_session: AsyncSession, device_id: int):
         stmt = select(cls).where(cls.device_id == device_id)
+        return await db_session.stream_scalars(stream_select(stmt, cls.recorded_at, cls.reading_id))
+
+    @classmethod
+    def _range_filters(cls, stmt, start: Optional[datetime], end: Optional[datetime], value_type: Optional[str]):
+        if start is not None:
+            stmt = stmt.where(cls.recorded_at >= start)
+        if end is not None:
+            stmt = stmt.where(cls.recorded_at < end)
+        if value_type is not None:
+            stmt = stmt.where(cls.value_type == ValueType(value_type))
+        return stmt
+
+    @classmethod
+    async def get_range_by_device_id(
+        cls, db_session: AsyncSession, device_id: int, start: Optional[datetime] = None,
+        end: Optional[datetime] = None, value_type: Optional[str] = None, limit: int = 1000,
+    ):
+        stmt = cls._range_filters(select(cls).where(cls.device_id == device_id), start, end, value_type)
+        stmt = stmt.order_by(cls.recorded_at).limit(limit)
         result = await db_session.execute(stmt)
-        sensor_readings = result.scalars().all()
-        return [SensorReadingInDB.from_orm(reading) for reading in sensor_readings]
+        return result.scalars().all()
 
     @classmethod
-    async def get_all(cls, db_session: AsyncSession):
-        stmt = select(cls)
+    async def get_range_by_incubator_id(
+        cls, db_session: AsyncSession, incubator_id: int, start: Optional[datetime] = None,
+        end: Optional[datetime] = None, value_type: Optional[str] = None, limit: int = 1000,
+    ):
+        device_ids = select(Device.device_id).where(Device.incubator_id == incubator_id)
+        stmt = cls._range_filters(select(cls).where(cls.device_id.in_(device_ids)), start, end, value_type)
+        stmt = stmt.order_by(cls.recorded_at, cls.device_id).limit(limit)
         result = await db_session.execute(stmt)
         return result.scalars().all()
 
+    @classmethod
+    async def get_page(cls, db_session: AsyncSession, after: Optional[int] = None, limit: int = DEFAULT_PAGE_SIZE):
+        stmt = keyset_select(select(cls), cls.reading_id, after, limit)
+        result = await db_session.execute(stmt)
+        return split_page(result.scalars().all(), "reading_id", limit)
+
+    @classmethod
+    async def stream_all(cls, db_session: AsyncSession):
+        return await db_session.stream_scalars(stream_select(select(cls), cls.reading_id))
+
     @classmethod
     async def update(cls, db_session: AsyncSession, reading_id: int, update_data: dict):
         stmt = select(cls).where(cls.reading_id == reading_id)
@@ -74,9 +158,3 @@ class SensorReading(Base):
         await db_session.commit()
         await db_session.refresh(sensor_reading)
         return sensor_reading
-
-    @classmethod
-    async def get_last_four_by_device_id(cls, db_session: AsyncSession, device_id: int):
-        stmt = select(cls).where(cls.device_id == device_id).order_by(desc(cls.recorded_at)).limit(4)
-        result = await db_session.execute(stmt)
-        return result.scalars().all()
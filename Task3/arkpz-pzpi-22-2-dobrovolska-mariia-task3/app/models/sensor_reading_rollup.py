@@ -0,0 +1,62 @@
+# app/models/sensor_reading_rollup.py
+from sqlalchemy import Column, Integer, String, ForeignKey, Float, DateTime, Enum as SQLAlchemyEnum
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.future import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func
+from app.database import Base
+from app.models.sensor_reading import ValueType
+from typing import List, Optional
+from datetime import datetime
+
+# Nine bind parameters per row, asyncpg accepts at most 32767 in one statement
+UPSERT_CHUNK_ROWS = 3000
+
+
+class SensorReadingRollup(Base):
+    __tablename__ = 'sensor_reading_rollups'
+
+    # Primary key order matches the series query: one resolution, one device, one metric, a bucket range
+    resolution = Column(String(2), primary_key=True)
+    device_id = Column(Integer, ForeignKey("devices.device_id"), primary_key=True)
+    value_type = Column(SQLAlchemyEnum(ValueType, native_enum=False), primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    count = Column(Integer, nullable=False)
+    value_sum = Column(Float, nullable=False)
+    value_sum_sq = Column(Float, nullable=False)
+    min_value = Column(Float, nullable=False)
+    max_value = Column(Float, nullable=False)
+
+    @classmethod
+    async def upsert(cls, db_session: AsyncSession, rollups_data: List[dict]):
+        # Runs inside the caller's transaction, together with the readings it aggregates
+        for offset in range(0, len(rollups_data), UPSERT_CHUNK_ROWS):
+            stmt = insert(cls).values(rollups_data[offset:offset + UPSERT_CHUNK_ROWS])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[cls.resolution, cls.device_id, cls.value_type, cls.bucket_start],
+                set_={
+                    "count": cls.count + stmt.excluded.count,
+                    "value_sum": cls.value_sum + stmt.excluded.value_sum,
+                    "value_sum_sq": cls.value_sum_sq + stmt.excluded.value_sum_sq,
+                    "min_value": func.least(cls.min_value, stmt.excluded.min_value),
+                    "max_value": func.greatest(cls.max_value, stmt.excluded.max_value),
+                },
+            )
+            await db_session.execute(stmt)
+
+    @classmethod
+    async def get_series(
+        cls, db_session: AsyncSession, resolution: str, device_id: int, start: datetime,
+        end: datetime, value_type: Optional[str] = None,
+    ):
+        stmt = select(cls).where(
+            cls.resolution == resolution,
+            cls.device_id == device_id,
+            cls.bucket_start >= start,
+            cls.bucket_start < end,
+        )
+        if value_type is not None:
+            stmt = stmt.where(cls.value_type == ValueType(value_type))
+        stmt = stmt.order_by(cls.value_type, cls.bucket_start)
+        result = await db_session.execute(stmt)
+        return result.scalars().all()
@@ -7,6 +7,8 @@ from enum import Enum
 from sqlalchemy.orm import relationship
 from fastapi import HTTPException
 import logging
+from typing import Optional
+from app.utils.pagination import DEFAULT_PAGE_SIZE, keyset_select, split_page, stream_select
 
 
 logger = logging.getLogger(__name__)
@@ -97,7 +99,11 @@ class User(Base):
         return db_user
 
     @classmethod
-    async def get_all_users(cls, db_session: AsyncSession):
-        stmt = select(cls)
+    async def get_page(cls, db_session: AsyncSession, after: Optional[int] = None, limit: int = DEFAULT_PAGE_SIZE):
+        stmt = keyset_select(select(cls), cls.user_id, after, limit)
         result = await db_session.execute(stmt)
-        return result.scalars().all()
+        return split_page(result.scalars().all(), "user_id", limit)
+
+    @classmethod
+    async def stream_all(cls, db_session: AsyncSession):
+        return await db_session.stream_scalars(stream_select(select(cls), cls.user_id))
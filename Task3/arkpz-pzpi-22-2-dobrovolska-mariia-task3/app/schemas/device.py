@@ -1,5 +1,5 @@
 #app/schemas/device.py
-from pydantic import BaseModel
+from pydantic import BaseModel, conint
 from typing import Optional
 from datetime import datetime
 
@@ -8,6 +8,7 @@ class DeviceBase(BaseModel):
     device_type: str
     incubator_id: int
     last_reported_at: Optional[datetime]
+    report_interval: Optional[conint(gt=0)] = None
 
 
 class DeviceCreate(DeviceBase):
@@ -18,10 +19,12 @@ class DeviceUpdate(BaseModel):
     device_type: Optional[str] = None
     incubator_id: Optional[int] = None
     last_reported_at: Optional[datetime] = None
+    report_interval: Optional[conint(gt=0)] = None
 
 
 class DeviceInDB(DeviceBase):
     device_id: int
+    offline_alert_id: Optional[int] = None
 
     class Config:
         orm_mode = True
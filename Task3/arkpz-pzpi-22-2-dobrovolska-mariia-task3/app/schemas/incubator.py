@@ -1,5 +1,5 @@
 #app/schemas/incubator.py
-from datetime import date
+from datetime import date, datetime
 from pydantic import BaseModel, Field
 from typing import Optional
 
@@ -28,3 +28,13 @@ class IncubatorInDB(IncubatorBase):
 
     class Config:
         orm_mode = True
+
+class CurrentReading(BaseModel):
+    device_id: int
+    value: float
+    recorded_at: datetime
+
+class IncubatorCurrentState(BaseModel):
+    incubator_id: int
+    temperature: Optional[CurrentReading] = None
+    humidity: Optional[CurrentReading] = None
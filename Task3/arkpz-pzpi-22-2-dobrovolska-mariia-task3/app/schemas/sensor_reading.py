@@ -1,6 +1,6 @@
 # app/schemas/sensor_reading.py
 from pydantic import BaseModel, validator
-from typing import Optional
+from typing import Optional, List
 from datetime import datetime
 
 class SensorReadingBase(BaseModel):
@@ -32,3 +32,56 @@ class SensorReadingInDB(SensorReadingBase):
 
     class Config:
         orm_mode = True
+
+class SensorReadingBulkError(BaseModel):
+    index: int
+    detail: str
+
+class SensorReadingBulkResult(BaseModel):
+    created: List[SensorReadingInDB]
+    errors: List[SensorReadingBulkError]
+
+class SensorReadingSeriesPoint(BaseModel):
+    value_type: str
+    bucket_start: datetime
+    count: int
+    avg: float
+    min: float
+    max: float
+    stddev: Optional[float]
+
+class SensorReadingSeries(BaseModel):
+    device_id: int
+    resolution: str
+    points: List[SensorReadingSeriesPoint]
+
+class SensorReadingDiagnostics(BaseModel):
+    device_id: int
+    value_type: str
+    count: int
+    last_recorded_at: datetime
+    last_value: Optional[float]
+    mean: Optional[float]
+    stddev: Optional[float]
+    min: Optional[float]
+    max: Optional[float]
+    error_ratio: Optional[float]
+    max_error_ratio: Optional[float]
+    rate_of_change: Optional[float]
+
+class SensorReadingDiagnosticsPoint(BaseModel):
+    reading_id: int
+    recorded_at: datetime
+    value: float
+    mean: Optional[float]
+    stddev: Optional[float]
+    min: Optional[float]
+    max: Optional[float]
+    error_ratio: Optional[float]
+    rate_of_change: Optional[float]
+
+class SensorReadingDiagnosticsSeries(BaseModel):
+    device_id: int
+    value_type: str
+    window: int
+    points: List[SensorReadingDiagnosticsPoint]
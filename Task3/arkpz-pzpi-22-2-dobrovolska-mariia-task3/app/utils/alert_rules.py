@@ -0,0 +1,468 @@
+# app/utils/alert_rules.py
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import func, insert, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from app.models.alert import Alert
+from app.models.alert_history import AlertHistory
+from app.models.device import Device
+from app.models.incubator import Incubator
+from app.models.user import User
+from app.models.user_incubator import UserIncubator
+from app.utils.broker import alert_event, event_broker
+from app.utils.email import send_email_notification
+
+logger = logging.getLogger(__name__)
+
+TEMPERATURE_TOLERANCE = 1.0
+HUMIDITY_TOLERANCE = 5.0
+# A breached metric only clears once it is back inside the band narrowed by this share of the tolerance
+EXIT_MARGIN_RATIO = 0.2
+# A metric that breaches again this soon after clearing reopens its previous alert silently
+SUPPRESSION_WINDOW = 300
+DIGEST_INTERVAL = 60
+ALERT_CREATED_BY = "system"
+
+UNITS = {"temperature": "°C", "humidity": "%"}
+# Marks the alert events of band breaches, other workers apply them to their own states
+BAND_ALERT_SOURCE = "band"
+
+
+def metric_name(value_type) -> str:
+    return getattr(value_type, "value", value_type)
+
+
+class AlertState:
+    __slots__ = ("alert_id", "active", "changed_at", "inserted")
+
+    def __init__(self, active: bool, changed_at: float, alert_id: Optional[int] = None):
+        self.alert_id = alert_id
+        self.active = active
+        self.changed_at = changed_at
+        # Set once the batch that opened the alert has committed it, or failed to
+        self.inserted: Optional[asyncio.Event] = None if alert_id is not None else asyncio.Event()
+
+
+# Groups alert notifications per recipient and sends one email per interval
+class AlertDigest:
+    def __init__(self, interval: float = DIGEST_INTERVAL):
+        self.interval = interval
+        self._pending: Dict[str, List[str]] = defaultdict(list)
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, emails: Iterable[str], line: str):
+        for email in emails:
+            self._pending[email].append(line)
+
+    def flush(self):
+        pending, self._pending = self._pending, defaultdict(list)
+        for email, lines in pending.items():
+            subject = f"Incubator alerts: {len(lines)} new event(s)"
+            body = (
+                f"Dear User,\n\n"
+                f"The following events were registered by your incubators:\n\n"
+                + "\n".join(f"- {line}" for line in lines)
+                + f"\n\nPlease take necessary actions.\n\n"
+                f"Best Regards,\n"
+                f"Your Monitoring System"
+            )
+            send_email_notification(email, subject, body)
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.exception(f"Error occurred while sending alert digest: {str(e)}")
+
+
+# Compiled in-memory copy of the alert bands: device_id -> incubator_id and
+# incubator_id -> {metric: (low, high, exit_low, exit_high)}, so checking a reading is a pair of
+# dict lookups. Alert state is tracked per (incubator, metric) with hysteresis, so a sustained
+# excursion produces one alert rather than one per reading.
+class AlertRuleEngine:
+    def __init__(
+        self,
+        temperature_tolerance: float = TEMPERATURE_TOLERANCE,
+        humidity_tolerance: float = HUMIDITY_TOLERANCE,
+        digest: Optional[AlertDigest] = None,
+    ):
+        self.tolerances = {"temperature": temperature_tolerance, "humidity": humidity_tolerance}
+        self.digest = digest or AlertDigest()
+        # None marks devices looked up without an incubator, so they are not queried on every batch
+        self._device_incubator: Dict[int, Optional[int]] = {}
+        self._bands: Dict[int, Dict[str, Tuple[float, float, float, float]]] = {}
+        self._recipients: Dict[int, List[str]] = {}
+        self._states: Dict[Tuple[int, str], AlertState] = {}
+        self.loaded = False
+
+    async def load(self, db_session: AsyncSession):
+        devices = await db_session.execute(select(Device.device_id, Device.incubator_id))
+        incubators = await db_session.execute(
+            select(Incubator.incubator_id, Incubator.target_temperature, Incubator.target_humidity)
+        )
+        recipients = await db_session.execute(
+            select(UserIncubator.incubator_id, User.email).join(User, User.user_id == UserIncubator.user_id)
+        )
+        open_alerts = await db_session.execute(
+            select(Alert.incubator_id, Alert.band_metric, func.max(Alert.alert_id))
+            .where(Alert.resolved.is_not(True), Alert.band_metric.is_not(None))
+            .group_by(Alert.incubator_id, Alert.band_metric)
+        )
+        self._device_incubator = {device_id: incubator_id for device_id, incubator_id in devices.all()}
+        self._bands = {}
+        for incubator_id, target_temperature, target_humidity in incubators.all():
+            self._compile(incubator_id, target_temperature, target_humidity)
+        self._recipients = {incubator_id: [] for incubator_id in self._bands}
+        for incubator_id, email in recipients.all():
+            self._recipients.setdefault(incubator_id, []).append(email)
+        self._rebuild_states({(incubator_id, metric): alert_id for incubator_id, metric, alert_id in open_alerts.all()})
+        self.loaded = True
+        logger.info(
+            f"Alert rules loaded for {len(self._bands)} incubators and {len(self._device_incubator)} devices, "
+            f"{sum(state.active for state in self._states.values())} alerts open."
+        )
+
+    def _rebuild_states(self, open_alerts: Dict[Tuple[int, str], int]):
+        # An excursion still going on keeps its alert across restarts and resyncs. States of this
+        # process win where the database may lag behind them: alerts being inserted or resolved
+        # by a batch in flight, and resolved ones kept for the suppression window.
+        now = time.monotonic()
+        states = {}
+        for key, alert_id in open_alerts.items():
+            state = self._states.get(key)
+            if state is None or state.alert_id not in (None, alert_id):
+                state = AlertState(active=True, changed_at=now, alert_id=alert_id)
+            states[key] = state
+        for key, state in self._states.items():
+            if key not in states and (not state.active or state.alert_id is None):
+                states[key] = state
+        self._states = states
+
+    def _compile(self, incubator_id: int, target_temperature: float, target_humidity: float):
+        targets = {"temperature": target_temperature, "humidity": target_humidity}
+        bands = {}
+        for metric, target in targets.items():
+            if target is None:
+                continue
+            tolerance = self.tolerances[metric]
+            exit_tolerance = tolerance * (1 - EXIT_MARGIN_RATIO)
+            bands[metric] = (target - tolerance, target + tolerance, target - exit_tolerance, target + exit_tolerance)
+        self._bands[incubator_id] = bands
+
+    def refresh_incubator(self, incubator):
+        self._compile(incubator.incubator_id, incubator.target_temperature, incubator.target_humidity)
+        # Owners may have changed, they are looked up again on the next alert
+        self._recipients.pop(incubator.incubator_id, None)
+
+    def forget_incubator(self, incubator_id: int):
+        self._bands.pop(incubator_id, None)
+        self._recipients.pop(incubator_id, None)
+        for device_id in [d for d, i in self._device_incubator.items() if i == incubator_id]:
+            del self._device_incubator[device_id]
+        for key in [key for key in self._states if key[0] == incubator_id]:
+            del self._states[key]
+
+    def refresh_device(self, device):
+        self._device_incubator[device.device_id] = device.incubator_id
+
+    def forget_device(self, device_id: int):
+        self._device_incubator.pop(device_id, None)
+
+    def incubator_for_device(self, device_id: int) -> Optional[int]:
+        return self._device_incubator.get(device_id)
+
+    def band_for(self, incubator_id: int, value_type) -> Optional[Tuple[float, float]]:
+        bands = self._bands.get(incubator_id)
+        band = bands.get(metric_name(value_type)) if bands else None
+        return band[:2] if band else None
+
+    async def _resolve_missing(self, db_session: AsyncSession, device_ids: Iterable[int]):
+        # Devices created by another worker or before the last load: one query per batch, then cached
+        missing = {device_id for device_id in device_ids if device_id not in self._device_incubator}
+        if not missing:
+            return
+        result = await db_session.execute(
+            select(Device.device_id, Incubator.incubator_id, Incubator.target_temperature, Incubator.target_humidity)
+            .join(Incubator, Incubator.incubator_id == Device.incubator_id)
+            .where(Device.device_id.in_(missing))
+        )
+        for device_id, incubator_id, target_temperature, target_humidity in result.all():
+            self._device_incubator[device_id] = incubator_id
+            missing.discard(device_id)
+            if incubator_id not in self._bands:
+                self._compile(incubator_id, target_temperature, target_humidity)
+        # Replaced by refresh_device once the device is assigned, on this worker or through pub/sub
+        for device_id in missing:
+            self._device_incubator[device_id] = None
+
+    async def _resolve_recipients(self, db_session: AsyncSession, incubator_ids: Iterable[int]):
+        missing = {incubator_id for incubator_id in incubator_ids if incubator_id not in self._recipients}
+        if not missing:
+            return
+        result = await db_session.execute(
+            select(UserIncubator.incubator_id, User.email)
+            .join(User, User.user_id == UserIncubator.user_id)
+            .where(UserIncubator.incubator_id.in_(missing))
+        )
+        for incubator_id in missing:
+            self._recipients[incubator_id] = []
+        for incubator_id, email in result.all():
+            self._recipients[incubator_id].append(email)
+
+    def evaluate(self, sensor_reading) -> Optional[Tuple[int, str, bool]]:
+        # Returns (incubator_id, metric, breached): breached is True outside the band,
+        # False back inside the exit band and None in the hysteresis zone in between
+        incubator_id = self._device_incubator.get(sensor_reading.device_id)
+        if incubator_id is None:
+            return None
+        metric = metric_name(sensor_reading.value_type)
+        bands = self._bands.get(incubator_id)
+        band = bands.get(metric) if bands else None
+        if band is None:
+            return None
+        low, high, exit_low, exit_high = band
+        value = sensor_reading.value
+        if value < low or value > high:
+            return incubator_id, metric, True
+        if exit_low <= value <= exit_high:
+            return incubator_id, metric, False
+        return incubator_id, metric, None
+
+    def describe(self, incubator_id: int, metric: str, sensor_reading) -> str:
+        low, high = self.band_for(incubator_id, metric)
+        unit = UNITS.get(metric, "")
+        direction = "above" if sensor_reading.value > high else "below"
+        return (
+            f"{metric.capitalize()} {sensor_reading.value}{unit} is {direction} the allowed range "
+            f"{low:g}-{high:g}{unit} (device {sensor_reading.device_id})"
+        )
+
+    async def raise_alerts(self, db_session: AsyncSession, sensor_readings: List) -> List[Alert]:
+        if not sensor_readings:
+            return []
+        if not self.loaded:
+            await self.load(db_session)
+        await self._resolve_missing(db_session, {reading.device_id for reading in sensor_readings})
+
+        # State transitions are decided synchronously, before any await, so concurrent
+        # batches for the same incubator never open the same alert twice
+        now = time.monotonic()
+        opened: List[Tuple[Tuple[int, str], AlertState, str]] = []
+        reopened: List[Tuple[Tuple[int, str], AlertState]] = []
+        resolved: List[Tuple[Tuple[int, str], AlertState]] = []
+        notifications: List[Tuple[AlertState, int, str]] = []
+        transitions: List[Tuple[int, str, str, AlertState, str]] = []
+        for sensor_reading in sensor_readings:
+            result = self.evaluate(sensor_reading)
+            if result is None or result[2] is None:
+                continue
+            incubator_id, metric, breached = result
+            key = (incubator_id, metric)
+            state = self._states.get(key)
+            if breached:
+                if state and state.active:
+                    continue
+                message = self.describe(incubator_id, metric, sensor_reading)
+                if state and state.alert_id is not None and now - state.changed_at < SUPPRESSION_WINDOW:
+                    state.active = True
+                    state.changed_at = now
+                    reopened.append((key, state))
+                    transitions.append((incubator_id, metric, "reopened", state, message))
+                    continue
+                state = AlertState(active=True, changed_at=now)
+                self._states[key] = state
+                opened.append((key, state, message))
+                transitions.append((incubator_id, metric, "triggered", state, message))
+                notifications.append((state, incubator_id, f"Incubator {incubator_id}: {message}"))
+            elif state and state.active:
+                state.active = False
+                state.changed_at = now
+                resolved.append((key, state))
+                message = (
+                    f"{metric} is back within range "
+                    f"({sensor_reading.value}{UNITS.get(metric, '')}, device {sensor_reading.device_id})"
+                )
+                notifications.append((state, incubator_id, f"Incubator {incubator_id}: {message}"))
+                transitions.append((incubator_id, metric, "resolved", state, message))
+
+        if not (opened or reopened or resolved):
+            return []
+
+        try:
+            alerts, recorded_elsewhere = await self._persist_transitions(db_session, opened, reopened, resolved)
+        except Exception:
+            # Undo the transitions that were not recorded so the next reading retries them
+            for key, state, _ in opened:
+                if self._states.get(key) is state:
+                    del self._states[key]
+            for _, state in reopened:
+                state.active = False
+            for _, state in resolved:
+                state.active = True
+            raise
+        finally:
+            for _, state, _ in opened:
+                state.inserted.set()
+
+        # Transitions another worker recorded first were published and notified by that worker
+        for incubator_id, metric, status, state, message in transitions:
+            if state not in recorded_elsewhere:
+                event_broker.publish(
+                    alert_event(incubator_id, state.alert_id, status, metric, message, source=BAND_ALERT_SOURCE)
+                )
+        await self.notify(db_session, [
+            (incubator_id, line) for state, incubator_id, line in notifications if state not in recorded_elsewhere
+        ])
+        return alerts
+
+    def apply_remote_transition(self, incubator_id: int, metric: str, alert_id: int, status: str):
+        # Band alerts opened, reopened or resolved by another worker, which sees other readings of
+        # the same incubator. Without them this worker would keep an alert open that is resolved,
+        # or ignore a breach because it still considers the alert open.
+        key = (incubator_id, metric)
+        state = self._states.get(key)
+        if state is not None and state.inserted is not None and not state.inserted.is_set():
+            # This worker's own INSERT is in flight and adopts the open alert if it loses
+            return
+        now = time.monotonic()
+        if status == "resolved":
+            if state is not None and state.alert_id == alert_id and state.active:
+                state.active = False
+                state.changed_at = now
+        elif state is None or state.alert_id != alert_id or not state.active:
+            self._states[key] = AlertState(active=True, changed_at=now, alert_id=alert_id)
+
+    async def notify(self, db_session: AsyncSession, notifications: List[Tuple[int, str]]):
+        # Queues (incubator_id, line) pairs for the owners of each incubator in the next digest
+        await self._resolve_recipients(db_session, {incubator_id for incubator_id, _ in notifications})
+        for incubator_id, line in notifications:
+            self.digest.add(self._recipients.get(incubator_id, []), line)
+
+    async def _persist_transitions(
+        self,
+        db_session: AsyncSession,
+        opened: List[Tuple[Tuple[int, str], AlertState, str]],
+        reopened: List[Tuple[Tuple[int, str], AlertState]],
+        resolved: List[Tuple[Tuple[int, str], AlertState]],
+    ) -> Tuple[List[Alert], Set[AlertState]]:
+        # Returns the alerts opened here and the states whose transition another worker had
+        # already recorded: uq_alerts_open_band keeps one open alert per band across workers
+        # and every UPDATE only applies to alerts still in the expected state.
+        # A batch can resolve an alert whose INSERT another batch has not committed yet,
+        # the resolve waits for it instead of being dropped
+        inserting = [state.inserted.wait() for _, state in resolved if state.alert_id is None and state.inserted]
+        if inserting:
+            await asyncio.gather(*inserting)
+        try:
+            alerts = []
+            history = []
+            recorded_elsewhere: Set[AlertState] = set()
+            # Bands whose open alert belongs to another worker, adopted below
+            adopt: Dict[Tuple[int, str], AlertState] = {}
+            if opened:
+                result = await db_session.scalars(
+                    pg_insert(Alert)
+                    .values([
+                        {"incubator_id": incubator_id, "message": message, "band_metric": metric}
+                        for (incubator_id, metric), _, message in opened
+                    ])
+                    .on_conflict_do_nothing(
+                        index_elements=[Alert.incubator_id, Alert.band_metric],
+                        index_where=Alert.resolved.is_not(True) & Alert.band_metric.is_not(None),
+                    )
+                    .returning(Alert)
+                )
+                inserted = {(alert.incubator_id, alert.band_metric): alert for alert in result.all()}
+                for key, state, _ in opened:
+                    alert = inserted.get(key)
+                    if alert is None:
+                        adopt[key] = state
+                        continue
+                    alerts.append(alert)
+                    state.alert_id = alert.alert_id
+                    history.append({"alert_id": alert.alert_id, "status": "triggered", "created_by": ALERT_CREATED_BY})
+
+            if reopened:
+                # Not reopened while another alert is open for the band, that one is adopted instead
+                other = aliased(Alert)
+                result = await db_session.execute(
+                    update(Alert)
+                    .where(
+                        Alert.alert_id.in_([state.alert_id for _, state in reopened]),
+                        Alert.resolved.is_(True),
+                        ~select(other.alert_id).where(
+                            other.incubator_id == Alert.incubator_id,
+                            other.band_metric == Alert.band_metric,
+                            other.resolved.is_not(True),
+                        ).exists(),
+                    )
+                    .values(resolved=False)
+                    .returning(Alert.alert_id)
+                )
+                updated = set(result.scalars().all())
+                for key, state in reopened:
+                    if state.alert_id in updated:
+                        history.append({"alert_id": state.alert_id, "status": "reopened", "created_by": ALERT_CREATED_BY})
+                    else:
+                        adopt[key] = state
+
+            if resolved:
+                alert_ids = [state.alert_id for _, state in resolved if state.alert_id is not None]
+                result = await db_session.execute(
+                    update(Alert)
+                    .where(Alert.alert_id.in_(alert_ids), Alert.resolved.is_not(True))
+                    .values(resolved=True)
+                    .returning(Alert.alert_id)
+                )
+                updated = set(result.scalars().all())
+                for _, state in resolved:
+                    if state.alert_id in updated:
+                        history.append({"alert_id": state.alert_id, "status": "resolved", "created_by": ALERT_CREATED_BY})
+                    else:
+                        recorded_elsewhere.add(state)
+
+            if adopt:
+                result = await db_session.execute(
+                    select(Alert.incubator_id, Alert.band_metric, Alert.alert_id).where(
+                        tuple_(Alert.incubator_id, Alert.band_metric).in_(list(adopt)),
+                        Alert.resolved.is_not(True),
+                    )
+                )
+                for incubator_id, metric, alert_id in result.all():
+                    state = adopt.pop((incubator_id, metric))
+                    state.alert_id = alert_id
+                    recorded_elsewhere.add(state)
+                # Resolved again in the meantime, the next breaching reading opens a new alert
+                for state in adopt.values():
+                    state.active = False
+                    recorded_elsewhere.add(state)
+
+            if history:
+                await db_session.execute(insert(AlertHistory), history)
+            await db_session.commit()
+            return alerts, recorded_elsewhere
+        except Exception as e:
+            await db_session.rollback()
+            raise e
+
+
+alert_rule_engine = AlertRuleEngine()
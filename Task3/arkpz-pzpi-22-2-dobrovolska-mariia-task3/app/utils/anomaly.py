@@ -0,0 +1,268 @@
+# app/utils/anomaly.py
+import asyncio
+import logging
+import math
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import insert, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from app.database import AsyncSessionLocal, engine
+from app.models.alert import Alert
+from app.models.alert_history import AlertHistory
+from app.utils.alert_rules import ALERT_CREATED_BY, EXIT_MARGIN_RATIO, UNITS, alert_rule_engine, metric_name
+from app.utils.broker import alert_event, event_broker
+
+logger = logging.getLogger(__name__)
+
+METRICS = ("temperature", "humidity")
+# Weight of the newest reading in the mean/variance used for spike detection
+EWMA_ALPHA = 0.1
+# Much slower mean compared against the incubator target, so single outliers do not count as drift
+DRIFT_ALPHA = 0.02
+# Readings a sensor has to send before its statistics are trusted
+WARMUP_READINGS = 20
+SPIKE_Z_THRESHOLD = 4.0
+# Floor for the standard deviation, otherwise a very steady sensor turns ordinary noise into spikes
+MIN_STDDEV = {"temperature": 0.05, "humidity": 0.2}
+SPIKE_COOLDOWN = 900
+FLATLINE_READINGS = 60
+FLATLINE_EPSILON = 1e-6
+# Drift is flagged once the slow mean has moved this share of the tolerance away from the target
+DRIFT_TOLERANCE_RATIO = 0.6
+# Session advisory lock held by the worker that raises anomaly alerts
+OWNER_LOCK_KEY = 0x616E6F6D
+OWNER_CHECK_INTERVAL = 10.0
+
+
+# Running statistics of one sensor (device, metric): a fixed handful of numbers
+# whatever the history length, updated in O(1) per reading.
+class SensorStats:
+    __slots__ = ("count", "mean", "variance", "slow_mean", "last_value", "repeats", "recorded_at",
+                 "spiked_at", "flatlined", "drifting")
+
+    def __init__(self, value: float, recorded_at):
+        self.count = 1
+        self.mean = value
+        self.variance = 0.0
+        self.slow_mean = value
+        self.last_value = value
+        self.repeats = 1
+        self.recorded_at = recorded_at
+        self.spiked_at: Optional[float] = None
+        self.flatlined = False
+        self.drifting = False
+
+    def update(self, value: float, recorded_at):
+        # Incremental EWMA mean and variance (West, 1979)
+        diff = value - self.mean
+        increment = EWMA_ALPHA * diff
+        self.mean += increment
+        self.variance = (1 - EWMA_ALPHA) * (self.variance + diff * increment)
+        self.slow_mean += DRIFT_ALPHA * (value - self.slow_mean)
+        if abs(value - self.last_value) <= FLATLINE_EPSILON:
+            self.repeats += 1
+        else:
+            self.repeats = 1
+            self.flatlined = False
+        self.last_value = value
+        self.recorded_at = recorded_at
+        self.count += 1
+
+
+# Online detection of failing sensors on the ingestion path: spikes against the recent
+# EWMA statistics, flatlines (the same value over and over) and slow drift away from the
+# incubator target. Each anomaly is raised once as an Alert, not once per reading.
+# Every worker keeps the statistics of every sensor, fed by its own readings and the ones
+# relayed by the other workers, so counts like FLATLINE_READINGS see the whole stream. Only
+# the worker holding the OWNER_LOCK_KEY advisory lock raises the alerts; if it goes away its
+# lock is released with its connection and another worker takes over with warm statistics.
+class AnomalyDetector:
+    def __init__(self, check_interval: float = OWNER_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._stats: Dict[Tuple[int, str], SensorStats] = {}
+        self._owner_conn: Optional[AsyncConnection] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_owner(self) -> bool:
+        return self._owner_conn is not None
+
+    async def claim_ownership(self):
+        if self._owner_conn is not None:
+            try:
+                await self._owner_conn.execute(text("SELECT 1"))
+                await self._owner_conn.commit()
+                return
+            except Exception as e:
+                logger.error(f"Lost the anomaly detection lock with its connection: {str(e)}")
+                conn, self._owner_conn = self._owner_conn, None
+                await conn.invalidate()
+                await conn.close()
+        conn = await engine.connect()
+        try:
+            claimed = await conn.scalar(text("SELECT pg_try_advisory_lock(:key)"), {"key": OWNER_LOCK_KEY})
+            await conn.commit()
+        except Exception:
+            await conn.close()
+            raise
+        if claimed:
+            # Kept checked out: the lock belongs to this connection's session
+            self._owner_conn = conn
+            logger.info("This worker raises anomaly alerts.")
+        else:
+            await conn.close()
+
+    async def start(self):
+        if self._task is None:
+            try:
+                await self.claim_ownership()
+            except Exception as e:
+                logger.exception(f"Error occurred while claiming anomaly detection: {str(e)}")
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._owner_conn is not None:
+            conn, self._owner_conn = self._owner_conn, None
+            try:
+                await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": OWNER_LOCK_KEY})
+                await conn.commit()
+            finally:
+                await conn.close()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                await self.claim_ownership()
+            except Exception as e:
+                logger.exception(f"Error occurred while claiming anomaly detection: {str(e)}")
+
+    def metrics(self) -> dict:
+        return {"owner": int(self.is_owner), "sensors": len(self._stats)}
+
+    def forget_device(self, device_id: int):
+        for metric in METRICS:
+            self._stats.pop((device_id, metric), None)
+
+    def _check(self, stats: SensorStats, sensor_reading, metric: str, incubator_id: Optional[int], now: float):
+        value = sensor_reading.value
+        device_id = sensor_reading.device_id
+        unit = UNITS.get(metric, "")
+        anomalies = []
+        if stats.count >= WARMUP_READINGS:
+            stddev = max(math.sqrt(stats.variance), MIN_STDDEV.get(metric, 0.0))
+            z_score = abs(value - stats.mean) / stddev
+            if z_score >= SPIKE_Z_THRESHOLD and (stats.spiked_at is None or now - stats.spiked_at >= SPIKE_COOLDOWN):
+                anomalies.append(("spike", stats.spiked_at, (
+                    f"{metric.capitalize()} spike on device {device_id}: {value}{unit} is {z_score:.1f} "
+                    f"standard deviations from the recent mean {stats.mean:.2f}{unit}"
+                )))
+                stats.spiked_at = now
+
+        stats.update(value, sensor_reading.recorded_at)
+
+        if stats.repeats >= FLATLINE_READINGS and not stats.flatlined:
+            stats.flatlined = True
+            anomalies.append(("flatline", None, (
+                f"{metric.capitalize()} sensor on device {device_id} looks stuck: "
+                f"{stats.repeats} identical readings of {value}{unit}"
+            )))
+
+        band = alert_rule_engine.band_for(incubator_id, metric) if incubator_id is not None else None
+        if band is not None and stats.count >= WARMUP_READINGS:
+            low, high = band
+            target = (low + high) / 2
+            threshold = (high - low) / 2 * DRIFT_TOLERANCE_RATIO
+            deviation = abs(stats.slow_mean - target)
+            if deviation > threshold and not stats.drifting:
+                stats.drifting = True
+                anomalies.append(("drift", None, (
+                    f"{metric.capitalize()} on device {device_id} is drifting from the target {target:g}{unit}: "
+                    f"recent average {stats.slow_mean:.2f}{unit}"
+                )))
+            elif deviation < threshold * (1 - EXIT_MARGIN_RATIO):
+                stats.drifting = False
+        return anomalies
+
+    def _detect(self, sensor_readings: List) -> List[Tuple[int, str, str, SensorStats, object, str]]:
+        # Statistics are updated synchronously, before any await, so concurrent batches never interleave
+        now = time.monotonic()
+        found: List[Tuple[int, str, str, SensorStats, object, str]] = []
+        for sensor_reading in sorted(sensor_readings, key=lambda reading: reading.recorded_at):
+            metric = metric_name(sensor_reading.value_type)
+            key = (sensor_reading.device_id, metric)
+            stats = self._stats.get(key)
+            if stats is None:
+                self._stats[key] = SensorStats(sensor_reading.value, sensor_reading.recorded_at)
+                continue
+            if sensor_reading.recorded_at < stats.recorded_at:
+                # Late or replayed readings would distort the running statistics
+                continue
+            # Relayed readings bring the incubator their worker resolved
+            incubator_id = getattr(sensor_reading, "incubator_id", None)
+            if incubator_id is None:
+                incubator_id = alert_rule_engine.incubator_for_device(sensor_reading.device_id)
+            for kind, previous, message in self._check(stats, sensor_reading, metric, incubator_id, now):
+                if incubator_id is not None:
+                    found.append((incubator_id, metric, kind, stats, previous, message))
+        return found
+
+    async def observe(self, db_session: AsyncSession, sensor_readings: List) -> List[Alert]:
+        # Called after the rule engine, which has resolved the incubators of new devices
+        found = self._detect(sensor_readings)
+        if not found or not self.is_owner:
+            return []
+        return await self._raise(db_session, found)
+
+    async def observe_relayed(self, sensor_readings: List) -> List[Alert]:
+        found = self._detect(sensor_readings)
+        if not found or not self.is_owner:
+            return []
+        async with AsyncSessionLocal() as db_session:
+            return await self._raise(db_session, found)
+
+    async def _raise(self, db_session: AsyncSession, found: List) -> List[Alert]:
+        try:
+            alerts = await self._persist(db_session, found)
+        except Exception:
+            # Re-arm the detectors so the anomaly is raised again by a later reading
+            for _, _, kind, stats, previous, _ in found:
+                if kind == "spike":
+                    stats.spiked_at = previous
+                elif kind == "flatline":
+                    stats.flatlined = False
+                else:
+                    stats.drifting = False
+            raise
+
+        for (incubator_id, metric, _, _, _, message), alert in zip(found, alerts):
+            event_broker.publish(alert_event(incubator_id, alert.alert_id, "triggered", metric, message))
+        await alert_rule_engine.notify(
+            db_session, [(incubator_id, f"Incubator {incubator_id}: {message}") for incubator_id, *_, message in found]
+        )
+        return alerts
+
+    async def _persist(self, db_session: AsyncSession, found: List) -> List[Alert]:
+        try:
+            result = await db_session.scalars(
+                insert(Alert).returning(Alert, sort_by_parameter_order=True),
+                [{"incubator_id": incubator_id, "message": message} for incubator_id, *_, message in found],
+            )
+            alerts = result.all()
+            await db_session.execute(
+                insert(AlertHistory),
+                [{"alert_id": alert.alert_id, "status": "triggered", "created_by": ALERT_CREATED_BY} for alert in alerts],
+            )
+            await db_session.commit()
+            return alerts
+        except Exception as e:
+            await db_session.rollback()
+            raise e
+
+
+anomaly_detector = AnomalyDetector()
@@ -1,36 +1,107 @@
+import logging
+import time
+import uuid
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from jose import jwt, JWTError
 from fastapi import HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.revoked_token import RevokedToken
 from app.models.user import UserRole
-from typing import Optional
+from typing import Dict, Tuple
+
+logger = logging.getLogger(__name__)
 
 SECRET_KEY = "z8J&9q@F4L#v5nW!XyRdPbM$3T@u7G^Kz*jf8QwLmV2xHZp#%sYr6gXnTz4cR&b"
 ALGORITHM = "HS256"
+TOKEN_CACHE_SIZE = 10000
+# Upper bound for tokens issued without an expiry
+TOKEN_CACHE_MAX_TTL = 900
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="users/login")
 
+
+def utc_timestamp(moment: datetime) -> float:
+    return (moment - datetime(1970, 1, 1)).total_seconds()
+
+
+# LRU of already verified tokens -> claims. A repeat token costs a dict lookup instead of
+# a decode and HMAC check; entries never outlive the token's exp. Revoked JWT ids are kept
+# until their token would have expired and are checked on every hit.
+class TokenVerifier:
+    def __init__(self, max_size: int = TOKEN_CACHE_SIZE):
+        self.max_size = max_size
+        self._cache: "OrderedDict[str, Tuple[dict, float]]" = OrderedDict()
+        self._revoked: Dict[str, float] = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    async def load(self, db_session: AsyncSession):
+        await RevokedToken.delete_expired(db_session)
+        revoked = await RevokedToken.get_active(db_session)
+        self._revoked = {jti: utc_timestamp(expires_at) for jti, expires_at in revoked}
+        logger.info(f"Loaded {len(self._revoked)} revoked tokens.")
+
+    def verify(self, token: str) -> dict:
+        now = time.time()
+        entry = self._cache.get(token)
+        if entry is not None:
+            claims, expires_at = entry
+            if now < expires_at and claims.get("jti") not in self._revoked:
+                self.hits += 1
+                self._cache.move_to_end(token)
+                return claims
+            del self._cache[token]
+        self.misses += 1
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        if claims.get("jti") in self._revoked:
+            raise JWTError("Token has been revoked")
+        self._cache[token] = (claims, min(claims.get("exp", float("inf")), now + TOKEN_CACHE_MAX_TTL))
+        if len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+        return claims
+
+    def revoke(self, jti: str, expires_at: float):
+        now = time.time()
+        # Revocations are rare, dropping the outdated ones here keeps the denylist bounded
+        self._revoked = {key: until for key, until in self._revoked.items() if until > now}
+        self._revoked[jti] = expires_at
+
+    def metrics(self) -> dict:
+        return {
+            "cached": len(self._cache),
+            "revoked": len(self._revoked),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+token_verifier = TokenVerifier()
+
+
 def create_access_token(data: dict, expires_delta: timedelta = timedelta(minutes=15)):
     to_encode = data.copy()
-    expire = datetime.utcnow() + expires_delta
-    to_encode.update({"exp": expire})
+    now = datetime.utcnow()
+    expire = now + expires_delta
+    to_encode.update({"exp": expire, "iat": now, "jti": uuid.uuid4().hex})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 def verify_access_token(token: str):
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
+        return token_verifier.verify(token)
     except JWTError:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Invalid or expired token",
         )
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
+async def get_current_user(token: str = Depends(oauth2_scheme)):
     payload = verify_access_token(token)
     return payload
 
 def role_required(required_role: UserRole):
-    def role_dependency(user: dict = Depends(get_current_user)):
+    async def role_dependency(user: dict = Depends(get_current_user)):
         if user.get("role") != required_role:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -0,0 +1,170 @@
+# app/utils/broker.py
+import asyncio
+import json
+import logging
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+
+class SlowConsumer(Exception):
+    pass
+
+
+def _default(obj):
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    return getattr(obj, "value", str(obj))
+
+
+def encode_event(event: dict) -> str:
+    return json.dumps(event, default=_default, separators=(",", ":"))
+
+
+def reading_event(sensor_reading, incubator_id: Optional[int]) -> dict:
+    return {
+        "type": "reading",
+        "incubator_id": incubator_id,
+        "device_id": sensor_reading.device_id,
+        "data": {
+            "reading_id": sensor_reading.reading_id,
+            "value_type": sensor_reading.value_type,
+            "value": sensor_reading.value,
+            "recorded_at": sensor_reading.recorded_at,
+        },
+    }
+
+
+def alert_event(
+    incubator_id: int, alert_id: Optional[int], status: str, metric: str, message: str, source: Optional[str] = None
+) -> dict:
+    return {
+        "type": "alert",
+        "incubator_id": incubator_id,
+        "device_id": None,
+        "data": {"alert_id": alert_id, "status": status, "metric": metric, "message": message, "source": source},
+    }
+
+
+# One connected client. Events arrive already encoded; when the queue is full the
+# client is too slow to keep up and is disconnected instead of holding back everyone else.
+class Subscription:
+    def __init__(self, incubator_ids: Iterable[int], device_ids: Iterable[int], queue_size: int):
+        self.incubator_ids: Set[int] = set(incubator_ids)
+        self.device_ids: Set[int] = set(device_ids)
+        self.dropped = False
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+    def _offer(self, message: str) -> bool:
+        try:
+            self._queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def _drop(self):
+        self.dropped = True
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queue.put_nowait(None)
+
+    async def get(self) -> str:
+        message = await self._queue.get()
+        if message is None:
+            raise SlowConsumer()
+        return message
+
+
+# In-process fan-out of readings and alerts to WebSocket/SSE subscribers, indexed by
+# incubator and device so publishing costs one dict lookup per key, not a scan of all clients.
+class EventBroker:
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._by_incubator: Dict[int, Set[Subscription]] = {}
+        self._by_device: Dict[int, Set[Subscription]] = {}
+        self._subscriptions: Set[Subscription] = set()
+        # Forward locally published events to the other workers (see app/utils/cluster.py)
+        self._relays: List[Callable[[dict], None]] = []
+
+        self.published = 0
+        self.delivered = 0
+        self.dropped_subscribers = 0
+
+    def add_relay(self, relay: Callable[[dict], None]):
+        self._relays.append(relay)
+
+    def subscribe(self, incubator_ids: Iterable[int] = (), device_ids: Iterable[int] = ()) -> Subscription:
+        subscription = Subscription(incubator_ids, device_ids, self.queue_size)
+        self._subscriptions.add(subscription)
+        self._index(subscription)
+        return subscription
+
+    def update(self, subscription: Subscription, incubator_ids: Iterable[int] = (), device_ids: Iterable[int] = (),
+               remove: bool = False):
+        if subscription not in self._subscriptions:
+            return
+        self._unindex(subscription)
+        if remove:
+            subscription.incubator_ids -= set(incubator_ids)
+            subscription.device_ids -= set(device_ids)
+        else:
+            subscription.incubator_ids |= set(incubator_ids)
+            subscription.device_ids |= set(device_ids)
+        self._index(subscription)
+
+    def unsubscribe(self, subscription: Subscription):
+        if subscription in self._subscriptions:
+            self._subscriptions.discard(subscription)
+            self._unindex(subscription)
+
+    def _index(self, subscription: Subscription):
+        for incubator_id in subscription.incubator_ids:
+            self._by_incubator.setdefault(incubator_id, set()).add(subscription)
+        for device_id in subscription.device_ids:
+            self._by_device.setdefault(device_id, set()).add(subscription)
+
+    def _unindex(self, subscription: Subscription):
+        for index, keys in ((self._by_incubator, subscription.incubator_ids), (self._by_device, subscription.device_ids)):
+            for key in keys:
+                subscribers = index.get(key)
+                if subscribers is None:
+                    continue
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del index[key]
+
+    def publish(self, event: dict, relay: bool = True):
+        self.published += 1
+        if relay:
+            for forward in self._relays:
+                forward(event)
+        targets = set()
+        if event.get("incubator_id") is not None:
+            targets |= self._by_incubator.get(event["incubator_id"], set())
+        if event.get("device_id") is not None:
+            targets |= self._by_device.get(event["device_id"], set())
+        if not targets:
+            return
+        message = encode_event(event)
+        for subscription in targets:
+            if subscription._offer(message):
+                self.delivered += 1
+                continue
+            logger.warning("Dropping slow event subscriber with a full queue")
+            self.dropped_subscribers += 1
+            self.unsubscribe(subscription)
+            subscription._drop()
+
+    def metrics(self) -> dict:
+        return {
+            "subscribers": len(self._subscriptions),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped_subscribers": self.dropped_subscribers,
+        }
+
+
+event_broker = EventBroker()
@@ -0,0 +1,148 @@
+# app/utils/cluster.py
+import logging
+from datetime import datetime
+from types import SimpleNamespace
+
+from app.database import AsyncSessionLocal
+from app.utils.alert_rules import BAND_ALERT_SOURCE, alert_rule_engine
+from app.utils.anomaly import anomaly_detector
+from app.utils.auth import token_verifier
+from app.utils.broker import event_broker
+from app.utils.device_auth import device_keys
+from app.utils.latest_readings import latest_readings
+from app.utils.liveness import device_liveness
+from app.utils.pubsub import pubsub
+
+logger = logging.getLogger(__name__)
+
+# Keeps the in-memory state of every worker in step: local changes are applied here
+# and broadcast over pub/sub, changes made by other workers arrive through the handlers below.
+
+
+def incubator_changed(incubator):
+    alert_rule_engine.refresh_incubator(incubator)
+    pubsub.publish("incubator", {
+        "incubator_id": incubator.incubator_id,
+        "target_temperature": incubator.target_temperature,
+        "target_humidity": incubator.target_humidity,
+        "deleted": False,
+    })
+
+
+def incubator_deleted(incubator_id: int):
+    alert_rule_engine.forget_incubator(incubator_id)
+    latest_readings.forget_incubator(incubator_id)
+    pubsub.publish("incubator", {"incubator_id": incubator_id, "deleted": True})
+
+
+def device_changed(device):
+    alert_rule_engine.refresh_device(device)
+    latest_readings.refresh_device(device)
+    device_liveness.refresh_device(device)
+    pubsub.publish("device", {
+        "device_id": device.device_id,
+        "incubator_id": device.incubator_id,
+        "report_interval": device.report_interval,
+        "deleted": False,
+    })
+
+
+def device_deleted(device_id: int):
+    alert_rule_engine.forget_device(device_id)
+    latest_readings.forget_device(device_id)
+    anomaly_detector.forget_device(device_id)
+    device_liveness.forget_device(device_id)
+    device_keys.forget(device_id)
+    pubsub.publish("device", {"device_id": device_id, "deleted": True})
+
+
+def device_key_changed(device_id: int, api_secret):
+    device_keys.set(device_id, api_secret)
+    # Secrets are not sent over NOTIFY, the other workers read the new one from the database
+    pubsub.publish("device_key", {"device_id": device_id})
+
+
+def token_revoked(jti: str, expires_at: float):
+    token_verifier.revoke(jti, expires_at)
+    pubsub.publish("token", {"jti": jti, "expires_at": expires_at})
+
+
+async def _on_event(event: dict):
+    if event.get("type") == "reading":
+        data = event["data"]
+        sensor_reading = SimpleNamespace(
+            device_id=event["device_id"],
+            incubator_id=event["incubator_id"],
+            value_type=data["value_type"],
+            value=data["value"],
+            recorded_at=datetime.fromisoformat(data["recorded_at"]),
+        )
+        latest_readings.update([sensor_reading])
+        device_liveness.touch(event["device_id"], persist=False)
+        try:
+            await anomaly_detector.observe_relayed([sensor_reading])
+        except Exception as e:
+            logger.exception(f"Error occurred while checking relayed readings for anomalies: {str(e)}")
+    elif event.get("type") == "alert" and event["data"].get("source") == BAND_ALERT_SOURCE:
+        data = event["data"]
+        alert_rule_engine.apply_remote_transition(event["incubator_id"], data["metric"], data["alert_id"], data["status"])
+    event_broker.publish(event, relay=False)
+
+
+async def _on_incubator(data: dict):
+    if data["deleted"]:
+        alert_rule_engine.forget_incubator(data["incubator_id"])
+        latest_readings.forget_incubator(data["incubator_id"])
+    else:
+        alert_rule_engine.refresh_incubator(SimpleNamespace(**data))
+
+
+async def _on_device(data: dict):
+    if data["deleted"]:
+        alert_rule_engine.forget_device(data["device_id"])
+        latest_readings.forget_device(data["device_id"])
+        anomaly_detector.forget_device(data["device_id"])
+        device_liveness.forget_device(data["device_id"])
+        device_keys.forget(data["device_id"])
+    else:
+        device = SimpleNamespace(**data)
+        alert_rule_engine.refresh_device(device)
+        latest_readings.refresh_device(device)
+        device_liveness.refresh_device(device)
+
+
+async def _on_nonce(data: dict):
+    device_keys.remember_nonce(data["device_id"], data["nonce"])
+
+
+async def _on_device_key(data: dict):
+    async with AsyncSessionLocal() as db:
+        await device_keys.refresh(db, data["device_id"])
+
+
+async def _on_token(data: dict):
+    token_verifier.revoke(data["jti"], data["expires_at"])
+
+
+async def _resync():
+    async with AsyncSessionLocal() as db:
+        await alert_rule_engine.load(db)
+        await latest_readings.load(db)
+        await device_liveness.load(db)
+        await token_verifier.load(db)
+        await device_keys.load(db)
+    logger.info("In-memory caches reloaded after pub/sub reconnect.")
+
+
+def setup_cluster_sync():
+    event_broker.add_relay(lambda event: pubsub.publish("event", event))
+    device_keys.add_nonce_relay(
+        lambda device_id, nonce: pubsub.publish("nonce", {"device_id": device_id, "nonce": nonce})
+    )
+    pubsub.subscribe("event", _on_event)
+    pubsub.subscribe("incubator", _on_incubator)
+    pubsub.subscribe("device", _on_device)
+    pubsub.subscribe("token", _on_token)
+    pubsub.subscribe("device_key", _on_device_key)
+    pubsub.subscribe("nonce", _on_nonce)
+    pubsub.on_reconnect(_resync)
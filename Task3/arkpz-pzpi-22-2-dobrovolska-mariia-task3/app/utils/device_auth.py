@@ -0,0 +1,211 @@
+# app/utils/device_auth.py
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import secrets
+import time
+from collections import deque
+from datetime import datetime
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException, Request, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.device import Device
+from app.models.device_nonce import DeviceNonce
+from app.models.user import UserRole
+from app.utils.auth import verify_access_token
+
+logger = logging.getLogger(__name__)
+
+DEVICE_ID_HEADER = "X-Device-Id"
+TIMESTAMP_HEADER = "X-Timestamp"
+NONCE_HEADER = "X-Nonce"
+SIGNATURE_HEADER = "X-Signature"
+# Signed requests older or newer than this are rejected, nonces are remembered for as long
+SIGNATURE_MAX_SKEW = 300
+MAX_NONCE_LENGTH = 64
+NONCE_PURGE_INTERVAL = 60.0
+
+
+class DeviceAuthError(Exception):
+    pass
+
+
+def generate_api_secret() -> str:
+    return secrets.token_urlsafe(32)
+
+
+def sign_request(api_secret: str, device_id: int, timestamp: int, nonce: str, body: bytes) -> str:
+    # Devices send hex(HMAC-SHA256(secret, "<device_id>.<timestamp>.<nonce>." + body))
+    message = f"{device_id}.{timestamp}.{nonce}.".encode() + body
+    return hmac.new(api_secret.encode(), message, hashlib.sha256).hexdigest()
+
+
+# Nonces seen within the signature window, expired in arrival order so memory stays
+# proportional to the request rate. Nonces accepted by other workers are added through
+# app/utils/cluster.py, so replays are caught without a database round trip.
+class NonceCache:
+    def __init__(self, window: float = SIGNATURE_MAX_SKEW):
+        self.window = window
+        self._seen: Dict[Tuple[int, str], float] = {}
+        self._order: Deque[Tuple[float, Tuple[int, str]]] = deque()
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def add(self, key: Tuple[int, str], now: float) -> bool:
+        while self._order and self._order[0][0] <= now:
+            _, expired = self._order.popleft()
+            self._seen.pop(expired, None)
+        if key in self._seen:
+            return False
+        # A timestamp may be up to one window ahead, so keep the nonce for two
+        expires_at = now + 2 * self.window
+        self._seen[key] = expires_at
+        self._order.append((expires_at, key))
+        return True
+
+
+# In-memory copy of the device secrets: verifying a signed request is a dict lookup and one
+# HMAC over the body, no database round trip. Kept current through app/utils/cluster.py.
+class DeviceKeyCache:
+    def __init__(self, max_skew: int = SIGNATURE_MAX_SKEW):
+        self.max_skew = max_skew
+        self._secrets: Dict[int, bytes] = {}
+        self._nonces = NonceCache(max_skew)
+        self._nonce_relays: List[Callable[[int, str], None]] = []
+        self._last_purge = time.monotonic()
+        self._purge_task: Optional[asyncio.Task] = None
+
+        self.verified = 0
+        self.rejected = 0
+
+    async def load(self, db_session: AsyncSession):
+        self._secrets = {
+            device_id: api_secret.encode() for device_id, api_secret in await Device.get_api_secrets(db_session)
+        }
+        logger.info(f"Loaded API keys for {len(self._secrets)} devices.")
+
+    async def refresh(self, db_session: AsyncSession, device_id: int):
+        rows = await Device.get_api_secrets(db_session, [device_id])
+        self.set(device_id, rows[0][1] if rows else None)
+
+    def set(self, device_id: int, api_secret: Optional[str]):
+        if api_secret is None:
+            self._secrets.pop(device_id, None)
+        else:
+            self._secrets[device_id] = api_secret.encode()
+
+    def forget(self, device_id: int):
+        self._secrets.pop(device_id, None)
+
+    def verify(self, headers, body: bytes) -> int:
+        try:
+            device_id = int(headers.get(DEVICE_ID_HEADER, ""))
+            timestamp = int(headers.get(TIMESTAMP_HEADER, ""))
+        except ValueError:
+            raise DeviceAuthError(f"{DEVICE_ID_HEADER} and {TIMESTAMP_HEADER} must be integers")
+        nonce = headers.get(NONCE_HEADER, "")
+        signature = headers.get(SIGNATURE_HEADER, "")
+        if not nonce or len(nonce) > MAX_NONCE_LENGTH:
+            raise DeviceAuthError(f"{NONCE_HEADER} must be 1-{MAX_NONCE_LENGTH} characters")
+        now = time.time()
+        if abs(now - timestamp) > self.max_skew:
+            raise DeviceAuthError("Request timestamp is outside the allowed window")
+        api_secret = self._secrets.get(device_id)
+        if api_secret is None:
+            raise DeviceAuthError("Unknown device or no API key issued")
+        message = f"{device_id}.{timestamp}.{nonce}.".encode() + body
+        expected = hmac.new(api_secret, message, hashlib.sha256).hexdigest()
+        if not hmac.compare_digest(expected, signature):
+            raise DeviceAuthError("Invalid signature")
+        # Only signed requests reach the nonce cache, so it cannot be flooded anonymously
+        if not self._nonces.add((device_id, nonce), now):
+            raise DeviceAuthError("Nonce already used")
+        for relay in self._nonce_relays:
+            relay(device_id, nonce)
+        return device_id
+
+    def add_nonce_relay(self, relay: Callable[[int, str], None]):
+        self._nonce_relays.append(relay)
+
+    def remember_nonce(self, device_id: int, nonce: str):
+        # A nonce another worker accepted
+        self._nonces.add((device_id, nonce), time.time())
+
+    async def claim_nonce(self, device_id: int, nonce: str):
+        # Only with device_nonce_store = "database". Called after verify(), so only correctly
+        # signed requests write to the table
+        expires_at = datetime.utcfromtimestamp(time.time() + 2 * self.max_skew)
+        async with AsyncSessionLocal() as db_session:
+            claimed = await DeviceNonce.claim(db_session, device_id, nonce, expires_at)
+        if time.monotonic() - self._last_purge >= NONCE_PURGE_INTERVAL and self._purge_task is None:
+            self._last_purge = time.monotonic()
+            self._purge_task = asyncio.create_task(self._purge_nonces())
+        if not claimed:
+            raise DeviceAuthError("Nonce already used")
+
+    async def _purge_nonces(self):
+        # Runs beside the requests, none of them waits for it
+        try:
+            async with AsyncSessionLocal() as db_session:
+                await DeviceNonce.delete_expired(db_session)
+        except Exception as e:
+            logger.error(f"Could not purge expired device nonces: {str(e)}")
+        finally:
+            self._purge_task = None
+
+    def metrics(self) -> dict:
+        return {
+            "devices": len(self._secrets),
+            "nonces": len(self._nonces),
+            "verified": self.verified,
+            "rejected": self.rejected,
+        }
+
+
+device_keys = DeviceKeyCache()
+
+
+def _body_device_ids(body: bytes) -> Iterable:
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return []
+    readings = payload if isinstance(payload, list) else [payload]
+    return {reading.get("device_id") for reading in readings if isinstance(reading, dict)}
+
+
+# Ingestion accepts either a request signed with the device's own key, limited to readings of
+# that device, or a user bearer token. Declared before get_db so its errors keep their status.
+async def authenticate_ingestion(request: Request) -> dict:
+    if SIGNATURE_HEADER not in request.headers:
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Not authenticated",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        claims = verify_access_token(token)
+        if claims.get("role") not in [UserRole.admin.value, UserRole.user.value]:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions")
+        return claims
+
+    body = await request.body()
+    try:
+        device_id = device_keys.verify(request.headers, body)
+        if settings.device_nonce_store == "database":
+            await device_keys.claim_nonce(device_id, request.headers[NONCE_HEADER])
+    except DeviceAuthError as e:
+        device_keys.rejected += 1
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=str(e))
+    if any(reading_device_id != device_id for reading_device_id in _body_device_ids(body)):
+        device_keys.rejected += 1
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Devices can only submit their own readings")
+    device_keys.verified += 1
+    return {"device_id": device_id}
@@ -0,0 +1,199 @@
+# app/utils/diagnostics.py
+import warnings
+from datetime import datetime
+from typing import List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import bindparam, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+DEFAULT_WINDOW = 4
+MAX_WINDOW = 1000
+MAX_DIAGNOSTIC_POINTS = 1000
+METRICS = ("temperature", "humidity")
+
+# Newest :points readings per device and metric, one array row per pair. The LATERAL
+# subquery walks ix_sensor_readings_device_id_recorded_at backwards and aggregates in
+# that order (newest first), so cost depends on devices x points, not on table size.
+# Summaries only need the two newest timestamps, full series need all of them.
+WINDOWS_QUERY = """
+SELECT d.device_id, m.value_type, r.readings, r.timestamps, r.reading_ids
+FROM devices d
+CROSS JOIN unnest(CAST(:metrics AS text[])) AS m(value_type)
+CROSS JOIN LATERAL (
+    SELECT array_agg(w.value) AS readings,
+           array_agg(date_part('epoch', w.recorded_at)) {timestamps_filter} AS timestamps,
+           {reading_ids} AS reading_ids
+    FROM (
+        SELECT s.reading_id, s.value, s.recorded_at, row_number() OVER (ORDER BY s.recorded_at DESC) AS position
+        FROM sensor_readings s
+        WHERE s.device_id = d.device_id AND s.value_type = m.value_type {since}
+        ORDER BY s.recorded_at DESC
+        LIMIT :points
+    ) w
+) r
+WHERE r.readings IS NOT NULL AND {devices}
+ORDER BY d.device_id, m.value_type
+"""
+
+
+# Readings of many (device, metric) series packed into right-aligned 2D arrays,
+# padded with NaN on the left so column -1 is always the newest reading.
+class ReadingWindows:
+    def __init__(self, rows: Sequence, points: int):
+        self.device_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.value_types = [row[1] for row in rows]
+        self.values = np.full((len(rows), points), np.nan)
+        self.timestamps = np.full((len(rows), points), np.nan)
+        self.reading_ids = np.zeros((len(rows), points), dtype=np.int64)
+        for i, (_, _, values, timestamps, reading_ids) in enumerate(rows):
+            # Arrays arrive newest first
+            self.values[i, points - len(values):] = values[::-1]
+            self.timestamps[i, points - len(timestamps):] = timestamps[::-1]
+            if reading_ids is not None:
+                self.reading_ids[i, points - len(reading_ids):] = reading_ids[::-1]
+
+    def __len__(self) -> int:
+        return len(self.value_types)
+
+
+async def fetch_windows(
+    db_session: AsyncSession,
+    points: int,
+    device_ids: Optional[List[int]] = None,
+    incubator_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    full: bool = True,
+) -> ReadingWindows:
+    params = {"metrics": list(METRICS), "points": points}
+    if device_ids is not None:
+        devices = "d.device_id IN :device_ids"
+        params["device_ids"] = device_ids
+    elif incubator_id is not None:
+        devices = "d.incubator_id = :incubator_id"
+        params["incubator_id"] = incubator_id
+    else:
+        devices = "TRUE"
+    if since is not None:
+        params["since"] = since
+    stmt = text(WINDOWS_QUERY.format(
+        timestamps_filter="" if full else "FILTER (WHERE w.position <= 2)",
+        reading_ids="array_agg(w.reading_id)" if full else "NULL::int[]",
+        since="AND s.recorded_at >= :since" if since is not None else "",
+        devices=devices,
+    ))
+    if device_ids is not None:
+        stmt = stmt.bindparams(bindparam("device_ids", expanding=True))
+    result = await db_session.execute(stmt, params)
+    return ReadingWindows(result.all(), points)
+
+
+def _nan_to_none(array: np.ndarray) -> list:
+    return [None if np.isnan(x) else float(x) for x in array]
+
+
+def _rate_per_minute(values: np.ndarray, timestamps: np.ndarray) -> np.ndarray:
+    rate = np.full(values.shape, np.nan)
+    elapsed = np.diff(timestamps, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rate[:, 1:] = np.where(elapsed > 0, np.diff(values, axis=1) / elapsed * 60, np.nan)
+    return rate
+
+
+def summarize(windows: ReadingWindows) -> List[dict]:
+    if not len(windows):
+        return []
+    values = windows.values
+    valid = ~np.isnan(values)
+    count = valid.sum(axis=1)
+    with warnings.catch_warnings():
+        # Series with no readings at all produce all-NaN rows, reported as nulls
+        warnings.simplefilter("ignore", RuntimeWarning)
+        mean = np.nanmean(values, axis=1)
+        stddev = np.nanstd(values, axis=1)
+        minimum = np.nanmin(values, axis=1)
+        maximum = np.nanmax(values, axis=1)
+        deviation = np.abs(values - mean[:, None]) / np.abs(mean[:, None])
+        error_ratio = deviation[:, -1]
+        max_error_ratio = np.nanmax(deviation, axis=1)
+    rate = _rate_per_minute(values[:, -2:], windows.timestamps[:, -2:])[:, -1]
+    last_recorded_at = windows.timestamps[:, -1]
+
+    columns = {
+        "mean": _nan_to_none(mean),
+        "stddev": _nan_to_none(stddev),
+        "min": _nan_to_none(minimum),
+        "max": _nan_to_none(maximum),
+        "last_value": _nan_to_none(values[:, -1]),
+        "error_ratio": _nan_to_none(error_ratio),
+        "max_error_ratio": _nan_to_none(max_error_ratio),
+        "rate_of_change": _nan_to_none(rate),
+    }
+    summaries = []
+    for i, value_type in enumerate(windows.value_types):
+        summary = {
+            "device_id": int(windows.device_ids[i]),
+            "value_type": value_type,
+            "count": int(count[i]),
+            "last_recorded_at": datetime.utcfromtimestamp(last_recorded_at[i]),
+        }
+        for name, column in columns.items():
+            summary[name] = column[i]
+        summaries.append(summary)
+    return summaries
+
+
+def _rolling_sum(cumulative: np.ndarray, window: int) -> np.ndarray:
+    rolled = cumulative.copy()
+    rolled[:, window:] -= cumulative[:, :-window]
+    return rolled
+
+
+def rolling(windows: ReadingWindows, window: int) -> List[dict]:
+    values = windows.values
+    valid = ~np.isnan(values)
+    filled = np.where(valid, values, 0.0)
+    # Rolling sums from cumulative sums: O(points) whatever the window size
+    count = _rolling_sum(np.cumsum(valid, axis=1), window)
+    total = _rolling_sum(np.cumsum(filled, axis=1), window)
+    total_sq = _rolling_sum(np.cumsum(filled * filled, axis=1), window)
+    with warnings.catch_warnings(), np.errstate(divide="ignore", invalid="ignore"):
+        warnings.simplefilter("ignore", RuntimeWarning)
+        mean = np.where(count > 0, total / count, np.nan)
+        stddev = np.sqrt(np.maximum(total_sq / count - mean * mean, 0.0))
+        padded = np.pad(values, ((0, 0), (window - 1, 0)), constant_values=np.nan)
+        sliding = np.lib.stride_tricks.sliding_window_view(padded, window, axis=1)
+        minimum = np.nanmin(sliding, axis=2)
+        maximum = np.nanmax(sliding, axis=2)
+        error_ratio = np.abs(values - mean) / np.abs(mean)
+    rate = _rate_per_minute(values, windows.timestamps)
+
+    series = []
+    for i, value_type in enumerate(windows.value_types):
+        present = valid[i]
+        series.append({
+            "device_id": int(windows.device_ids[i]),
+            "value_type": value_type,
+            "window": window,
+            "points": [
+                {
+                    "reading_id": int(reading_id),
+                    "recorded_at": datetime.utcfromtimestamp(timestamp),
+                    "value": float(value),
+                    "mean": mean_value,
+                    "stddev": stddev_value,
+                    "min": min_value,
+                    "max": max_value,
+                    "error_ratio": error_value,
+                    "rate_of_change": rate_value,
+                }
+                for reading_id, timestamp, value, mean_value, stddev_value, min_value, max_value, error_value, rate_value
+                in zip(
+                    windows.reading_ids[i, present], windows.timestamps[i, present], values[i, present],
+                    _nan_to_none(mean[i, present]), _nan_to_none(stddev[i, present]),
+                    _nan_to_none(minimum[i, present]), _nan_to_none(maximum[i, present]),
+                    _nan_to_none(error_ratio[i, present]), _nan_to_none(rate[i, present]),
+                )
+            ],
+        })
+    return series
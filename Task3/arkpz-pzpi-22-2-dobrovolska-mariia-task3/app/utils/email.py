@@ -1,27 +1,203 @@
+import asyncio
+import logging
 import smtplib
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from typing import Callable, List, Optional
 
-def send_email_notification(to_email: str, subject: str, body: str):
+logger = logging.getLogger(__name__)
+
+SMTP_SERVER = "smtp.gmail.com"
+SMTP_PORT = 587
+FROM_EMAIL = "_@gmail.com"
+EMAIL_PASSWORD = "your_password"
+
+NOTIFICATION_WORKERS = 2
+NOTIFICATION_QUEUE_SIZE = 1000
+MAX_SEND_ATTEMPTS = 5
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 60.0
+SMTP_TIMEOUT = 10
+# Connections idle for longer than this are checked with NOOP before reuse
+SMTP_KEEPALIVE_INTERVAL = 30
+SHUTDOWN_DRAIN_TIMEOUT = 10
 
-    smtp_server = "smtp.gmail.com"
-    smtp_port = 587
-    from_email = "_@gmail.com"
-    email_password = "your_password"
 
-    # Настраиваем сообщение
+def build_message(to_email: str, subject: str, body: str) -> MIMEMultipart:
     message = MIMEMultipart()
-    message["From"] = from_email
+    message["From"] = FROM_EMAIL
     message["To"] = to_email
     message["Subject"] = subject
     message.attach(MIMEText(body, "plain"))
+    return message
+
+
+# One authenticated SMTP connection that is kept open between messages.
+# It is blocking, the dispatcher only calls it from worker threads.
+class SmtpTransport:
+    def __init__(
+        self,
+        host: str = SMTP_SERVER,
+        port: int = SMTP_PORT,
+        username: Optional[str] = FROM_EMAIL,
+        password: Optional[str] = EMAIL_PASSWORD,
+        use_tls: bool = True,
+        timeout: float = SMTP_TIMEOUT,
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self._server: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.use_tls:
+                server.starttls()
+            if self.username and self.password:
+                server.login(self.username, self.password)
+        except Exception:
+            server.close()
+            raise
+        self._server = server
+
+    def _is_alive(self) -> bool:
+        try:
+            return self._server.noop()[0] == 250
+        except smtplib.SMTPException:
+            return False
+        except OSError:
+            return False
+
+    def send(self, message: MIMEMultipart):
+        if self._server is not None and time.monotonic() - self._last_used > SMTP_KEEPALIVE_INTERVAL:
+            if not self._is_alive():
+                self.close()
+        if self._server is None:
+            self._connect()
+        try:
+            self._server.send_message(message)
+        except smtplib.SMTPServerDisconnected:
+            # The server dropped an idle connection between the NOOP check and the send
+            self.close()
+            self._connect()
+            self._server.send_message(message)
+        self._last_used = time.monotonic()
+
+    def close(self):
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except Exception:
+            self._server.close()
+        self._server = None
+
+
+# Background delivery of notifications: handlers only enqueue, a pool of workers
+# with their own SMTP connections sends, retrying with exponential backoff.
+class NotificationDispatcher:
+    def __init__(
+        self,
+        transport_factory: Callable[[], SmtpTransport] = SmtpTransport,
+        workers: int = NOTIFICATION_WORKERS,
+        queue_size: int = NOTIFICATION_QUEUE_SIZE,
+    ):
+        self.transport_factory = transport_factory
+        self.workers = workers
+        self.queue_size = queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
 
-    try:
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls()
-            server.login(from_email, email_password)
-            server.send_message(message)
-            print(f"Email sent to {to_email}")
-    except Exception as e:
-        print(f"Failed to send email: {e}")
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.retries = 0
 
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def enqueue(self, to_email: str, subject: str, body: str) -> bool:
+        if not self.running:
+            logger.warning(f"Notification dispatcher is not running, email to {to_email} dropped")
+            self.dropped += 1
+            return False
+        try:
+            self._queue.put_nowait(build_message(to_email, subject, body))
+        except asyncio.QueueFull:
+            logger.error(f"Notification queue is full, email to {to_email} dropped")
+            self.dropped += 1
+            return False
+        return True
+
+    async def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(f"Notification dispatcher started with {self.workers} workers.")
+
+    async def stop(self):
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), SHUTDOWN_DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.error(f"Notification dispatcher stopped with {self._queue.qsize()} emails undelivered")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("Notification dispatcher stopped.")
+
+    def metrics(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "sent": self.sent,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "retries": self.retries,
+        }
+
+    async def _worker(self):
+        transport = self.transport_factory()
+        try:
+            while True:
+                message = await self._queue.get()
+                try:
+                    await self._deliver(transport, message)
+                finally:
+                    self._queue.task_done()
+        finally:
+            await asyncio.to_thread(transport.close)
+
+    async def _deliver(self, transport: SmtpTransport, message: MIMEMultipart):
+        for attempt in range(1, MAX_SEND_ATTEMPTS + 1):
+            try:
+                await asyncio.to_thread(transport.send, message)
+                self.sent += 1
+                logger.info(f"Email sent to {message['To']}")
+                return
+            except Exception as e:
+                await asyncio.to_thread(transport.close)
+                if attempt == MAX_SEND_ATTEMPTS:
+                    self.failed += 1
+                    logger.error(f"Failed to send email to {message['To']} after {attempt} attempts: {e}")
+                    return
+                self.retries += 1
+                delay = min(RETRY_BASE_DELAY * 2 ** (attempt - 1), RETRY_MAX_DELAY)
+                logger.warning(f"Failed to send email to {message['To']} (attempt {attempt}), retrying in {delay}s: {e}")
+                await asyncio.sleep(delay)
+
+
+notification_dispatcher = NotificationDispatcher()
+
+
+def send_email_notification(to_email: str, subject: str, body: str):
+    notification_dispatcher.enqueue(to_email, subject, body)
@@ -0,0 +1,222 @@
+# app/utils/ingestion.py
+import asyncio
+import logging
+import time
+from typing import List, Optional, Tuple
+
+from app.database import AsyncSessionLocal
+from sqlalchemy import select
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.device import Device
+from app.models.sensor_reading import SensorReading
+from app.utils.alert_rules import alert_rule_engine
+from app.utils.anomaly import anomaly_detector
+from app.utils.latest_readings import latest_readings
+from app.utils.liveness import device_liveness
+from app.utils.broker import event_broker, reading_event
+from app.utils.rollups import store_readings
+from app.utils.spool import ReadingSpool, reading_spool
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL_MS = 200
+FLUSH_MAX_ROWS = 500
+BUFFER_CAPACITY = 20000
+FLUSH_RETRY_DELAY = 1.0
+SHUTDOWN_FLUSH_ATTEMPTS = 3
+
+
+class IngestionQueueFull(Exception):
+    pass
+
+
+# Everything that has to happen once readings are committed, whichever route they came through.
+# Rollups are not among them, store_readings writes them in the same transaction as the readings.
+async def process_ingested_readings(db_session: AsyncSession, sensor_readings: List[SensorReading]):
+    try:
+        await alert_rule_engine.raise_alerts(db_session, sensor_readings)
+    except Exception as e:
+        logger.exception(f"Error occurred while evaluating alert rules: {str(e)}")
+    try:
+        await anomaly_detector.observe(db_session, sensor_readings)
+    except Exception as e:
+        logger.exception(f"Error occurred while checking readings for anomalies: {str(e)}")
+    try:
+        # After the rule engine, which has resolved the incubators of any devices it did not know yet
+        latest_readings.update(sensor_readings)
+        for sensor_reading in sensor_readings:
+            device_liveness.touch(sensor_reading.device_id)
+            event_broker.publish(reading_event(sensor_reading, alert_rule_engine.incubator_for_device(sensor_reading.device_id)))
+    except Exception as e:
+        logger.exception(f"Error occurred while publishing ingested readings: {str(e)}")
+
+
+# Write-behind buffer: readings are acknowledged immediately and written to the
+# database in batches every FLUSH_INTERVAL_MS or FLUSH_MAX_ROWS rows, whichever comes first.
+class IngestionBuffer:
+    def __init__(
+        self,
+        flush_interval_ms: int = FLUSH_INTERVAL_MS,
+        flush_max_rows: int = FLUSH_MAX_ROWS,
+        capacity: int = BUFFER_CAPACITY,
+        spool: Optional[ReadingSpool] = None,
+    ):
+        self.flush_interval = flush_interval_ms / 1000
+        self.flush_max_rows = flush_max_rows
+        self.capacity = capacity
+        self.spool = spool
+        self._queue: Optional[asyncio.Queue] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+        self.accepted = 0
+        self.rejected = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.flushed_rows = 0
+        self.dropped_rows = 0
+        self.last_flush_latency_ms = 0.0
+        self.max_flush_latency_ms = 0.0
+        self._total_flush_latency_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def submit(self, sensor_reading_data: dict):
+        if not self.running or self._stopping:
+            raise RuntimeError("Ingestion buffer is not running")
+        if self._queue.full():
+            self.rejected += 1
+            raise IngestionQueueFull()
+        # Durable before acknowledged: the spool entry is released once the row is committed
+        seq = self.spool.append(sensor_reading_data) if self.spool else None
+        self._queue.put_nowait((sensor_reading_data, seq))
+        self.accepted += 1
+        if self._queue.qsize() >= self.flush_max_rows:
+            self._wakeup.set()
+        if self.spool:
+            await self.spool.wait_durable()
+
+    async def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.capacity)
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        if self.spool:
+            self.spool.open()
+        self._task = asyncio.create_task(self._run())
+        logger.info("Ingestion buffer started.")
+
+    async def stop(self):
+        if not self.running:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+        if self.spool:
+            await self.spool.close()
+        logger.info("Ingestion buffer stopped.")
+
+    def metrics(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "capacity": self.capacity,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "flushed_rows": self.flushed_rows,
+            "dropped_rows": self.dropped_rows,
+            "last_flush_latency_ms": round(self.last_flush_latency_ms, 3),
+            "avg_flush_latency_ms": round(self._total_flush_latency_ms / self.flushes, 3) if self.flushes else 0.0,
+            "max_flush_latency_ms": round(self.max_flush_latency_ms, 3),
+            "spool_segments": self.spool.pending_segments() if self.spool else 0,
+        }
+
+    async def _run(self):
+        while True:
+            if not self._stopping and self._queue.qsize() < self.flush_max_rows:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+            batch = self._drain()
+            if batch:
+                await self._flush_with_retry(batch)
+            elif self._stopping:
+                return
+
+    def _drain(self) -> List[Tuple[dict, Optional[int]]]:
+        batch = []
+        while len(batch) < self.flush_max_rows:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return batch
+
+    async def _flush_with_retry(self, batch: List[Tuple[dict, Optional[int]]]):
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                await self._flush(batch)
+                return
+            except Exception as e:
+                self.failed_flushes += 1
+                logger.exception(f"Failed to flush {len(batch)} buffered sensor readings (attempt {attempt}): {str(e)}")
+                if self._stopping and attempt >= SHUTDOWN_FLUSH_ATTEMPTS:
+                    logger.error(f"Leaving {len(batch)} buffered sensor readings in the spool for replay")
+                    return
+                await asyncio.sleep(FLUSH_RETRY_DELAY)
+
+    async def _flush(self, batch: List[Tuple[dict, Optional[int]]]):
+        started = time.perf_counter()
+        async with AsyncSessionLocal() as db:
+            # Devices may have been deleted since the readings were accepted
+            device_ids = {row["device_id"] for row, _ in batch}
+            result = await db.execute(select(Device.device_id).where(Device.device_id.in_(device_ids)))
+            known_device_ids = set(result.scalars().all())
+            rows = [row for row, _ in batch if row["device_id"] in known_device_ids]
+            if len(rows) < len(batch):
+                self.dropped_rows += len(batch) - len(rows)
+                logger.warning(f"Dropping {len(batch) - len(rows)} buffered sensor readings of unknown devices")
+            sensor_readings = await self._store(db, rows)
+            latency_ms = (time.perf_counter() - started) * 1000
+            # The batch is committed: nothing from here on may reach the retry loop and insert it again
+            try:
+                if self.spool:
+                    self.spool.release([seq for _, seq in batch])
+                await process_ingested_readings(db, sensor_readings)
+            except Exception as e:
+                logger.exception(f"Error occurred after flushing {len(sensor_readings)} sensor readings: {str(e)}")
+
+        self.flushes += 1
+        self.flushed_rows += len(sensor_readings)
+        self.last_flush_latency_ms = latency_ms
+        self.max_flush_latency_ms = max(self.max_flush_latency_ms, latency_ms)
+        self._total_flush_latency_ms += latency_ms
+        logger.debug(f"Flushed {len(sensor_readings)} sensor readings in {latency_ms:.1f} ms")
+
+    async def _store(self, db: AsyncSession, rows: List[dict]) -> List[SensorReading]:
+        try:
+            # bulk_create converts value_type in place, store a copy so retries see the original rows
+            return await store_readings(db, [dict(row) for row in rows])
+        except (IntegrityError, DataError) as e:
+            # Retrying cannot fix a row the database rejects, so the batch is halved until the
+            # offending rows are found and only those are dropped
+            if len(rows) == 1:
+                self.dropped_rows += 1
+                logger.error(f"Dropping buffered sensor reading rejected by the database {rows[0]}: {str(e)}")
+                return []
+            middle = len(rows) // 2
+            return await self._store(db, rows[:middle]) + await self._store(db, rows[middle:])
+
+ingestion_buffer = IngestionBuffer(spool=reading_spool)
@@ -0,0 +1,157 @@
+# app/utils/latest_readings.py
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import select, true
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.device import Device
+from app.models.sensor_reading import SensorReading, ValueType
+from app.models.sensor_reading_rollup import SensorReadingRollup
+from app.utils.alert_rules import alert_rule_engine, metric_name
+from app.utils.rollups import RESOLUTIONS
+
+logger = logging.getLogger(__name__)
+
+LATEST_BUCKET_RESOLUTION = "1m"
+
+
+class LatestReading:
+    __slots__ = ("device_id", "incubator_id", "value", "recorded_at")
+
+    def __init__(self, device_id: int, incubator_id: Optional[int], value: float, recorded_at: datetime):
+        self.device_id = device_id
+        self.incubator_id = incubator_id
+        self.value = value
+        self.recorded_at = recorded_at
+
+    def to_dict(self) -> dict:
+        return {"device_id": self.device_id, "value": self.value, "recorded_at": self.recorded_at}
+
+
+# Newest reading per (device, metric) and per (incubator, metric), kept in memory so
+# "what is it like in incubator X right now" never has to touch sensor_readings.
+class LatestReadingCache:
+    def __init__(self):
+        self._by_device: Dict[int, Dict[str, LatestReading]] = {}
+        self._by_incubator: Dict[int, Dict[str, LatestReading]] = {}
+
+    async def load(self, db_session: AsyncSession):
+        self._by_device = {}
+        self._by_incubator = {}
+        for value_type in ValueType:
+            # The newest 1m rollup bucket is a primary key lookup per device, and only that
+            # minute of sensor_readings is read, from one partition, instead of every partition
+            newest_bucket = (
+                select(SensorReadingRollup.bucket_start)
+                .where(
+                    SensorReadingRollup.resolution == LATEST_BUCKET_RESOLUTION,
+                    SensorReadingRollup.device_id == Device.device_id,
+                    SensorReadingRollup.value_type == value_type,
+                )
+                .order_by(SensorReadingRollup.bucket_start.desc())
+                .limit(1)
+                .lateral()
+            )
+            newest_reading = (
+                select(SensorReading.value, SensorReading.recorded_at)
+                .where(
+                    SensorReading.device_id == Device.device_id,
+                    SensorReading.value_type == value_type,
+                    SensorReading.recorded_at >= newest_bucket.c.bucket_start,
+                    SensorReading.recorded_at < newest_bucket.c.bucket_start + RESOLUTIONS[LATEST_BUCKET_RESOLUTION],
+                )
+                .order_by(SensorReading.recorded_at.desc())
+                .limit(1)
+                .lateral()
+            )
+            stmt = (
+                select(Device.device_id, Device.incubator_id, newest_reading.c.value, newest_reading.c.recorded_at)
+                .select_from(Device)
+                .join(newest_bucket, true())
+                .join(newest_reading, true())
+            )
+            result = await db_session.execute(stmt)
+            for device_id, incubator_id, value, recorded_at in result.all():
+                self._put(LatestReading(device_id, incubator_id, value, recorded_at), value_type.value)
+        logger.info(f"Latest reading cache warmed for {len(self._by_device)} devices.")
+
+    def _put(self, latest: LatestReading, metric: str):
+        current = self._by_device.setdefault(latest.device_id, {}).get(metric)
+        # Late readings (replayed or buffered) must not overwrite a newer value
+        if current is not None and current.recorded_at > latest.recorded_at:
+            return
+        self._by_device[latest.device_id][metric] = latest
+        if latest.incubator_id is None:
+            return
+        current = self._by_incubator.setdefault(latest.incubator_id, {}).get(metric)
+        if current is None or current.recorded_at <= latest.recorded_at:
+            self._by_incubator[latest.incubator_id][metric] = latest
+
+    def update(self, sensor_readings: Iterable[SensorReading]):
+        for reading in sensor_readings:
+            latest = LatestReading(
+                reading.device_id,
+                alert_rule_engine.incubator_for_device(reading.device_id),
+                reading.value,
+                reading.recorded_at,
+            )
+            self._put(latest, metric_name(reading.value_type))
+
+    def _rebuild_incubator(self, incubator_id: int):
+        rebuilt: Dict[str, LatestReading] = {}
+        for metrics in self._by_device.values():
+            for metric, latest in metrics.items():
+                if latest.incubator_id != incubator_id:
+                    continue
+                if metric not in rebuilt or rebuilt[metric].recorded_at < latest.recorded_at:
+                    rebuilt[metric] = latest
+        if rebuilt:
+            self._by_incubator[incubator_id] = rebuilt
+        else:
+            self._by_incubator.pop(incubator_id, None)
+
+    def refresh_device(self, device):
+        metrics = self._by_device.get(device.device_id)
+        if not metrics:
+            return
+        previous = {latest.incubator_id for latest in metrics.values()}
+        for metric, latest in metrics.items():
+            metrics[metric] = LatestReading(latest.device_id, device.incubator_id, latest.value, latest.recorded_at)
+        for incubator_id in previous | {device.incubator_id}:
+            if incubator_id is not None:
+                self._rebuild_incubator(incubator_id)
+
+    def forget_device(self, device_id: int):
+        metrics = self._by_device.pop(device_id, None)
+        if not metrics:
+            return
+        for incubator_id in {latest.incubator_id for latest in metrics.values()}:
+            if incubator_id is not None:
+                self._rebuild_incubator(incubator_id)
+
+    def forget_incubator(self, incubator_id: int):
+        self._by_incubator.pop(incubator_id, None)
+
+    def for_device(self, device_id: int) -> Dict[str, LatestReading]:
+        return self._by_device.get(device_id, {})
+
+    def current_state(self, incubator_id: int) -> Optional[dict]:
+        metrics = self._by_incubator.get(incubator_id)
+        if not metrics:
+            return None
+        state = {"incubator_id": incubator_id}
+        for metric, latest in metrics.items():
+            state[metric] = latest.to_dict()
+        return state
+
+    def current_states(self, incubator_ids: List[int]) -> List[dict]:
+        states = []
+        for incubator_id in incubator_ids:
+            state = self.current_state(incubator_id)
+            if state is not None:
+                states.append(state)
+        return states
+
+
+latest_readings = LatestReadingCache()
@@ -0,0 +1,292 @@
+# app/utils/liveness.py
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import AsyncSessionLocal
+from app.models.alert import Alert
+from app.models.alert_history import AlertHistory
+from app.models.device import Device
+from app.utils.alert_rules import ALERT_CREATED_BY, alert_rule_engine
+from app.utils.broker import alert_event, event_broker
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REPORT_INTERVAL = 60
+# A device is offline once it has missed this many consecutive reports
+MISSED_REPORTS = 3
+WHEEL_TICK = 1.0
+# One turn of the wheel covers an hour, longer timeouts wait for extra turns in their slot
+WHEEL_SLOTS = 3600
+FLUSH_INTERVAL = 5.0
+CLAIM_RETRY_DELAY = 30.0
+
+FLUSH_QUERY = """
+UPDATE devices d SET last_reported_at = GREATEST(d.last_reported_at, u.reported_at)
+FROM unnest(CAST(:device_ids AS integer[]), CAST(:reported_at AS timestamp[])) AS u(device_id, reported_at)
+WHERE d.device_id = u.device_id
+"""
+
+# Devices reporting again close their offline alert, whichever worker raised it
+RECOVER_QUERY = """
+WITH recovered AS (
+    UPDATE devices d SET offline_alert_id = NULL
+    FROM alerts a
+    WHERE a.alert_id = d.offline_alert_id AND d.device_id = ANY(CAST(:device_ids AS integer[]))
+    RETURNING d.device_id, a.incubator_id, a.alert_id
+)
+UPDATE alerts SET resolved = true FROM recovered WHERE alerts.alert_id = recovered.alert_id
+RETURNING recovered.device_id, recovered.incubator_id, recovered.alert_id
+"""
+
+# Row locks make the claim exclusive: a worker waiting on another one's claim
+# re-checks offline_alert_id once it commits, so each outage is alerted once
+CLAIM_QUERY = """
+SELECT device_id, incubator_id, last_reported_at, report_interval FROM devices
+WHERE device_id = ANY(CAST(:device_ids AS integer[])) AND offline_alert_id IS NULL
+ORDER BY device_id
+FOR UPDATE
+"""
+
+MARK_OFFLINE_QUERY = """
+UPDATE devices d SET offline_alert_id = u.alert_id
+FROM unnest(CAST(:device_ids AS integer[]), CAST(:alert_ids AS integer[])) AS u(device_id, alert_id)
+WHERE d.device_id = u.device_id
+"""
+
+
+def epoch(moment: datetime) -> float:
+    return moment.replace(tzinfo=timezone.utc).timestamp()
+
+
+# Hashed timer wheel: each key sits in the slot of its deadline, so advancing the clock
+# only visits the slots that came due and scheduling or cancelling is O(1).
+class TimerWheel:
+    def __init__(self, tick: float = WHEEL_TICK, slots: int = WHEEL_SLOTS, now: Optional[float] = None):
+        self.tick = tick
+        self._slots: List[Set[int]] = [set() for _ in range(slots)]
+        self._entries: Dict[int, Tuple[float, int]] = {}
+        self._cursor = int((time.time() if now is None else now) // tick)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: int) -> bool:
+        return key in self._entries
+
+    def schedule(self, key: int, deadline: float):
+        self.cancel(key)
+        # Deadlines already past land in the next slot to be processed
+        slot = max(int(deadline // self.tick), self._cursor) % len(self._slots)
+        self._slots[slot].add(key)
+        self._entries[key] = (deadline, slot)
+
+    def cancel(self, key: int):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._slots[entry[1]].discard(key)
+
+    def advance(self, now: float) -> List[int]:
+        target = int(now // self.tick)
+        # After a stall longer than one turn every slot is visited once, not once per missed tick
+        first = max(self._cursor, target - len(self._slots))
+        expired = []
+        for position in range(first, target):
+            slot = self._slots[position % len(self._slots)]
+            due = [key for key in slot if self._entries[key][0] <= now]
+            for key in due:
+                slot.discard(key)
+                del self._entries[key]
+            expired.extend(due)
+        self._cursor = max(self._cursor, target)
+        return expired
+
+
+# Tracks when every device last reported. Ingestion only touches memory: the timer wheel is
+# rescheduled and last_reported_at is written for all touched devices in one UPDATE every
+# FLUSH_INTERVAL. Devices whose deadline passes are checked against the database and get a
+# "device offline" alert, which is resolved by their next report.
+class DeviceLivenessMonitor:
+    def __init__(
+        self,
+        default_interval: int = DEFAULT_REPORT_INTERVAL,
+        missed_reports: int = MISSED_REPORTS,
+        flush_interval: float = FLUSH_INTERVAL,
+    ):
+        self.default_interval = default_interval
+        self.missed_reports = missed_reports
+        self.flush_interval = flush_interval
+        self.wheel = TimerWheel()
+        self._intervals: Dict[int, Optional[int]] = {}
+        self._last_seen: Dict[int, float] = {}
+        self._pending: Dict[int, datetime] = {}
+        self._last_flush = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+
+    def timeout_for(self, device_id: int, interval: Optional[int] = None) -> float:
+        if interval is None:
+            interval = self._intervals.get(device_id)
+        return (interval or self.default_interval) * self.missed_reports
+
+    async def load(self, db_session: AsyncSession):
+        result = await db_session.execute(
+            select(Device.device_id, Device.report_interval, Device.last_reported_at, Device.offline_alert_id)
+        )
+        # Reports seen in memory but not flushed yet are newer than the database
+        previous, self._last_seen = self._last_seen, {}
+        self.wheel = TimerWheel()
+        self._intervals = {}
+        for device_id, report_interval, last_reported_at, offline_alert_id in result.all():
+            self._intervals[device_id] = report_interval
+            if last_reported_at is None:
+                continue
+            self._last_seen[device_id] = max(epoch(last_reported_at), previous.get(device_id, float("-inf")))
+            # Devices already offline are rescheduled by their next report
+            if offline_alert_id is None:
+                self.wheel.schedule(device_id, self._last_seen[device_id] + self.timeout_for(device_id))
+        logger.info(f"Device liveness loaded for {len(self._intervals)} devices, {len(self.wheel)} being watched.")
+
+    def refresh_device(self, device):
+        self._intervals[device.device_id] = getattr(device, "report_interval", None)
+        last_seen = self._last_seen.get(device.device_id)
+        if last_seen is not None and device.device_id in self.wheel:
+            self.wheel.schedule(device.device_id, last_seen + self.timeout_for(device.device_id))
+
+    def forget_device(self, device_id: int):
+        self.wheel.cancel(device_id)
+        self._intervals.pop(device_id, None)
+        self._last_seen.pop(device_id, None)
+        self._pending.pop(device_id, None)
+
+    def touch(self, device_id: int, persist: bool = True):
+        # Liveness runs on the server's clock: the recorded_at a device sends can lag behind or
+        # carry an offset, and a device that reports at all is online whatever its timestamps say.
+        # persist=False for readings relayed from other workers, which flush them themselves
+        seen = time.time()
+        if seen <= self._last_seen.get(device_id, float("-inf")):
+            return
+        self._last_seen[device_id] = seen
+        self.wheel.schedule(device_id, seen + self.timeout_for(device_id))
+        if persist:
+            self._pending[device_id] = datetime.utcfromtimestamp(seen)
+
+    async def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        self._last_flush = time.monotonic()
+        device_ids = sorted(pending)
+        async with AsyncSessionLocal() as db_session:
+            try:
+                await db_session.execute(
+                    text(FLUSH_QUERY), {"device_ids": device_ids, "reported_at": [pending[d] for d in device_ids]}
+                )
+                recovered = (await db_session.execute(text(RECOVER_QUERY), {"device_ids": device_ids})).all()
+                if recovered:
+                    await db_session.execute(insert(AlertHistory), [
+                        {"alert_id": alert_id, "status": "resolved", "created_by": ALERT_CREATED_BY}
+                        for _, _, alert_id in recovered
+                    ])
+                await db_session.commit()
+            except Exception:
+                await db_session.rollback()
+                for device_id, recorded_at in pending.items():
+                    if device_id not in self._pending or self._pending[device_id] < recorded_at:
+                        self._pending[device_id] = recorded_at
+                raise
+            notifications = []
+            for device_id, incubator_id, alert_id in recovered:
+                message = f"Device {device_id} is back online"
+                event_broker.publish(alert_event(incubator_id, alert_id, "resolved", "liveness", message))
+                notifications.append((incubator_id, f"Incubator {incubator_id}: {message}"))
+            await alert_rule_engine.notify(db_session, notifications)
+
+    async def raise_offline(self, device_ids: List[int]) -> List[Alert]:
+        now = time.time()
+        async with AsyncSessionLocal() as db_session:
+            try:
+                rows = (await db_session.execute(text(CLAIM_QUERY), {"device_ids": device_ids})).all()
+                offline = []
+                for device_id, incubator_id, last_reported_at, report_interval in rows:
+                    if last_reported_at is None:
+                        continue
+                    # Another worker may have flushed a report that never reached this one
+                    last_seen = max(epoch(last_reported_at), self._last_seen.get(device_id, float("-inf")))
+                    deadline = last_seen + self.timeout_for(device_id, report_interval)
+                    if deadline > now:
+                        self.wheel.schedule(device_id, deadline)
+                        continue
+                    offline.append((device_id, incubator_id, (
+                        f"Device {device_id} is offline: no readings since "
+                        f"{datetime.utcfromtimestamp(last_seen):%Y-%m-%d %H:%M:%S} UTC"
+                    )))
+                if not offline:
+                    await db_session.commit()
+                    return []
+                result = await db_session.scalars(
+                    insert(Alert).returning(Alert, sort_by_parameter_order=True),
+                    [{"incubator_id": incubator_id, "message": message} for _, incubator_id, message in offline],
+                )
+                alerts = result.all()
+                await db_session.execute(text(MARK_OFFLINE_QUERY), {
+                    "device_ids": [device_id for device_id, _, _ in offline],
+                    "alert_ids": [alert.alert_id for alert in alerts],
+                })
+                await db_session.execute(insert(AlertHistory), [
+                    {"alert_id": alert.alert_id, "status": "triggered", "created_by": ALERT_CREATED_BY}
+                    for alert in alerts
+                ])
+                await db_session.commit()
+            except Exception:
+                await db_session.rollback()
+                raise
+            for (_, incubator_id, message), alert in zip(offline, alerts):
+                event_broker.publish(alert_event(incubator_id, alert.alert_id, "triggered", "liveness", message))
+            await alert_rule_engine.notify(
+                db_session, [(incubator_id, f"Incubator {incubator_id}: {message}") for _, incubator_id, message in offline]
+            )
+            return alerts
+
+    async def tick(self):
+        if self._pending and time.monotonic() - self._last_flush >= self.flush_interval:
+            await self.flush()
+        expired = self.wheel.advance(time.time())
+        if not expired:
+            return
+        try:
+            await self.raise_offline(expired)
+        except Exception:
+            retry_at = time.time() + CLAIM_RETRY_DELAY
+            for device_id in expired:
+                if device_id not in self.wheel:
+                    self.wheel.schedule(device_id, retry_at)
+            raise
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Could not flush device liveness on shutdown: {str(e)}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.wheel.tick)
+            try:
+                await self.tick()
+            except Exception as e:
+                logger.exception(f"Error occurred while checking device liveness: {str(e)}")
+
+
+device_liveness = DeviceLivenessMonitor()
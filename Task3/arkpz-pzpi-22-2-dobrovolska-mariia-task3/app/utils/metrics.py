@@ -0,0 +1,207 @@
+# app/utils/metrics.py
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+
+from fastapi import FastAPI, Response
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event
+
+from app.database import engine, pool_metrics
+from app.utils.anomaly import anomaly_detector
+from app.utils.auth import token_verifier
+from app.utils.broker import event_broker
+from app.utils.device_auth import device_keys
+from app.utils.email import notification_dispatcher
+from app.utils.ingestion import ingestion_buffer
+from app.utils.logging_setup import log_pipeline
+from app.utils.partitions import partition_manager
+from app.utils.pubsub import pubsub
+from app.utils.query_audit import query_auditor
+from app.utils.verification import password_hasher
+
+METRICS_PATH = "/metrics"
+# Requests that match no route share one label so unknown paths cannot blow up the series count
+UNMATCHED_ROUTE = "unmatched"
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Time spent handling a request", ["method", "route", "status"],
+)
+REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "Requests currently being handled")
+# Totals rather than histograms: queries and DB time per request are these divided by the request count,
+# and a counter increment is several times cheaper than a histogram observation
+DB_QUERIES = Counter("db_queries_total", "SQL statements executed, by route or 'background'", ["route"])
+DB_SECONDS = Counter("db_seconds_total", "Time spent in SQL statements, by route or 'background'", ["route"])
+BACKGROUND_ROUTE = "background"
+READINGS_INGESTED = Counter("sensor_readings_ingested_total", "Sensor readings stored by this worker")
+ALERTS = Counter("alerts_total", "Alerts raised or resolved by this worker", ["status", "metric"])
+
+
+# Collected while a request is handled, read back for the request metrics, the Server-Timing
+# header and the query audit (statement text -> times run)
+class RequestTimings:
+    __slots__ = ("scope", "started", "db_queries", "db_time", "statements")
+
+    def __init__(self, scope, started: float):
+        self.scope = scope
+        self.started = started
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.statements: Dict[str, int] = {}
+
+    @property
+    def route_path(self) -> str:
+        return getattr(self.scope.get("route"), "path", UNMATCHED_ROUTE)
+
+    def server_timing(self) -> bytes:
+        total = time.perf_counter() - self.started
+        return f'db;dur={self.db_time * 1000:.2f};desc="{self.db_queries} queries", total;dur={total * 1000:.2f}'.encode()
+
+
+# SQLAlchemy runs the cursor events in a greenlet that shares the request task's context
+_current_timings: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def current_timings() -> Optional[RequestTimings]:
+    return _current_timings.get()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_started"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop("query_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    timings = _current_timings.get()
+    if timings is None:
+        _background_queries.inc()
+        _background_seconds.inc(elapsed)
+    else:
+        timings.db_queries += 1
+        timings.db_time += elapsed
+        timings.statements[statement] = timings.statements.get(statement, 0) + 1
+    if elapsed >= query_auditor.slow_query_seconds:
+        route = timings.route_path if timings is not None else BACKGROUND_ROUTE
+        query_auditor.slow_query(statement, parameters, elapsed, executemany, route)
+
+
+_background_queries = DB_QUERIES.labels(BACKGROUND_ROUTE)
+_background_seconds = DB_SECONDS.labels(BACKGROUND_ROUTE)
+# Labelled children by route, looked up once instead of through labels() on every request
+_request_series: Dict[tuple, tuple] = {}
+
+
+def _series_for(method: str, route_path: str, status_code: int) -> tuple:
+    key = (method, route_path, status_code)
+    series = _request_series.get(key)
+    if series is None:
+        series = (
+            REQUEST_SECONDS.labels(method, route_path, str(status_code)),
+            DB_QUERIES.labels(route_path),
+            DB_SECONDS.labels(route_path),
+        )
+        _request_series[key] = series
+    return series
+
+
+# Plain ASGI rather than BaseHTTPMiddleware: no extra task per request and streamed responses
+# (SSE) pass through untouched. Costs a few microseconds per request.
+class MetricsMiddleware:
+    # Read by the in-flight gauge at scrape time, a plain int is cheaper than a locked Gauge.inc()
+    in_flight = 0
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings(scope, time.perf_counter())
+        token = _current_timings.set(timings)
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                if query_auditor.strict:
+                    query_auditor.check_budget(
+                        timings.route_path, getattr(scope.get("route"), "endpoint", None), timings.db_queries
+                    )
+                status_code = message["status"]
+                message["headers"] = [*message.get("headers", ()), (b"server-timing", timings.server_timing())]
+            await send(message)
+
+        MetricsMiddleware.in_flight += 1
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            MetricsMiddleware.in_flight -= 1
+            _current_timings.reset(token)
+            route_path = timings.route_path
+            request_seconds, db_queries, db_seconds = _series_for(scope["method"], route_path, status_code)
+            request_seconds.observe(time.perf_counter() - timings.started)
+            if timings.db_queries:
+                db_queries.inc(timings.db_queries)
+                db_seconds.inc(timings.db_time)
+                query_auditor.finish(route_path, getattr(scope.get("route"), "endpoint", None), timings.statements)
+
+
+# Exposes the metrics() dicts the services already keep as gauges, read at scrape time
+class ServiceMetricsCollector:
+    def __init__(self):
+        self._sources: Dict[str, Callable[[], dict]] = {}
+
+    def register(self, name: str, source: Callable[[], dict]):
+        self._sources[name] = source
+
+    def collect(self):
+        for name, source in self._sources.items():
+            for key, value in source().items():
+                if isinstance(value, (int, float)):
+                    yield GaugeMetricFamily(f"{name}_{key}", f"{name} {key.replace('_', ' ')}", value=value)
+
+
+service_metrics = ServiceMetricsCollector()
+
+
+def _count_event(published_event: dict):
+    if published_event["type"] == "reading":
+        READINGS_INGESTED.inc()
+    elif published_event["type"] == "alert":
+        data = published_event["data"]
+        ALERTS.labels(data["status"], data["metric"]).inc()
+
+
+async def metrics_endpoint():
+    return Response(generate_latest(REGISTRY), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
+
+def setup_metrics(app: FastAPI):
+    app.add_middleware(MetricsMiddleware)
+    app.add_api_route(METRICS_PATH, metrics_endpoint, methods=["GET"], include_in_schema=False)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+    # Relays only see events published by this worker, so each reading and alert is counted once
+    event_broker.add_relay(_count_event)
+    REQUESTS_IN_FLIGHT.set_function(lambda: MetricsMiddleware.in_flight)
+
+    service_metrics.register("db_pool", pool_metrics)
+    service_metrics.register("ingestion_buffer", ingestion_buffer.metrics)
+    service_metrics.register("event_broker", event_broker.metrics)
+    service_metrics.register("pubsub", pubsub.metrics)
+    service_metrics.register("notifications", notification_dispatcher.metrics)
+    service_metrics.register("password_hasher", password_hasher.metrics)
+    service_metrics.register("token_cache", token_verifier.metrics)
+    service_metrics.register("device_keys", device_keys.metrics)
+    service_metrics.register("query_audit", query_auditor.metrics)
+    service_metrics.register("logging", log_pipeline.metrics)
+    service_metrics.register("partitions", partition_manager.metrics)
+    service_metrics.register("anomaly_detector", anomaly_detector.metrics)
+    REGISTRY.register(service_metrics)
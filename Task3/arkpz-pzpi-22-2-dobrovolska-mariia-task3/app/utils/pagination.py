@@ -0,0 +1,146 @@
+# app/utils/pagination.py
+import base64
+import binascii
+import json
+import logging
+from datetime import datetime
+from typing import AsyncIterator, List, Optional, Tuple, Type
+
+from fastapi import HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy import tuple_
+from sqlalchemy.ext.asyncio import AsyncScalarResult
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# Rows fetched per round trip from the server-side cursor in stream mode
+STREAM_BATCH_SIZE = 500
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def _encode_payload(payload: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def _decode_payload(cursor: str) -> dict:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(payload, dict):
+        raise ValueError("Invalid cursor")
+    return payload
+
+
+def encode_cursor(last_id: int) -> str:
+    return _encode_payload({"after": last_id})
+
+
+def decode_cursor(cursor: str) -> int:
+    last_id = _decode_payload(cursor).get("after")
+    if not isinstance(last_id, int):
+        raise ValueError("Invalid cursor")
+    return last_id
+
+
+# Time ordered pages carry the timestamp of their last row too, ids alone do not follow recorded_at
+def encode_time_cursor(last_at: datetime, last_id: int) -> str:
+    return _encode_payload({"at": last_at.isoformat(), "after": last_id})
+
+
+def decode_time_cursor(cursor: str) -> Tuple[datetime, int]:
+    payload = _decode_payload(cursor)
+    last_id = payload.get("after")
+    if not isinstance(last_id, int) or not isinstance(payload.get("at"), str):
+        raise ValueError("Invalid cursor")
+    return datetime.fromisoformat(payload["at"]), last_id
+
+
+# Query parameters shared by every list endpoint. Declared before get_db so a bad
+# cursor is answered with 400 before a database session is opened.
+class PageParams:
+    def __init__(
+        self,
+        cursor: Optional[str] = None,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        stream: bool = False,
+    ):
+        try:
+            self.after = decode_cursor(cursor) if cursor else None
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        self.limit = limit
+        self.stream = stream
+
+
+# PageParams for lists ordered by time, `after` is the (timestamp, id) of the last row returned
+class TimePageParams:
+    def __init__(
+        self,
+        cursor: Optional[str] = None,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        stream: bool = False,
+    ):
+        try:
+            self.after = decode_time_cursor(cursor) if cursor else None
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        self.limit = limit
+        self.stream = stream
+
+
+def keyset_select(stmt, key_column, after: Optional[int], limit: int):
+    if after is not None:
+        stmt = stmt.where(key_column > after)
+    # One extra row tells whether there is a next page without a COUNT
+    return stmt.order_by(key_column).limit(limit + 1)
+
+
+def time_keyset_select(stmt, time_column, key_column, after: Optional[Tuple[datetime, int]], limit: int):
+    if after is not None:
+        # The plain bound lets the time index and partition pruning skip everything before the cursor
+        stmt = stmt.where(time_column >= after[0], tuple_(time_column, key_column) > tuple_(*after))
+    return stmt.order_by(time_column, key_column).limit(limit + 1)
+
+
+def split_page(rows: List, key_attr: str, limit: int) -> Tuple[List, Optional[str]]:
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(getattr(rows[-1], key_attr))
+
+
+def split_time_page(rows: List, time_attr: str, key_attr: str, limit: int) -> Tuple[List, Optional[str]]:
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_time_cursor(getattr(rows[-1], time_attr), getattr(rows[-1], key_attr))
+
+
+def stream_select(stmt, *key_columns):
+    return stmt.order_by(*key_columns).execution_options(yield_per=STREAM_BATCH_SIZE)
+
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]):
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+
+async def _ndjson_lines(result: AsyncScalarResult, schema: Type[BaseModel]) -> AsyncIterator[str]:
+    try:
+        async for row in result:
+            yield schema.from_orm(row).json() + "\n"
+    except Exception as e:
+        # Headers are already sent, the client sees a truncated stream
+        logger.exception(f"Error occurred while streaming {schema.__name__} rows: {str(e)}")
+    finally:
+        await result.close()
+
+
+def ndjson_response(result: AsyncScalarResult, schema: Type[BaseModel]) -> StreamingResponse:
+    return StreamingResponse(_ndjson_lines(result, schema), media_type=NDJSON_MEDIA_TYPE)
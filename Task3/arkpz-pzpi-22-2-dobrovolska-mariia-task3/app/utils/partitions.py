@@ -0,0 +1,212 @@
+# app/utils/partitions.py
+import asyncio
+import logging
+import re
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from app.database import engine
+
+logger = logging.getLogger(__name__)
+
+PARTITION_INTERVAL = "daily"  # "daily" | "weekly"
+PARTITIONS_AHEAD = 7
+RETENTION_DAYS = 365
+MAINTENANCE_INTERVAL = 3600
+# Transaction advisory lock taken by the worker running maintenance, the others skip the round
+MAINTENANCE_LOCK_KEY = 0x70617274
+
+PARENT_TABLE = "sensor_readings"
+PARTITION_PREFIX = "sensor_readings_p"
+DEFAULT_PARTITION = "sensor_readings_default"
+
+BOUND_PATTERN = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+def partition_step() -> timedelta:
+    if PARTITION_INTERVAL == "weekly":
+        return timedelta(weeks=1)
+    if PARTITION_INTERVAL == "daily":
+        return timedelta(days=1)
+    raise ValueError(f"Unknown partition interval: {PARTITION_INTERVAL}")
+
+
+def partition_start(day: date) -> date:
+    if PARTITION_INTERVAL == "weekly":
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def partition_name(start: date) -> str:
+    return f"{PARTITION_PREFIX}{start:%Y%m%d}"
+
+
+async def is_partitioned(conn: AsyncConnection) -> bool:
+    result = await conn.execute(
+        text("SELECT relkind::text FROM pg_class WHERE oid = to_regclass(:table)"), {"table": PARENT_TABLE}
+    )
+    return result.scalar() == "p"
+
+
+async def existing_partitions(conn: AsyncConnection) -> Dict[str, Optional[Tuple[datetime, datetime]]]:
+    result = await conn.execute(text(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = to_regclass(:table)"
+    ), {"table": PARENT_TABLE})
+    partitions = {}
+    for name, bound in result.all():
+        match = BOUND_PATTERN.search(bound or "")
+        partitions[name] = (
+            (datetime.fromisoformat(match.group(1)), datetime.fromisoformat(match.group(2))) if match else None
+        )
+    return partitions
+
+
+def upcoming_partitions(today: Optional[date] = None) -> List[Tuple[str, date, date]]:
+    start = partition_start(today or datetime.utcnow().date())
+    step = partition_step()
+    upcoming = []
+    for _ in range(PARTITIONS_AHEAD + 1):
+        upcoming.append((partition_name(start), start, start + step))
+        start += step
+    return upcoming
+
+
+async def count_default_rows(conn: AsyncConnection, start: Optional[date] = None, end: Optional[date] = None) -> int:
+    stmt = f"SELECT count(*) FROM {DEFAULT_PARTITION}"
+    if start is not None:
+        stmt += " WHERE recorded_at >= :start AND recorded_at < :end"
+    return (await conn.execute(text(stmt), {"start": start, "end": end})).scalar()
+
+
+async def _split_default(conn: AsyncConnection, name: str, start: date, end: date) -> int:
+    # Creating a partition fails while the default one holds rows of its range, e.g. readings sent
+    # with a clock running days ahead. The default is detached so the partition can be created,
+    # its rows for the range are moved over and it is attached again, all in one transaction.
+    await conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {DEFAULT_PARTITION}"))
+    await conn.execute(text(
+        f"CREATE TABLE {name} PARTITION OF {PARENT_TABLE} "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    ))
+    result = await conn.execute(text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE recorded_at >= :start AND recorded_at < :end "
+        f"RETURNING reading_id, device_id, value_type, value, recorded_at) "
+        f"INSERT INTO {PARENT_TABLE} (reading_id, device_id, value_type, value, recorded_at) SELECT * FROM moved"
+    ), {"start": start, "end": end})
+    await conn.execute(text(f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT"))
+    return result.rowcount
+
+
+async def ensure_partitions(conn: AsyncConnection, today: Optional[date] = None) -> List[str]:
+    if not await is_partitioned(conn):
+        logger.warning(f"Table {PARENT_TABLE} is not partitioned, skipping partition maintenance")
+        return []
+    existing = await existing_partitions(conn)
+    created = []
+    for name, start, end in upcoming_partitions(today):
+        if name in existing:
+            continue
+        try:
+            async with conn.begin_nested():
+                if DEFAULT_PARTITION in existing and await count_default_rows(conn, start, end):
+                    moved = await _split_default(conn, name, start, end)
+                    logger.warning(f"Moved {moved} sensor readings from {DEFAULT_PARTITION} into new partition {name}")
+                else:
+                    await conn.execute(text(
+                        f"CREATE TABLE {name} PARTITION OF {PARENT_TABLE} "
+                        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+                    ))
+            created.append(name)
+        except Exception as e:
+            logger.error(f"Could not create partition {name}: {str(e)}")
+    if DEFAULT_PARTITION not in existing:
+        await conn.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {PARENT_TABLE} DEFAULT"))
+        created.append(DEFAULT_PARTITION)
+    if created:
+        logger.info(f"Created sensor reading partitions: {', '.join(created)}")
+    return created
+
+
+async def drop_expired_partitions(conn: AsyncConnection, today: Optional[date] = None) -> List[str]:
+    if not await is_partitioned(conn):
+        return []
+    cutoff = datetime.combine((today or datetime.utcnow().date()) - timedelta(days=RETENTION_DAYS), time.min)
+    dropped = []
+    for name, bounds in (await existing_partitions(conn)).items():
+        if bounds is None or bounds[1] > cutoff:
+            continue
+        # Retention is a metadata operation: no DELETE, no vacuum debt on the hot partitions
+        await conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+        await conn.execute(text(f"DROP TABLE {name}"))
+        dropped.append(name)
+    if dropped:
+        logger.info(f"Dropped expired sensor reading partitions: {', '.join(dropped)}")
+    return dropped
+
+
+async def claim_maintenance(conn: AsyncConnection) -> bool:
+    # Released when the transaction ends
+    result = await conn.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": MAINTENANCE_LOCK_KEY})
+    return result.scalar()
+
+
+# Runs partition maintenance every interval. missing_partitions and default_rows stay at 0 while
+# it keeps up, anything else means readings pile up in the default partition and needs a look.
+class PartitionManager:
+    def __init__(self, interval: float = MAINTENANCE_INTERVAL):
+        self.interval = interval
+        self.missing_partitions = 0
+        self.default_rows = 0
+        self.failures = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_maintenance(self):
+        # Creating and dropping partitions locks sensor_readings, so only one worker does it and
+        # the drops get their own transaction instead of holding the locks of the creates too
+        async with engine.begin() as conn:
+            claimed = await claim_maintenance(conn)
+            if claimed:
+                await ensure_partitions(conn)
+        if claimed:
+            async with engine.begin() as conn:
+                if await claim_maintenance(conn):
+                    await drop_expired_partitions(conn)
+        async with engine.connect() as conn:
+            if not await is_partitioned(conn):
+                return
+            existing = await existing_partitions(conn)
+            self.missing_partitions = sum(1 for name, _, _ in upcoming_partitions() if name not in existing)
+            self.default_rows = await count_default_rows(conn) if DEFAULT_PARTITION in existing else 0
+        if claimed and self.missing_partitions:
+            logger.error(f"{self.missing_partitions} upcoming sensor reading partitions could not be created")
+
+    def metrics(self) -> dict:
+        return {
+            "missing_partitions": self.missing_partitions,
+            "default_rows": self.default_rows,
+            "failures": self.failures,
+        }
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_maintenance()
+            except Exception as e:
+                self.failures += 1
+                logger.exception(f"Error occurred during partition maintenance: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+
+partition_manager = PartitionManager()
@@ -0,0 +1,222 @@
+# app/utils/pubsub.py
+import asyncio
+import json
+import logging
+import uuid
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from app.database import engine
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "incubator_events"
+# PostgreSQL rejects NOTIFY payloads of 8000 bytes or more
+NOTIFY_PAYLOAD_LIMIT = 7900
+PUBLISH_INTERVAL_MS = 50
+OUTBOX_CAPACITY = 10000
+RECONNECT_MIN_DELAY = 1.0
+RECONNECT_MAX_DELAY = 30.0
+# Catches half-open connections that never report termination
+LISTEN_HEALTHCHECK_INTERVAL = 30
+
+Handler = Callable[[dict], Awaitable[None]]
+
+
+def _default(obj):
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    return getattr(obj, "value", str(obj))
+
+
+# Pub/sub between workers over PostgreSQL LISTEN/NOTIFY. Messages published within
+# PUBLISH_INTERVAL_MS are packed into as few NOTIFY payloads as fit under the size limit;
+# each payload carries the origin id so a worker ignores its own messages.
+class PgPubSub:
+    def __init__(
+        self,
+        db_engine: AsyncEngine = engine,
+        channel: str = CHANNEL,
+        publish_interval_ms: int = PUBLISH_INTERVAL_MS,
+        payload_limit: int = NOTIFY_PAYLOAD_LIMIT,
+    ):
+        self.engine = db_engine
+        self.channel = channel
+        self.publish_interval = publish_interval_ms / 1000
+        self.payload_limit = payload_limit
+        self.origin = uuid.uuid4().hex
+        self._handlers: Dict[str, List[Handler]] = {}
+        self._reconnect_handlers: List[Callable[[], Awaitable[None]]] = []
+        self._outbox: List[str] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._publisher: Optional[asyncio.Task] = None
+        self._listener: Optional[asyncio.Task] = None
+        self._dispatch_tasks = set()
+
+        self.published = 0
+        self.notifies = 0
+        self.received = 0
+        self.dropped = 0
+        self.reconnects = 0
+
+    @property
+    def running(self) -> bool:
+        return self._publisher is not None
+
+    def subscribe(self, kind: str, handler: Handler):
+        self._handlers.setdefault(kind, []).append(handler)
+
+    def on_reconnect(self, handler: Callable[[], Awaitable[None]]):
+        # Notifications sent while the listener was down are lost, handlers resynchronise from the database
+        self._reconnect_handlers.append(handler)
+
+    def publish(self, kind: str, data: dict):
+        if not self.running:
+            return
+        if len(self._outbox) >= OUTBOX_CAPACITY:
+            self.dropped += 1
+            return
+        self._outbox.append(json.dumps([kind, data], default=_default, separators=(",", ":")))
+        self.published += 1
+        if len(self._outbox) == 1:
+            self._wakeup.set()
+
+    def _pack(self, messages: List[str]) -> List[str]:
+        prefix = f'{{"o":"{self.origin}","m":['
+        payloads = []
+        current: List[str] = []
+        size = len(prefix) + 2
+        for message in messages:
+            message_size = len(message.encode())
+            if size + message_size + 1 > self.payload_limit and current:
+                payloads.append(prefix + ",".join(current) + "]}")
+                current = []
+                size = len(prefix) + 2
+            if size + message_size > self.payload_limit:
+                logger.error(f"Dropping a {message_size}-byte pub/sub message above the NOTIFY size limit")
+                self.dropped += 1
+                continue
+            current.append(message)
+            size += message_size + 1
+        if current:
+            payloads.append(prefix + ",".join(current) + "]}")
+        return payloads
+
+    async def _send(self, payloads: List[str]):
+        async with self.engine.begin() as conn:
+            await conn.execute(
+                text("SELECT pg_notify(:channel, payload) FROM unnest(CAST(:payloads AS text[])) AS payload"),
+                {"channel": self.channel, "payloads": payloads},
+            )
+        self.notifies += len(payloads)
+
+    async def _publish_loop(self):
+        while True:
+            await self._wakeup.wait()
+            await asyncio.sleep(self.publish_interval)
+            self._wakeup.clear()
+            messages, self._outbox = self._outbox, []
+            if not messages:
+                continue
+            try:
+                await self._send(self._pack(messages))
+            except Exception as e:
+                logger.exception(f"Error occurred while publishing {len(messages)} pub/sub messages: {str(e)}")
+
+    def _on_notification(self, connection, pid, channel, payload):
+        try:
+            envelope = json.loads(payload)
+        except ValueError:
+            logger.error(f"Ignoring malformed notification on {channel}")
+            return
+        if envelope.get("o") == self.origin:
+            return
+        for kind, data in envelope.get("m", []):
+            self.received += 1
+            for handler in self._handlers.get(kind, []):
+                task = asyncio.create_task(self._dispatch(kind, handler, data))
+                self._dispatch_tasks.add(task)
+                task.add_done_callback(self._dispatch_tasks.discard)
+
+    async def _dispatch(self, kind: str, handler: Handler, data: dict):
+        try:
+            await handler(data)
+        except Exception as e:
+            logger.exception(f"Error occurred while handling pub/sub message {kind}: {str(e)}")
+
+    async def _listen_once(self, first: bool):
+        async with self.engine.connect() as conn:
+            raw = await conn.get_raw_connection()
+            driver = raw.driver_connection
+            terminated = asyncio.Event()
+            driver.add_termination_listener(lambda _: terminated.set())
+            await driver.add_listener(self.channel, self._on_notification)
+            logger.info(f"Listening for pub/sub messages on channel {self.channel}.")
+            if not first:
+                for handler in self._reconnect_handlers:
+                    await handler()
+            try:
+                while not terminated.is_set():
+                    try:
+                        await asyncio.wait_for(terminated.wait(), LISTEN_HEALTHCHECK_INTERVAL)
+                    except asyncio.TimeoutError:
+                        await asyncio.wait_for(driver.fetchval("SELECT 1"), LISTEN_HEALTHCHECK_INTERVAL)
+            finally:
+                if terminated.is_set() or driver.is_closed():
+                    await conn.invalidate()
+                else:
+                    await driver.remove_listener(self.channel, self._on_notification)
+
+    async def _listen_loop(self):
+        delay = RECONNECT_MIN_DELAY
+        first = True
+        while True:
+            try:
+                await self._listen_once(first)
+                delay = RECONNECT_MIN_DELAY
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Pub/sub listener connection lost, reconnecting in {delay}s: {str(e)}")
+            first = False
+            self.reconnects += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    async def start(self):
+        if self.running:
+            return
+        self._wakeup = asyncio.Event()
+        self._publisher = asyncio.create_task(self._publish_loop())
+        self._listener = asyncio.create_task(self._listen_loop())
+
+    async def stop(self):
+        if not self.running:
+            return
+        self._listener.cancel()
+        await asyncio.gather(self._listener, return_exceptions=True)
+        self._publisher.cancel()
+        await asyncio.gather(self._publisher, return_exceptions=True)
+        messages, self._outbox = self._outbox, []
+        if messages:
+            try:
+                await self._send(self._pack(messages))
+            except Exception as e:
+                logger.error(f"Dropped {len(messages)} pub/sub messages on shutdown: {str(e)}")
+        self._publisher = None
+        self._listener = None
+
+    def metrics(self) -> dict:
+        return {
+            "outbox": len(self._outbox),
+            "published": self.published,
+            "notifies": self.notifies,
+            "received": self.received,
+            "dropped": self.dropped,
+            "reconnects": self.reconnects,
+        }
+
+
+pubsub = PgPubSub()
@@ -0,0 +1,165 @@
+# app/utils/query_audit.py
+import asyncio
+import logging
+import re
+import time
+from typing import Dict, Optional, Set, Tuple
+
+from app.config import settings
+from app.database import engine
+
+logger = logging.getLogger(__name__)
+
+# A finding is logged again for the same route and statement shape at most this often,
+# the counters still see every occurrence
+REPORT_COOLDOWN = 300
+SHAPE_CACHE_SIZE = 4096
+MAX_LOGGED_STATEMENT = 2000
+EXPLAIN_TIMEOUT = 5.0
+QUERY_BUDGET_ATTRIBUTE = "query_budget"
+
+_PLACEHOLDER = re.compile(r"\$\d+")
+# "($, $::INTEGER, $)" as rendered for IN lists and multi-row VALUES
+_PLACEHOLDER_GROUP = re.compile(r"\(\s*\$[^,()]*(?:,\s*\$[^,()]*)*\)")
+_REPEATED_GROUP = re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+# DDL and utility statements have no plan
+_EXPLAINABLE = re.compile(r"\s*(SELECT|INSERT|UPDATE|DELETE|WITH|VALUES)\b", re.IGNORECASE)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(max_statements: int):
+    # Declares how many SQL statements one request to the decorated endpoint may run
+    def decorate(endpoint):
+        setattr(endpoint, QUERY_BUDGET_ATTRIBUTE, max_statements)
+        return endpoint
+    return decorate
+
+
+# Looks at the statements app/utils/metrics.py records per request: repeated statement shapes
+# (N+1), routes over their declared query budget and slow statements, whose plan is fetched
+# on a separate connection without holding up the request.
+class QueryAuditor:
+    def __init__(
+        self,
+        slow_query_ms: float = settings.slow_query_ms,
+        explain: bool = settings.slow_query_explain,
+        n_plus_one_threshold: int = settings.n_plus_one_threshold,
+        strict: bool = settings.query_budget_strict,
+    ):
+        self.slow_query_seconds = slow_query_ms / 1000
+        self.explain = explain
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.strict = strict
+        self._shapes: Dict[str, str] = {}
+        self._reported: Dict[Tuple[str, str, str], float] = {}
+        self._explaining: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+        self.slow_queries = 0
+        self.n_plus_one = 0
+        self.budget_exceeded = 0
+        self.explained = 0
+
+    def shape(self, statement: str) -> str:
+        # Statements differ only in their parameter values and the length of expanded IN lists
+        shape = self._shapes.get(statement)
+        if shape is None:
+            shape = _PLACEHOLDER.sub("$", statement)
+            shape = _REPEATED_GROUP.sub("(...)", _PLACEHOLDER_GROUP.sub("(...)", shape))
+            if len(self._shapes) >= SHAPE_CACHE_SIZE:
+                self._shapes.clear()
+            self._shapes[statement] = shape
+        return shape
+
+    def _should_report(self, kind: str, route: str, shape: str) -> bool:
+        now = time.monotonic()
+        key = (kind, route, shape)
+        if now - self._reported.get(key, float("-inf")) < REPORT_COOLDOWN:
+            return False
+        if len(self._reported) >= SHAPE_CACHE_SIZE:
+            self._reported = {k: at for k, at in self._reported.items() if now - at < REPORT_COOLDOWN}
+        self._reported[key] = now
+        return True
+
+    def slow_query(self, statement: str, parameters, elapsed: float, executemany: bool, route: str):
+        # Called from the cursor event, so only schedules work
+        self.slow_queries += 1
+        shape = self.shape(statement)
+        if not self._should_report("slow", route, shape):
+            return
+        logger.warning(f"Slow query ({elapsed * 1000:.1f} ms) in {route}: {shape[:MAX_LOGGED_STATEMENT]}")
+        if not self.explain or executemany or shape in self._explaining or not _EXPLAINABLE.match(statement):
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._explaining.add(shape)
+        task = loop.create_task(self._explain(statement, tuple(parameters or ()), shape, route))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _explain(self, statement: str, parameters: tuple, shape: str, route: str):
+        try:
+            # Plain EXPLAIN plans the statement without running it, so writes are safe to explain.
+            # It goes straight to the driver and is not recorded against any request.
+            async with engine.connect() as conn:
+                raw = await conn.get_raw_connection()
+                rows = await asyncio.wait_for(
+                    raw.driver_connection.fetch(f"EXPLAIN {statement}", *parameters), EXPLAIN_TIMEOUT
+                )
+            self.explained += 1
+            plan = "\n".join(row[0] for row in rows)
+            logger.warning(f"Plan of slow query in {route}: {shape[:MAX_LOGGED_STATEMENT]}\n{plan}")
+        except Exception as e:
+            logger.warning(f"Could not explain slow query in {route}: {str(e)}")
+        finally:
+            self._explaining.discard(shape)
+
+    def finish(self, route: str, endpoint, statements: Dict[str, int]):
+        total = sum(statements.values())
+        if total >= self.n_plus_one_threshold:
+            by_shape: Dict[str, int] = {}
+            for statement, count in statements.items():
+                shape = self.shape(statement)
+                by_shape[shape] = by_shape.get(shape, 0) + count
+            for shape, count in by_shape.items():
+                if count < self.n_plus_one_threshold:
+                    continue
+                self.n_plus_one += 1
+                if self._should_report("n+1", route, shape):
+                    logger.warning(
+                        f"Possible N+1 in {route}: the same statement ran {count} times: {shape[:MAX_LOGGED_STATEMENT]}"
+                    )
+
+        # Strict mode checks the budget before the response starts, see check_budget
+        if not self.strict:
+            self.check_budget(route, endpoint, total)
+
+    def check_budget(self, route: str, endpoint, total: int):
+        # In strict mode this runs when the response is about to start, so the request fails
+        # with a 500 instead of raising after the client already has its answer. Statements
+        # run while a response streams are not counted then.
+        budget: Optional[int] = getattr(endpoint, QUERY_BUDGET_ATTRIBUTE, None)
+        if budget is None or total <= budget:
+            return
+        self.budget_exceeded += 1
+        message = f"{route} ran {total} SQL statements, its query budget is {budget}"
+        if self.strict:
+            raise QueryBudgetExceeded(message)
+        if self._should_report("budget", route, ""):
+            logger.warning(message)
+
+    def metrics(self) -> dict:
+        return {
+            "slow_queries": self.slow_queries,
+            "n_plus_one": self.n_plus_one,
+            "budget_exceeded": self.budget_exceeded,
+            "explained": self.explained,
+        }
+
+
+query_auditor = QueryAuditor()
@@ -0,0 +1,98 @@
+# app/utils/rollups.py
+import math
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.sensor_reading import SensorReading
+from app.models.sensor_reading_rollup import SensorReadingRollup
+
+# Finest first, the series query takes the first one that fits the point budget
+RESOLUTIONS: Dict[str, timedelta] = {
+    "1m": timedelta(minutes=1),
+    "1h": timedelta(hours=1),
+    "1d": timedelta(days=1),
+}
+DEFAULT_MAX_POINTS = 1000
+
+
+def bucket_start(recorded_at: datetime, resolution: str) -> datetime:
+    if resolution == "1m":
+        return recorded_at.replace(second=0, microsecond=0)
+    if resolution == "1h":
+        return recorded_at.replace(minute=0, second=0, microsecond=0)
+    if resolution == "1d":
+        return recorded_at.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"Unknown rollup resolution: {resolution}")
+
+
+def choose_resolution(start: datetime, end: datetime, max_points: int) -> str:
+    for resolution, step in RESOLUTIONS.items():
+        if (end - start) / step <= max_points:
+            return resolution
+    return list(RESOLUTIONS)[-1]
+
+
+def aggregate_readings(sensor_readings: List[SensorReading]) -> List[dict]:
+    buckets: Dict[Tuple[str, int, str, datetime], List[float]] = {}
+    for reading in sensor_readings:
+        value_type = getattr(reading.value_type, "value", reading.value_type)
+        for resolution in RESOLUTIONS:
+            key = (resolution, reading.device_id, value_type, bucket_start(reading.recorded_at, resolution))
+            bucket = buckets.get(key)
+            if bucket is None:
+                buckets[key] = [1, reading.value, reading.value * reading.value, reading.value, reading.value]
+            else:
+                bucket[0] += 1
+                bucket[1] += reading.value
+                bucket[2] += reading.value * reading.value
+                bucket[3] = min(bucket[3], reading.value)
+                bucket[4] = max(bucket[4], reading.value)
+    # Sorted so concurrent flushes lock rollup rows in the same order
+    return [
+        {
+            "resolution": resolution,
+            "device_id": device_id,
+            "value_type": value_type,
+            "bucket_start": start,
+            "count": count,
+            "value_sum": value_sum,
+            "value_sum_sq": value_sum_sq,
+            "min_value": min_value,
+            "max_value": max_value,
+        }
+        for (resolution, device_id, value_type, start), (count, value_sum, value_sum_sq, min_value, max_value)
+        in sorted(buckets.items(), key=lambda item: item[0])
+    ]
+
+
+# Readings and their rollups commit in one transaction, a failed upsert cannot leave the rollups behind
+async def store_readings(db_session: AsyncSession, sensor_readings_data: List[dict]) -> List[SensorReading]:
+    if not sensor_readings_data:
+        return []
+    try:
+        sensor_readings = await SensorReading.bulk_create(db_session, sensor_readings_data, commit=False)
+        await SensorReadingRollup.upsert(db_session, aggregate_readings(sensor_readings))
+        await db_session.commit()
+        return sensor_readings
+    except Exception as e:
+        await db_session.rollback()
+        raise e
+
+
+def rollup_point(rollup: SensorReadingRollup) -> dict:
+    avg = rollup.value_sum / rollup.count
+    stddev = None
+    if rollup.count > 1:
+        # Sample standard deviation from the running sums, clamped against rounding below zero
+        variance = (rollup.value_sum_sq - rollup.value_sum * avg) / (rollup.count - 1)
+        stddev = math.sqrt(max(variance, 0.0))
+    return {
+        "value_type": rollup.value_type,
+        "bucket_start": rollup.bucket_start,
+        "count": rollup.count,
+        "avg": avg,
+        "min": rollup.min_value,
+        "max": rollup.max_value,
+        "stddev": stddev,
+    }
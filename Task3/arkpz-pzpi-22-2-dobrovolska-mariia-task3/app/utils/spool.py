@@ -0,0 +1,339 @@
+# app/utils/spool.py
+import asyncio
+import fcntl
+import json
+import logging
+import mmap
+import os
+import struct
+import uuid
+import zlib
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+from sqlalchemy import select
+from app.database import AsyncSessionLocal
+from app.models.device import Device
+from app.utils.rollups import store_readings
+
+logger = logging.getLogger(__name__)
+
+SPOOL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "spool")
+SEGMENT_MAX_BYTES = 16 * 1024 * 1024
+FSYNC_POLICY = "interval"  # "always" | "interval" | "never"
+FSYNC_INTERVAL = 0.2
+REPLAY_BATCH_SIZE = 500
+
+SEGMENT_PREFIX = "readings-"
+SEGMENT_SUFFIX = ".log"
+WORKER_PREFIX = "worker-"
+LOCK_NAME = "owner.lock"
+LEGACY_LOCK_NAME = "replay.lock"
+
+# Every record is [payload length][crc32 of payload][json payload]
+RECORD_HEADER = struct.Struct("<II")
+
+
+def _encode(sensor_reading_data: dict) -> bytes:
+    data = dict(sensor_reading_data)
+    if isinstance(data.get("recorded_at"), datetime):
+        data["recorded_at"] = data["recorded_at"].isoformat()
+    payload = json.dumps(data, separators=(",", ":")).encode()
+    return RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def _decode(payload: bytes) -> dict:
+    data = json.loads(payload)
+    if data.get("recorded_at"):
+        data["recorded_at"] = datetime.fromisoformat(data["recorded_at"])
+    return data
+
+
+def _segment_name(seq: int) -> str:
+    return f"{SEGMENT_PREFIX}{seq:010d}{SEGMENT_SUFFIX}"
+
+
+def read_segment(path: str) -> Iterator[dict]:
+    if os.path.getsize(path) == 0:
+        return
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        offset = 0
+        size = len(mm)
+        while offset + RECORD_HEADER.size <= size:
+            length, crc = RECORD_HEADER.unpack_from(mm, offset)
+            start = offset + RECORD_HEADER.size
+            payload = mm[start:start + length]
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                # Torn write at the tail of a segment after a crash, nothing valid follows it
+                logger.warning(f"Truncated record in spool segment {path} at offset {offset}")
+                return
+            yield _decode(payload)
+            offset = start + length
+
+
+def _fsync_and_close(fds: List[int]):
+    try:
+        for fd in fds:
+            os.fsync(fd)
+    finally:
+        for fd in fds:
+            os.close(fd)
+
+
+def _try_lock(path: str, create: bool = False) -> Optional[int]:
+    # An exclusive flock held for as long as its owner runs, the kernel drops it when the process dies
+    try:
+        fd = os.open(path, (os.O_RDWR | os.O_CREAT) if create else os.O_RDWR, 0o644)
+    except FileNotFoundError:
+        return None
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return None
+    return fd
+
+
+# Append-only on-disk log of accepted readings. A reading is written here before it is
+# acknowledged and the segment is removed once every reading in it is committed to the database.
+# Every process appends to a directory of its own under `directory`, locked for its lifetime;
+# replay only takes directories whose lock is free, i.e. whose process is gone.
+class ReadingSpool:
+    def __init__(
+        self,
+        directory: str = SPOOL_DIR,
+        segment_max_bytes: int = SEGMENT_MAX_BYTES,
+        fsync_policy: str = FSYNC_POLICY,
+        fsync_interval: float = FSYNC_INTERVAL,
+    ):
+        if fsync_policy not in ("always", "interval", "never"):
+            raise ValueError(f"Unknown spool fsync policy: {fsync_policy}")
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+
+        self._worker_directory: Optional[str] = None
+        self._lock_fd: Optional[int] = None
+        self._file = None
+        self._seq = 0
+        self._size = 0
+        self._appended: Dict[int, int] = {}
+        self._released: Dict[int, int] = {}
+
+        # Bytes appended and bytes known to be on disk, across segments
+        self._written = 0
+        self._durable = 0
+        # Descriptors of rolled segments and directories still waiting for their fsync
+        self._unsynced_fds: List[int] = []
+        self._fsync_task: Optional[asyncio.Task] = None
+        self._timer_task: Optional[asyncio.Task] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._file is not None
+
+    def _segments(self, directory: str) -> List[int]:
+        if not os.path.isdir(directory):
+            return []
+        seqs = []
+        for name in os.listdir(directory):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                seqs.append(int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+        return sorted(seqs)
+
+    def _worker_directories(self) -> List[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            os.path.join(self.directory, name) for name in os.listdir(self.directory)
+            if name.startswith(WORKER_PREFIX) and os.path.isdir(os.path.join(self.directory, name))
+        )
+
+    def _path(self, seq: int, directory: Optional[str] = None) -> str:
+        return os.path.join(directory or self._worker_directory, _segment_name(seq))
+
+    def open(self):
+        if self.is_open:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        while True:
+            directory = os.path.join(self.directory, f"{WORKER_PREFIX}{os.getpid()}-{uuid.uuid4().hex[:8]}")
+            os.makedirs(directory)
+            self._lock_fd = _try_lock(os.path.join(directory, LOCK_NAME), create=True)
+            if self._lock_fd is not None:
+                break
+            # A replayer got to the lock of the new, empty directory first
+            logger.warning(f"Spool directory {directory} was taken over, creating another one")
+        self._worker_directory = directory
+        self._written = self._durable = 0
+        self._open_segment(1)
+        if self.fsync_policy == "interval":
+            self._timer_task = asyncio.create_task(self._sync_periodically())
+
+    def _open_segment(self, seq: int):
+        self._seq = seq
+        self._size = 0
+        self._file = open(self._path(seq), "ab")
+        self._appended[seq] = 0
+        self._released[seq] = 0
+        if self.fsync_policy != "never":
+            # The new directory entry has to reach the disk too, with the next fsync
+            self._unsynced_fds.append(os.open(self._worker_directory, os.O_RDONLY))
+
+    def append(self, sensor_reading_data: dict) -> int:
+        if not self.is_open:
+            raise RuntimeError("Reading spool is not open")
+        if self._size >= self.segment_max_bytes:
+            self._roll()
+        record = _encode(sensor_reading_data)
+        self._file.write(record)
+        # In the page cache right away, survives a crash of the process but not of the machine
+        self._file.flush()
+        self._size += len(record)
+        self._written += len(record)
+        self._appended[self._seq] += 1
+        if self.fsync_policy == "never":
+            self._durable = self._written
+        return self._seq
+
+    async def wait_durable(self):
+        # Returns once appended readings are as durable as the fsync policy promises before acknowledging
+        if self.fsync_policy == "always":
+            await self.sync()
+
+    async def sync(self):
+        # Concurrent callers share one fsync, which runs off the event loop
+        target = self._written
+        while self._durable < target:
+            if self._fsync_task is None:
+                self._fsync_task = asyncio.create_task(self._fsync())
+            await asyncio.shield(self._fsync_task)
+
+    async def _fsync(self):
+        try:
+            written = self._written
+            # Duplicated so the segment can be rolled or closed while the fsync runs
+            fds, self._unsynced_fds = self._unsynced_fds, []
+            if self.is_open:
+                fds.append(os.dup(self._file.fileno()))
+            await asyncio.to_thread(_fsync_and_close, fds)
+            self._durable = max(self._durable, written)
+        finally:
+            self._fsync_task = None
+
+    async def _sync_periodically(self):
+        # Also covers an idle tail, appends alone would leave the last readings unsynced
+        while True:
+            await asyncio.sleep(self.fsync_interval)
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.exception(f"Failed to fsync the reading spool: {str(e)}")
+
+    def release(self, seqs: List[int]):
+        for seq, count in Counter(seqs).items():
+            if seq not in self._released:
+                continue
+            self._released[seq] += count
+            if seq == self._seq:
+                # Keep the active segment small once it is fully committed
+                if self._released[seq] == self._appended[seq] and self._size > 0:
+                    self._roll()
+            elif self._released[seq] >= self._appended[seq]:
+                self._remove(seq)
+
+    def _roll(self):
+        previous = self._seq
+        if self.fsync_policy != "never" and self._released[previous] < self._appended[previous]:
+            self._unsynced_fds.append(os.dup(self._file.fileno()))
+        self._file.close()
+        self._open_segment(previous + 1)
+        if self._released[previous] >= self._appended[previous]:
+            self._remove(previous)
+
+    def _remove(self, seq: int):
+        try:
+            os.remove(self._path(seq))
+        except FileNotFoundError:
+            pass
+        self._appended.pop(seq, None)
+        self._released.pop(seq, None)
+
+    async def close(self):
+        if not self.is_open:
+            return
+        if self._timer_task is not None:
+            self._timer_task.cancel()
+            self._timer_task = None
+        await self.sync()
+        self._file.close()
+        self._file = None
+        if self._released[self._seq] >= self._appended[self._seq]:
+            self._remove(self._seq)
+        if not self._segments(self._worker_directory):
+            # Nothing left to replay, the directory goes away with its lock
+            os.remove(os.path.join(self._worker_directory, LOCK_NAME))
+            os.rmdir(self._worker_directory)
+        os.close(self._lock_fd)
+        self._lock_fd = None
+        self._worker_directory = None
+
+    def pending_segments(self) -> int:
+        return sum(len(self._segments(directory)) for directory in [self.directory] + self._worker_directories())
+
+    async def replay(self) -> int:
+        replayed = 0
+        # Segments in the spool root were written before spools were kept per process
+        directories = [(self.directory, LEGACY_LOCK_NAME)] + [
+            (directory, LOCK_NAME) for directory in self._worker_directories() if directory != self._worker_directory
+        ]
+        for directory, lock_name in directories:
+            lock_fd = _try_lock(os.path.join(directory, lock_name), create=directory == self.directory)
+            if lock_fd is None:
+                # Its process is still running, or another one is replaying it
+                continue
+            try:
+                replayed += await self._replay_directory(directory)
+                if directory != self.directory:
+                    os.remove(os.path.join(directory, lock_name))
+                    os.rmdir(directory)
+            except FileNotFoundError:
+                # Replayed and removed by another process between listing and locking
+                pass
+            finally:
+                os.close(lock_fd)
+        return replayed
+
+    async def _replay_directory(self, directory: str) -> int:
+        replayed = 0
+        for seq in self._segments(directory):
+            path = self._path(seq, directory)
+            batch = []
+            for sensor_reading_data in read_segment(path):
+                batch.append(sensor_reading_data)
+                if len(batch) >= REPLAY_BATCH_SIZE:
+                    replayed += await self._replay_batch(batch)
+                    batch = []
+            if batch:
+                replayed += await self._replay_batch(batch)
+            os.remove(path)
+            logger.info(f"Replayed spool segment {path}")
+        return replayed
+
+    async def _replay_batch(self, batch: List[dict]) -> int:
+        async with AsyncSessionLocal() as db:
+            # Devices may have been deleted since the readings were spooled
+            device_ids = {row["device_id"] for row in batch}
+            result = await db.execute(select(Device.device_id).where(Device.device_id.in_(device_ids)))
+            known_device_ids = set(result.scalars().all())
+            rows = [row for row in batch if row["device_id"] in known_device_ids]
+            if len(rows) < len(batch):
+                logger.warning(f"Skipping {len(batch) - len(rows)} spooled readings of unknown devices")
+            # Alerts for stale readings are not raised on replay, but history has to stay complete
+            await store_readings(db, rows)
+        return len(rows)
+
+
+reading_spool = ReadingSpool()
@@ -1,9 +1,100 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
 from passlib.context import CryptContext
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Raising the cost factor is picked up by existing users at their next login, see verify_and_update_password
+BCRYPT_ROUNDS = 12
+# bcrypt releases the GIL, so worker threads hash in parallel without blocking the event loop
+HASH_WORKERS = min(4, os.cpu_count() or 1)
+# Requests waiting for a worker beyond this are refused rather than queueing behind a login storm
+HASH_QUEUE_LIMIT = 64
+# Niceness of the hashing threads (Linux), request handling keeps the CPU when cores are scarce
+HASH_THREAD_NICENESS = 10
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+def _lower_thread_priority():
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), HASH_THREAD_NICENESS)
+    except (AttributeError, OSError):
+        pass
+
+
+# Runs bcrypt on a small thread pool. At most workers + queue_limit operations are in
+# flight, so a burst of logins costs bounded CPU and memory instead of stalling every request.
+class PasswordHasher:
+    def __init__(self, context: CryptContext = pwd_context, workers: int = HASH_WORKERS,
+                 queue_limit: int = HASH_QUEUE_LIMIT):
+        self.context = context
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._in_flight = 0
+
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+
+    async def _run(self, func, *args):
+        if self._in_flight >= self.workers + self.queue_limit:
+            self.rejected += 1
+            raise PasswordHasherBusy()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="password-hasher", initializer=_lower_thread_priority
+            )
+        self._in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self._in_flight -= 1
+            self.completed += 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        # The new hash is set when the stored one was made with outdated parameters
+        verified, new_hash = await self._run(self.context.verify_and_update, password, hashed_password)
+        if new_hash is not None:
+            self.rehashed += 1
+        return verified, new_hash
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def metrics(self) -> dict:
+        return {
+            "workers": self.workers,
+            "in_flight": self._in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "rehashed": self.rehashed,
+        }
+
+
+password_hasher = PasswordHasher()
+
+
+async def hash_password(password: str) -> str:
+    return await password_hasher.hash(password)
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    verified, _ = await password_hasher.verify_and_update(plain_password, hashed_password)
+    return verified
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
\ No newline at end of file
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return await password_hasher.verify_and_update(plain_password, hashed_password)
@@ -0,0 +1,284 @@
+# benchmarks/fleet_load.py
+# Simulates a fleet of incubators: creates the incubators and their sensors through the API,
+# then drives temperature/humidity readings at a configurable rate and jitter, mixed with
+# dashboard reads and logins, and reports throughput, latency percentiles and errors per
+# operation. Against a running server:
+#
+#   python benchmarks/fleet_load.py --base-url http://localhost:8000 --register \
+#       --email fleet@example.com --password secret123 --incubators 20 --devices-per-incubator 4
+#
+# or in process through the ASGI app, using DATABASE_URL and the other settings of app/config.py:
+#
+#   DATABASE_URL=postgresql+asyncpg://postgres@localhost/loadtest python benchmarks/fleet_load.py --in-process ...
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import httpx
+
+REGISTER_PATH = "/users/users/"
+LOGIN_PATH = "/users/users/login"
+INCUBATOR_PATH = "/incubators/incubators/with-user/{user_id}"
+DEVICE_PATH = "/devices/devices/"
+API_KEY_PATH = "/devices/devices/{device_id}/api-key"
+INGEST_PATH = "/sensor-readings/sensor_readings/"
+
+TARGET_TEMPERATURE = 37.7
+TARGET_HUMIDITY = 55.0
+# Sensors wander around the target: noise per reading and how strongly they are pulled back
+NOISE = {"temperature": 0.05, "humidity": 0.3}
+MEAN_REVERSION = 0.1
+# Share of readings that are far off target, to exercise the alert path
+EXCURSION_SHARE = 0.002
+EXCURSION = {"temperature": 3.0, "humidity": 15.0}
+
+
+def percentile(samples, share):
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, operation, scheduled, outcome):
+        # Latency counts from when the request was due, a stalled server cannot hide behind
+        # requests that were held back meanwhile
+        self.latencies.setdefault(operation, []).append((time.perf_counter() - scheduled) * 1000)
+        if outcome is not None:
+            errors = self.errors.setdefault(operation, {})
+            errors[outcome] = errors.get(outcome, 0) + 1
+
+    def summary(self, duration):
+        result = {}
+        for operation, latencies in sorted(self.latencies.items()):
+            errors = self.errors.get(operation, {})
+            result[operation] = {
+                "requests": len(latencies),
+                "throughput": round(len(latencies) / duration, 2),
+                "error_rate": round(sum(errors.values()) / len(latencies), 4),
+                "errors": {str(outcome): count for outcome, count in errors.items()},
+                "p50_ms": round(percentile(latencies, 0.50), 2),
+                "p95_ms": round(percentile(latencies, 0.95), 2),
+                "p99_ms": round(percentile(latencies, 0.99), 2),
+                "max_ms": round(max(latencies), 2),
+            }
+        return result
+
+
+async def timed(stats, operation, scheduled, request, accept=()):
+    try:
+        response = await request
+        failed = response.status_code >= 400 and response.status_code not in accept
+        outcome = response.status_code if failed else None
+    except httpx.HTTPError as e:
+        outcome = type(e).__name__
+    stats.record(operation, scheduled, outcome)
+
+
+async def open_loop(rate, jitter, duration, fire):
+    # Requests go out on schedule whether or not earlier ones have completed
+    if rate <= 0:
+        return
+    tasks = []
+    started = time.perf_counter()
+    # Sensors do not start in lockstep
+    scheduled = started + random.uniform(0, 1 / rate)
+    while scheduled < started + duration:
+        await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+        tasks.append(asyncio.create_task(fire(scheduled)))
+        scheduled += (1 / rate) * random.uniform(1 - jitter, 1 + jitter)
+    await asyncio.gather(*tasks)
+
+
+class Sensor:
+    def __init__(self, device_id, incubator_id, value_type, api_secret=None):
+        self.device_id = device_id
+        self.incubator_id = incubator_id
+        self.value_type = value_type
+        self.api_secret = api_secret
+        self.target = TARGET_TEMPERATURE if value_type == "temperature" else TARGET_HUMIDITY
+        self.value = self.target
+
+    def next_reading(self):
+        self.value += (self.target - self.value) * MEAN_REVERSION + random.gauss(0, NOISE[self.value_type])
+        value = self.value
+        if random.random() < EXCURSION_SHARE:
+            value += random.choice((-1, 1)) * EXCURSION[self.value_type]
+        return {"device_id": self.device_id, "value_type": self.value_type, "value": round(value, 3)}
+
+
+def signed_request(sensor, reading):
+    from app.utils.device_auth import sign_request
+
+    body = json.dumps(reading).encode()
+    timestamp, nonce = int(time.time()), uuid.uuid4().hex
+    return body, {
+        "Content-Type": "application/json",
+        "X-Device-Id": str(sensor.device_id),
+        "X-Timestamp": str(timestamp),
+        "X-Nonce": nonce,
+        "X-Signature": sign_request(sensor.api_secret, sensor.device_id, timestamp, nonce, body),
+    }
+
+
+async def create_fleet(client, args, headers, user_id):
+    sensors = []
+    for number in range(args.incubators):
+        response = await client.post(INCUBATOR_PATH.format(user_id=user_id), json={
+            "incubator_name": f"load-{number}", "capacity": 60, "status": "active",
+            "filled_at": datetime.utcnow().date().isoformat(),
+            "target_temperature": TARGET_TEMPERATURE, "target_humidity": TARGET_HUMIDITY,
+        })
+        response.raise_for_status()
+        incubator_id = response.json()["incubator_id"]
+        for index in range(args.devices_per_incubator):
+            value_type = "temperature" if index % 2 == 0 else "humidity"
+            response = await client.post(DEVICE_PATH, json={
+                "device_type": f"{value_type}-sensor", "incubator_id": incubator_id,
+                "report_interval": max(1, round(1 / args.reading_rate)),
+            })
+            response.raise_for_status()
+            device_id = response.json()["device_id"]
+            api_secret = None
+            if args.signed:
+                response = await client.post(API_KEY_PATH.format(device_id=device_id), headers=headers)
+                response.raise_for_status()
+                api_secret = response.json()["api_secret"]
+            sensors.append(Sensor(device_id, incubator_id, value_type, api_secret))
+    return sensors
+
+
+async def run(client, args):
+    user_id = args.user_id
+    if args.register:
+        response = await client.post(REGISTER_PATH, json={
+            "username": "fleet-load", "email": args.email, "password": args.password, "role": "admin",
+        })
+        response.raise_for_status()
+        user_id = response.json()["user_id"]
+    if user_id is None:
+        sys.exit("--user-id is required unless --register creates the user")
+    response = await client.post(LOGIN_PATH, json={"email": args.email, "password": args.password})
+    response.raise_for_status()
+    headers = {"Authorization": f"Bearer {response.json()}"}
+
+    sensors = await create_fleet(client, args, headers, user_id)
+    incubator_ids = sorted({sensor.incubator_id for sensor in sensors})
+    print(f"fleet      {len(incubator_ids)} incubators, {len(sensors)} sensors, "
+          f"{len(sensors) * args.reading_rate:.1f} readings/s expected")
+
+    stats = Stats()
+
+    def reading_sender(sensor):
+        async def fire(scheduled):
+            reading = sensor.next_reading()
+            if sensor.api_secret:
+                body, signed_headers = signed_request(sensor, reading)
+                request = client.post(INGEST_PATH, content=body, headers=signed_headers)
+            else:
+                request = client.post(INGEST_PATH, json=reading, headers=headers)
+            await timed(stats, "reading", scheduled, request)
+        return fire
+
+    async def dashboard(scheduled):
+        view = random.random()
+        if view < 0.4:
+            ids = ",".join(map(str, random.sample(incubator_ids, min(10, len(incubator_ids)))))
+            await timed(stats, "dashboard_overview", scheduled, client.get(
+                "/incubators/incubators/current", params={"ids": ids}, headers=headers))
+        elif view < 0.7:
+            # 404 until the incubator has readings
+            await timed(stats, "dashboard_incubator", scheduled, client.get(
+                f"/incubators/incubators/{random.choice(incubator_ids)}/current", headers=headers), accept=(404,))
+        elif view < 0.9:
+            sensor = random.choice(sensors)
+            since = (datetime.utcnow() - timedelta(hours=1)).isoformat()
+            await timed(stats, "dashboard_series", scheduled, client.get(
+                f"/sensor-readings/sensor_readings/device/{sensor.device_id}/series",
+                params={"from": since, "max_points": 200}, headers=headers))
+        else:
+            # 404 while there are no alerts
+            await timed(stats, "dashboard_alerts", scheduled, client.get(
+                "/alerts/alerts/", params={"limit": 50}, headers=headers), accept=(404,))
+
+    async def login(scheduled):
+        await timed(stats, "login", scheduled, client.post(
+            LOGIN_PATH, json={"email": args.email, "password": args.password}))
+
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(open_loop(args.reading_rate, args.jitter, args.duration, reading_sender(sensor)) for sensor in sensors),
+        open_loop(args.dashboard_rate, args.jitter, args.duration, dashboard),
+        open_loop(args.login_rate, args.jitter, args.duration, login),
+    )
+    return stats.summary(time.perf_counter() - started)
+
+
+def report(summary):
+    for operation, result in summary.items():
+        print(
+            f"{operation:<20} requests={result['requests']:<7} {result['throughput']:8.1f}/s "
+            f"errors={result['error_rate']:.2%} p50={result['p50_ms']:7.1f}ms p95={result['p95_ms']:7.1f}ms "
+            f"p99={result['p99_ms']:7.1f}ms max={result['max_ms']:7.1f}ms"
+        )
+        if result["errors"]:
+            print(f"{'':<20} {result['errors']}")
+
+
+async def main(args):
+    random.seed(args.seed)
+    expected = args.incubators * args.devices_per_incubator * args.reading_rate + args.dashboard_rate
+    limits = httpx.Limits(max_connections=max(100, int(expected)))
+    if args.in_process or args.signed:
+        # The app package is imported for the ASGI app and for sign_request
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    if args.in_process:
+        from app.main import app, startup, shutdown
+
+        await startup()
+        try:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://fleet", timeout=30) as client:
+                summary = await run(client, args)
+        finally:
+            await shutdown()
+    else:
+        async with httpx.AsyncClient(base_url=args.base_url, timeout=30, limits=limits) as client:
+            summary = await run(client, args)
+
+    report(summary)
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump({"args": vars(args), "results": summary}, output, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load an incubator fleet onto the API")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--in-process", action="store_true", help="drive the ASGI app directly instead of --base-url")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--register", action="store_true", help="create the user (as admin) first")
+    parser.add_argument("--user-id", type=int, help="owner of the created incubators when not registering")
+    parser.add_argument("--incubators", type=int, default=10)
+    parser.add_argument("--devices-per-incubator", type=int, default=2)
+    parser.add_argument("--reading-rate", type=float, default=1.0, help="readings per second per sensor")
+    parser.add_argument("--jitter", type=float, default=0.2, help="relative spread of the intervals, 0-1")
+    parser.add_argument("--dashboard-rate", type=float, default=5.0, help="dashboard reads per second")
+    parser.add_argument("--login-rate", type=float, default=0.5, help="logins per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds")
+    parser.add_argument("--signed", action="store_true", help="sensors sign readings with their own API keys")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="also write the results to this file")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,115 @@
+# benchmarks/login_storm.py
+# Measures sensor ingestion latency against a running server, first on its own and then
+# while a burst of concurrent logins hashes passwords. With hashing off the event loop the
+# ingestion p99 of both phases should stay close.
+#
+#   python benchmarks/login_storm.py --base-url http://localhost:8000 \
+#       --email storm@example.com --password secret123 --device-id 1
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+INGEST_PATH = "/sensor-readings/sensor_readings/"
+LOGIN_PATH = "/users/users/login"
+REGISTER_PATH = "/users/users/"
+
+
+def percentile(samples, share):
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+async def send_reading(client, device_id, headers, scheduled, latencies, errors):
+    try:
+        response = await client.post(INGEST_PATH, headers=headers, json={
+            "device_id": device_id, "value_type": "temperature", "value": 37.7,
+        })
+        if response.status_code >= 400:
+            errors.append(response.status_code)
+    except httpx.HTTPError as e:
+        errors.append(type(e).__name__)
+    # Measured from when the request was due, so a stalled server cannot hide its stalls
+    # by delaying the requests that should have been sent meanwhile
+    latencies.append((time.perf_counter() - scheduled) * 1000)
+
+
+async def ingest(client, device_id, headers, rate, duration, latencies, errors):
+    # Open loop: readings are sent on schedule whether or not earlier ones have completed
+    interval = 1 / rate
+    started = time.perf_counter()
+    requests = []
+    for i in range(int(rate * duration)):
+        scheduled = started + i * interval
+        await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+        requests.append(asyncio.create_task(send_reading(client, device_id, headers, scheduled, latencies, errors)))
+    await asyncio.gather(*requests)
+
+
+async def login_storm(client, email, password, concurrency, duration, outcomes):
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            try:
+                response = await client.post(LOGIN_PATH, json={"email": email, "password": password})
+                outcomes.append(response.status_code)
+            except httpx.HTTPError as e:
+                outcomes.append(type(e).__name__)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+def report(name, latencies, errors):
+    print(
+        f"{name:<10} requests={len(latencies):<6} errors={len(errors):<4} "
+        f"p50={percentile(latencies, 0.50):7.1f}ms p95={percentile(latencies, 0.95):7.1f}ms "
+        f"p99={percentile(latencies, 0.99):7.1f}ms max={max(latencies, default=float('nan')):7.1f}ms"
+    )
+
+
+async def main(args):
+    limits = httpx.Limits(max_connections=args.login_concurrency + int(args.ingest_rate) * 2)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=30, limits=limits) as client:
+        if args.register:
+            await client.post(REGISTER_PATH, json={
+                "username": "storm", "email": args.email, "password": args.password, "role": "user",
+            })
+        # Ingestion requires authentication, the storm user's own token is used for it
+        response = await client.post(LOGIN_PATH, json={"email": args.email, "password": args.password})
+        response.raise_for_status()
+        headers = {"Authorization": f"Bearer {response.json()}"}
+
+        baseline, baseline_errors = [], []
+        await ingest(client, args.device_id, headers, args.ingest_rate, args.duration, baseline, baseline_errors)
+
+        storm, storm_errors, logins = [], [], []
+        await asyncio.gather(
+            ingest(client, args.device_id, headers, args.ingest_rate, args.duration, storm, storm_errors),
+            login_storm(client, args.email, args.password, args.login_concurrency, args.duration, logins),
+        )
+
+    report("baseline", baseline, baseline_errors)
+    report("storm", storm, storm_errors)
+    statuses = {status: logins.count(status) for status in set(logins)}
+    print(f"logins     completed={len(logins)} ({len(logins) / args.duration:.1f}/s) statuses={statuses}")
+    if baseline and storm:
+        print(f"p99 ratio  {percentile(storm, 0.99) / percentile(baseline, 0.99):.2f}x, "
+              f"mean {statistics.mean(storm):.1f}ms vs {statistics.mean(baseline):.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingestion latency during a login storm")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--device-id", type=int, required=True)
+    parser.add_argument("--register", action="store_true", help="create the login user first")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per phase")
+    parser.add_argument("--ingest-rate", type=float, default=50.0, help="sensor readings per second")
+    parser.add_argument("--login-concurrency", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
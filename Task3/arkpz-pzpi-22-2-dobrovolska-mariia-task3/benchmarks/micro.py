@@ -0,0 +1,280 @@
+# benchmarks/micro.py
+# Micro-benchmarks for the code every request goes through: schema validation, ORM to schema
+# conversion, response serialization, token and device signature checks. Each result is compared
+# with a stored baseline and changes beyond --threshold are reported as regressions (exit code 1).
+#
+#   python benchmarks/micro.py                  # compare with benchmarks/baselines/micro.json
+#   python benchmarks/micro.py --save           # store this run as the new baseline
+#   python benchmarks/micro.py --database-url postgresql+asyncpg://postgres@localhost/bench
+#
+# The database benchmarks only run with --database-url and write to that database, so point it
+# at a scratch one. The schema needs Postgres (partitioned readings table, INCLUDE/BRIN indexes,
+# ON CONFLICT upserts), SQLite cannot host it.
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baselines", "micro.json")
+LIST_ROWS = 10000
+ORM_ROWS = 1000
+
+BENCHMARKS = []
+
+
+def benchmark(name, needs_db=False):
+    # The decorated factory prepares its data and returns the function to time, sync or async
+    def register(factory):
+        BENCHMARKS.append((name, factory, needs_db))
+        return factory
+    return register
+
+
+def reading_rows(count):
+    from app.models.sensor_reading import SensorReading, ValueType
+
+    started = datetime(2026, 1, 1)
+    return [
+        SensorReading(
+            reading_id=index, device_id=1 + index % 10, value_type=ValueType.temperature,
+            value=37.5 + (index % 7) / 10, recorded_at=started + timedelta(seconds=index),
+        )
+        for index in range(count)
+    ]
+
+
+@benchmark("schema.sensor_reading_create")
+async def bench_sensor_reading_create_schema(context):
+    from app.schemas.sensor_reading import SensorReadingCreate
+
+    payload = {"device_id": 1, "value_type": "temperature", "value": 37.7, "recorded_at": "2026-01-01T12:00:00+02:00"}
+    return lambda: SensorReadingCreate.parse_obj(payload)
+
+
+@benchmark("api.convert_to_naive")
+async def bench_convert_to_naive(context):
+    from app.api.sensor_reading import convert_to_naive
+
+    moment = datetime(2026, 1, 1, 12, tzinfo=timezone.utc)
+    return lambda: convert_to_naive(moment)
+
+
+@benchmark("auth.verify_access_token.cached")
+async def bench_verify_token_cached(context):
+    from app.utils.auth import create_access_token, verify_access_token
+
+    token = create_access_token({"sub": "bench@example.com", "role": "user"})
+    return lambda: verify_access_token(token)
+
+
+@benchmark("auth.verify_access_token.uncached")
+async def bench_verify_token_uncached(context):
+    from app.utils.auth import TokenVerifier, create_access_token
+
+    # A cache of size 0 evicts every entry right away, so each call decodes the token
+    verifier = TokenVerifier(max_size=0)
+    token = create_access_token({"sub": "bench@example.com", "role": "user"})
+    return lambda: verifier.verify(token)
+
+
+@benchmark("device_auth.verify_signature")
+async def bench_verify_signature(context):
+    from app.utils.device_auth import DeviceKeyCache, generate_api_secret, sign_request
+
+    keys = DeviceKeyCache()
+    api_secret = generate_api_secret()
+    keys.set(1, api_secret)
+    body = json.dumps({"device_id": 1, "value_type": "temperature", "value": 37.7}).encode()
+    timestamp = int(time.time())
+    # Signed up front, only the server side is timed; every request needs a fresh nonce
+    requests = iter([
+        {"X-Device-Id": "1", "X-Timestamp": str(timestamp), "X-Nonce": nonce,
+         "X-Signature": sign_request(api_secret, 1, timestamp, nonce, body)}
+        for nonce in (uuid.uuid4().hex for _ in range(200000))
+    ])
+    return lambda: keys.verify(next(requests), body)
+
+
+@benchmark(f"orm.from_orm_{ORM_ROWS}")
+async def bench_from_orm(context):
+    from app.schemas.sensor_reading import SensorReadingInDB
+
+    # The conversion a reading list response does for every row
+    rows = reading_rows(ORM_ROWS)
+    return lambda: [SensorReadingInDB.from_orm(reading) for reading in rows]
+
+
+@benchmark(f"api.serialize_list_{LIST_ROWS}")
+async def bench_serialize_list(context):
+    from typing import List
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+    from fastapi.utils import create_response_field
+    from app.schemas.sensor_reading import SensorReadingInDB
+
+    # What FastAPI does with the return value of a List[SensorReadingInDB] endpoint
+    field = create_response_field(name="Response_list", type_=List[SensorReadingInDB])
+    rows = [SensorReadingInDB.from_orm(reading) for reading in reading_rows(LIST_ROWS)]
+
+    async def serialize():
+        content = await serialize_response(field=field, response_content=rows, is_coroutine=True)
+        return JSONResponse(content).body
+    return serialize
+
+
+@benchmark("db.sensor_reading_create", needs_db=True)
+async def bench_sensor_reading_create(context):
+    from app.models.sensor_reading import SensorReading
+
+    db, device_id = context["db"], context["device_id"]
+
+    async def create():
+        await SensorReading.create(db, {"device_id": device_id, "value_type": "temperature", "value": 37.7})
+    return create
+
+
+async def prepare_database(context):
+    from sqlalchemy import delete
+    from app.database import AsyncSessionLocal, Base, engine
+    from app.models.device import Device
+    from app.models.incubator import Incubator
+    from app.utils.partitions import ensure_partitions
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await ensure_partitions(conn)
+    db = AsyncSessionLocal()
+    incubator = await Incubator.create(db, {
+        "incubator_name": "micro-benchmark", "capacity": 1, "status": "active", "filled_at": None,
+        "target_temperature": 37.7, "target_humidity": 55.0,
+    })
+    device = await Device.create(db, {"device_type": "temperature-sensor", "incubator_id": incubator.incubator_id})
+    context.update(db=db, device_id=device.device_id)
+
+    async def cleanup():
+        from app.models.sensor_reading import SensorReading
+
+        await db.execute(delete(SensorReading).where(SensorReading.device_id == device.device_id))
+        await db.execute(delete(Device).where(Device.device_id == device.device_id))
+        await db.execute(delete(Incubator).where(Incubator.incubator_id == incubator.incubator_id))
+        await db.commit()
+        await db.close()
+        await engine.dispose()
+    return cleanup
+
+
+async def run_batch(function, is_async, number):
+    started = time.perf_counter()
+    if is_async:
+        for _ in range(number):
+            await function()
+    else:
+        for _ in range(number):
+            function()
+    return time.perf_counter() - started
+
+
+async def measure(function, min_time, rounds):
+    is_async = asyncio.iscoroutinefunction(function)
+    # Grow the batch until one takes long enough to time reliably, then size it to min_time
+    number = 1
+    while True:
+        elapsed = await run_batch(function, is_async, number)
+        if elapsed >= min_time / 10 or number >= 1000000:
+            break
+        number *= 10
+    number = max(1, int(number * min_time / max(elapsed, 1e-9)))
+    per_call = [await run_batch(function, is_async, number) / number for _ in range(rounds)]
+    return {
+        "median_us": round(statistics.median(per_call) * 1e6, 3),
+        "min_us": round(min(per_call) * 1e6, 3),
+        "iterations": number,
+        "rounds": rounds,
+    }
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    print(f"{'benchmark':<36} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, result in results.items():
+        previous = baseline.get(name)
+        current = result["median_us"]
+        if previous is None:
+            print(f"{name:<36} {'-':>12} {current:>10.2f}us {'new':>8}")
+            continue
+        change = (current - previous["median_us"]) / previous["median_us"]
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif change < -threshold:
+            flag = "  faster"
+        print(f"{name:<36} {previous['median_us']:>10.2f}us {current:>10.2f}us {change:>+8.1%}{flag}")
+    return regressions
+
+
+async def main(args):
+    if args.database_url:
+        # Read by app/config.py when app.database is first imported
+        os.environ["DATABASE_URL"] = args.database_url
+    sys.path.insert(0, ROOT)
+
+    context, cleanup = {}, None
+    if args.database_url:
+        cleanup = await prepare_database(context)
+    results = {}
+    try:
+        for name, factory, needs_db in BENCHMARKS:
+            if needs_db and not args.database_url:
+                continue
+            if args.only and not any(part in name for part in args.only):
+                continue
+            function = await factory(context)
+            results[name] = await measure(function, args.min_time, args.rounds)
+    finally:
+        if cleanup is not None:
+            await cleanup()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as stored:
+            baseline = json.load(stored)["results"]
+    regressions = compare(results, baseline, args.threshold)
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as stored:
+            json.dump({
+                "meta": {
+                    "recorded_at": datetime.utcnow().isoformat(timespec="seconds"),
+                    "python": platform.python_version(),
+                    "machine": f"{platform.system()} {platform.machine()}, {os.cpu_count()} CPUs",
+                    "database": bool(args.database_url),
+                },
+                "results": {**baseline, **results},
+            }, stored, indent=2, sort_keys=True)
+            stored.write("\n")
+        print(f"Baseline saved to {args.baseline}")
+    elif regressions:
+        print(f"{len(regressions)} benchmark(s) slower than the baseline by more than {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the request hot paths")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.15, help="relative slowdown reported as a regression")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per round")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--database-url", help="Postgres to run the database benchmarks against")
+    parser.add_argument("--only", nargs="*", help="run the benchmarks whose name contains any of these")
+    sys.exit(asyncio.run(main(parser.parse_args())))